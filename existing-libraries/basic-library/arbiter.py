@@ -0,0 +1,198 @@
+"""
+Priority arbitration between the behaviours driving the car
+
+Each behaviour (emergency stop, parking, stop-sign hold, checkpoint
+navigation, lane following) publishes its latest command with a priority and
+an expiry time, from the control loop or from another thread such as the
+detector. Once per control tick, decide() picks the highest-priority command
+that hasn't expired, in one pass over the behaviours, and the loop sends it to
+the motors. A command is only valid for its time to live, so a detection that
+is no longer refreshed (detector stalled or the sign left the view) stops
+influencing the car instead of lingering as a stale set.
+
+A safety command published between two ticks is selected at the next tick,
+i.e. it reaches the motors within one control period. For every behaviour the
+arbiter measures this reaction latency, from the command's stamp (e.g. the
+time of the detection) to the tick selecting it.
+
+Usage:
+    arbiter = Arbiter(period=1 / 30)
+    arbiter.publish('lane', LANE_FOLLOW, steering=steering, speed=speed, ttl=0.2)
+    if STOP_CLASS in detector.detected_classes:
+        arbiter.publish('stop_sign', STOP_SIGN, speed=0, ttl=0.5, stamp=detector.detection_time)
+    command = arbiter.decide()
+    px.set_dir_servo_angle(command.steering)
+    px.forward(command.speed)
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+# Priorities of the standard behaviours, higher wins
+EMERGENCY_STOP = 100
+PARKING = 80
+STOP_SIGN = 60
+CHECKPOINT = 40
+LANE_FOLLOW = 20
+
+
+@dataclass
+class Command:
+    """Command published by a behaviour"""
+
+    source: str
+    priority: int
+    steering: float = 0.0
+    speed: float = 0.0
+    action: Any = None
+    stamp: float = 0.0
+    expires: float = math.inf
+    selected: bool = False
+
+
+class Arbiter:
+    """Chooses the command of the highest-priority behaviour at every control tick"""
+
+    def __init__(self, period=None, clock=time.monotonic, history=1000):
+        """Initialize the arbiter
+
+        Args:
+            period (float): Control period in seconds, reactions slower than this are counted as late
+            clock (callable): Monotonic time in seconds, the same clock as the stamps
+            history (int): Number of reaction latencies kept per behaviour
+        """
+        self.period = period
+        self.clock = clock
+        self.history = history
+        self.lock = threading.Lock()
+        self.commands = {}
+
+        # Statistics - accessible from outside the class
+        self.active = None
+        self.switches = 0
+        self.reactions = {}
+        self.late = {}
+
+    def publish(self, source, priority, steering=0.0, speed=0.0, action=None, ttl=None, stamp=None):
+        """Publish (or replace) the command of a behaviour
+
+        Args:
+            source (str): Name of the behaviour, one command is kept per behaviour
+            priority (int): Priority of the command, e.g. STOP_SIGN
+            steering (float): Servo angle
+            speed (float): Motor speed, 0 to stop
+            action: Any other payload, e.g. a picar-library Action
+            ttl (float): Seconds after stamp the command stays valid, forever if None
+            stamp (float): Time the command is based on (e.g. of the detection), defaults to now
+
+        Returns:
+            Command: The published command
+        """
+        stamp = self.clock() if stamp is None else stamp
+        expires = math.inf if ttl is None else stamp + ttl
+        command = Command(source, priority, steering, speed, action, stamp, expires)
+        with self.lock:
+            previous = self.commands.get(source)
+            # Republishing the same detection doesn't count as a new reaction
+            command.selected = previous is not None and previous.selected and previous.stamp == stamp
+            self.commands[source] = command
+        return command
+
+    def withdraw(self, source):
+        """Remove the command of a behaviour"""
+        with self.lock:
+            self.commands.pop(source, None)
+
+    def decide(self, default=None):
+        """Choose the command to execute now
+
+        Args:
+            default (Command): Returned when no command is valid, defaults to stopping straight
+
+        Returns:
+            Command: The valid command with the highest priority (on ties, the behaviour that published first)
+        """
+        now = self.clock()
+        best = None
+        with self.lock:
+            for command in self.commands.values():
+                if command.expires > now and (best is None or command.priority > best.priority):
+                    best = command
+            if best is not None and not best.selected:
+                best.selected = True
+                self._record_reaction(best.source, now - best.stamp)
+
+        if best is None:
+            best = default or Command('default', -1, stamp=now)
+        if best.source != self.active:
+            self.active = best.source
+            self.switches += 1
+        return best
+
+    def _record_reaction(self, source, latency):
+        if source not in self.reactions:
+            self.reactions[source] = deque(maxlen=self.history)
+            self.late[source] = 0
+        self.reactions[source].append(latency)
+        if self.period is not None and latency > self.period:
+            self.late[source] += 1
+
+    def stats(self):
+        """Reaction latency of each behaviour, from its command's stamp to its first selection
+
+        Returns:
+            dict: Per behaviour: selections (published commands that were acted on), mean/p95/max
+                latency in milliseconds and late (selections slower than one period)
+        """
+        with self.lock:
+            stats = {}
+            for source, latencies in self.reactions.items():
+                values = np.array(latencies) * 1000
+                stats[source] = {
+                    'selections': len(values),
+                    'latency_mean': float(values.mean()),
+                    'latency_p95': float(np.percentile(values, 95)),
+                    'latency_max': float(values.max()),
+                    'late': self.late[source],
+                }
+            return stats
+
+
+class StopSignHold:
+    """Stop-sign behaviour: stop for hold seconds, then drive on, ignoring the sign for cooldown seconds"""
+
+    def __init__(self, hold=2.0, cooldown=3.0, priority=STOP_SIGN, source='stop_sign'):
+        self.hold = hold
+        self.cooldown = cooldown
+        self.priority = priority
+        self.source = source
+        self.hold_until = None
+        self.ignore_until = -math.inf
+
+    def update(self, arbiter, seen, now, stamp=None):
+        """Publish the hold while it lasts
+
+        Args:
+            arbiter (Arbiter): Arbiter to publish to
+            seen (bool): Whether the stop sign is currently detected
+            now (float): Current time of the arbiter's clock
+            stamp (float): Time of the detection, defaults to now
+
+        Returns:
+            bool: Whether the car is holding at the sign
+        """
+        if seen and self.hold_until is None and now >= self.ignore_until:
+            stamp = now if stamp is None else stamp
+            self.hold_until = stamp + self.hold
+            arbiter.publish(self.source, self.priority, speed=0.0, ttl=self.hold, stamp=stamp)
+        if self.hold_until is not None and now >= self.hold_until:
+            self.hold_until = None
+            self.ignore_until = now + self.cooldown
+            arbiter.withdraw(self.source)
+        return self.hold_until is not None
@@ -14,15 +14,17 @@ import libcamera
 class Camera:
     """Camera class to handle camera operations"""
 
-    def __init__(self, size=(640, 480), vflip=False, hflip=False):
+    def __init__(self, size=(640, 480), vflip=False, hflip=False, frame_rate=15):
         """Initialize the camera with given parameters
 
         Args:
             size (tuple): Camera resolution (width, height)
             vflip (bool): Flip camera vertically
             hflip (bool): Flip camera horizontally
+            frame_rate (int): Frame rate requested from the sensor
         """
         self.camera_size = size
+        self.frame_rate = frame_rate
         self.camera_width = size[0]
         self.camera_height = size[1]
         self.camera_vflip = vflip
@@ -46,6 +48,12 @@ class Camera:
         self.draw_detections_enabled = False
         self.draw_detections_confidence = False
 
+    @classmethod
+    def from_config(cls, config):
+        """Create the camera from a car_config.CameraConfig"""
+        return cls(size=(config.width, config.height), vflip=config.vflip, hflip=config.hflip,
+                   frame_rate=config.fps)
+
     def start(self):
         """Start the camera in a separate thread"""
         if self.is_running:
@@ -92,7 +100,7 @@ class Camera:
             preview_config.colour_space = libcamera.ColorSpace.Sycc()
             preview_config.buffer_count = 4
             preview_config.queue = True
-            preview_config.controls = {'FrameRate': 15}
+            preview_config.controls = {'FrameRate': self.frame_rate}
 
             # Start camera
             self.picam.configure(preview_config)
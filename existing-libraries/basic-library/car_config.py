@@ -0,0 +1,516 @@
+"""
+Typed configuration for the RoboEye library and the driving scripts
+
+One validated set of values for everything the scripts used to redefine as
+module-level constants (resolution, lane ROI, steering limits, PID gains,
+detector thresholds and input size, speeds). Values come from, in order of
+precedence:
+
+1. SECTION.KEY=VALUE overrides (e.g. from the command line)
+2. Environment variables PICAR_<SECTION>_<KEY>, e.g. PICAR_PID_KP=1.2
+3. A JSON file ({"pid": {"kp": 1.2}}), PICAR_CONFIG names it if no path is given
+4. The defaults below
+
+Fields marked hot (gains, thresholds, speeds) can be changed while the car
+is driving: ConfigWatcher reloads the file when it changes and updates the
+config sections in place, and the components built with from_config() read
+them on every call. Other changes (resolution, weights) need a restart.
+
+Usage:
+    config = load_config('picar.json')
+    camera = Camera.from_config(config.camera)
+    watcher = ConfigWatcher(config, 'picar.json')
+    watcher.start()
+    ...
+    pid = PID.from_config(config.pid)   # follows edits of "pid" in picar.json
+"""
+
+import json
+import os
+import threading
+import time
+import typing
+from dataclasses import asdict, dataclass, field, fields
+
+
+def setting(default, minimum=None, maximum=None, hot=False):
+    """Dataclass field with a valid range and whether it may change at run time"""
+    metadata = {'min': minimum, 'max': maximum, 'hot': hot}
+    if isinstance(default, (list, tuple)):
+        return field(default_factory=lambda: tuple(default), metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+@dataclass
+class CameraConfig:
+    """Camera resolution, orientation and frame rate"""
+
+    width: int = setting(640, 16)
+    height: int = setting(480, 16)
+    vflip: bool = setting(True)
+    hflip: bool = setting(True)
+    fps: int = setting(15, 1, 120)
+
+
+@dataclass
+class LaneConfig:
+    """Detection band of the lane (rows y to y + region_height) and steering limits"""
+
+    y: int = setting(405, 0, hot=True)
+    region_height: int = setting(100, 1, hot=True)
+    max_steering: float = setting(35.0, 0, 45, hot=True)
+    steering_multiplier: float = setting(40.0, 0, hot=True)
+    canny_low: int = setting(50, 0, 255, hot=True)
+    canny_high: int = setting(150, 0, 255, hot=True)
+
+
+@dataclass
+class EstimatorConfig:
+    """Kalman lane estimator: detection rate, noise and how long to drive on predictions
+
+    Off by default: without calibration.file its ground homography comes from the camera
+    geometry of the sim section, which has to be measured before enabling it on the car.
+    """
+
+    enabled: bool = setting(False)
+    detect_every: int = setting(1, 1, 10, hot=True)
+    strips: int = setting(3, 1, 10, hot=True)
+    measurement_noise: float = setting(0.01, 0.0001, hot=True)
+    max_dropout: float = setting(0.5, 0, hot=True)
+    max_offset_std: float = setting(0.05, 0, hot=True)
+
+
+@dataclass
+class CalibrationConfig:
+    """Camera calibration file and the bird's-eye view the lane is measured in (meters)"""
+
+    file: typing.Optional[str] = setting(None)
+    birds_eye: bool = setting(False)
+    forward_min: float = setting(0.12, 0)
+    forward_max: float = setting(0.45, 0.01)
+    half_width: float = setting(0.25, 0.01)
+    resolution: float = setting(0.005, 0.0005)
+
+
+@dataclass
+class TrackingConfig:
+    """Steering law: 'pid' on the pixel error, or 'pure_pursuit' / 'stanley' on the estimated lane"""
+
+    controller: str = setting('pid', hot=True)
+    lookahead_min: float = setting(0.12, 0.01, hot=True)
+    lookahead_gain: float = setting(0.25, 0, hot=True)
+    lookahead_max: float = setting(0.6, 0.01, hot=True)
+    stanley_gain: float = setting(3.0, 0, hot=True)
+    stanley_softening: float = setting(0.2, 0.01, hot=True)
+
+
+@dataclass
+class PIDConfig:
+    """Steering PID gains"""
+
+    kp: float = setting(0.9, 0, hot=True)
+    ki: float = setting(0.0, 0, hot=True)
+    kd: float = setting(0.0, 0, hot=True)
+    integral_limit: float = setting(100.0, 0, hot=True)
+
+
+@dataclass
+class DetectorConfig:
+    """YOLO weights, input size (width, height), minimum confidence, the gate (detection_gate.py)
+    deciding which frames YOLO runs on and the tiles (tiling.py, pixels) it runs on"""
+
+    weights: typing.Optional[str] = setting(None)
+    image_size: typing.Tuple[int, int] = setting((224, 224), 32)
+    confidence: float = setting(0.8, 0, 1, hot=True)
+    gate: str = setting('none')
+    gate_weights: typing.Optional[str] = setting(None)
+    gate_min_area: float = setting(0.001, 0, 1, hot=True)
+    gate_threshold: float = setting(0.5, 0, 1, hot=True)
+    gate_every: int = setting(15, 0, hot=True)
+    gate_hold: int = setting(5, 0, hot=True)
+    tile_size: int = setting(0, 0, hot=True)
+    tile_overlap: int = setting(32, 0, hot=True)
+    roi: typing.Optional[typing.Tuple[int, int, int, int]] = setting(None, 0)
+    tile_gate: bool = setting(False, hot=True)
+
+
+@dataclass
+class ClassifierConfig:
+    """Weights of the frame classifiers"""
+
+    sign: typing.Optional[str] = setting('sign_classifier.pth')
+    forward: typing.Optional[str] = setting('forward_classifier.pth')
+
+
+@dataclass
+class DriveConfig:
+    """Control loop rate and forward speed (motor percent)"""
+
+    fps: int = setting(30, 1, 240)
+    speed: float = setting(30.0, 0, 100, hot=True)
+    warm_up_frames: int = setting(10, 0)
+
+
+@dataclass
+class SpeedConfig:
+    """Speed profile (speed.py) below drive.speed: curve, sign and latency limits (m, s) and ramps (m/s^2)"""
+
+    enabled: bool = setting(False)
+    min_speed: float = setting(15.0, 0, 100, hot=True)
+    lateral_accel: float = setting(1.5, 0.01, hot=True)
+    accel: float = setting(1.0, 0.01, hot=True)
+    decel: float = setting(3.0, 0.01, hot=True)
+    max_blind_distance: float = setting(0.15, 0.01, hot=True)
+    preview_y: int = setting(120, 0, hot=True)
+    preview_height: int = setting(120, 0, hot=True)
+
+
+@dataclass
+class SafetyConfig:
+    """Behaviour arbitration: validity of detections, stop-sign hold, the detector watchdog (seconds) and
+    the distance (meters) at which signs stop the car"""
+
+    detection_ttl: float = setting(0.5, 0, hot=True)
+    stop_hold: float = setting(2.0, 0, hot=True)
+    stop_cooldown: float = setting(3.0, 0, hot=True)
+    max_detection_age: float = setting(2.0, 0, hot=True)
+    stop_distance: float = setting(0.4, 0, hot=True)
+
+
+@dataclass
+class SignConfig:
+    """Sign ranging (sign_range.py): physical sign heights (m), focal length (px) and track smoothing"""
+
+    enabled: bool = setting(True)
+    parking_height: float = setting(0.06, 0.001, hot=True)
+    stop_height: float = setting(0.06, 0.001, hot=True)
+    focal: typing.Optional[float] = setting(None, 1)
+    alpha: float = setting(0.5, 0, 1, hot=True)
+    beta: float = setting(0.2, 0, 1, hot=True)
+    max_age: float = setting(0.5, 0, hot=True)
+
+
+@dataclass
+class DisplayConfig:
+    """Local window and web stream"""
+
+    local: bool = setting(False)
+    web: bool = setting(False)
+    port: int = setting(9000, 1, 65535)
+
+
+@dataclass
+class TrainConfig:
+    """Classifier training"""
+
+    epochs: int = setting(10, 1)
+    batch_size: int = setting(64, 1)
+    workers: int = setting(2, 0)
+
+
+@dataclass
+class NavigationConfig:
+    """Speed and steering of the picar-library Navigation"""
+
+    speed: float = setting(80.0, 0, 100, hot=True)
+    turn_angle: float = setting(35.0, 0, 45, hot=True)
+
+
+@dataclass
+class SimConfig:
+    """Car and camera geometry (meters, degrees) of the simulator
+
+    Also used by the lane estimator and the sign ranger when no calibration.file is set, so on the
+    real car camera_height, camera_pitch and fov must be measured before enabling estimator.enabled.
+    """
+
+    wheelbase: float = setting(0.095, 0.01)
+    max_speed: float = setting(1.0, 0.01)
+    camera_height: float = setting(0.12, 0.01)
+    camera_pitch: float = setting(20.0, -45, 90)
+    fov: float = setting(62.2, 10, 170)
+    start_offset: float = setting(0.0)
+    grip: typing.Optional[float] = setting(None, 0.01)
+
+
+@dataclass
+class Config:
+    """All configuration sections"""
+
+    camera: CameraConfig = field(default_factory=CameraConfig)
+    lane: LaneConfig = field(default_factory=LaneConfig)
+    estimator: EstimatorConfig = field(default_factory=EstimatorConfig)
+    calibration: CalibrationConfig = field(default_factory=CalibrationConfig)
+    tracking: TrackingConfig = field(default_factory=TrackingConfig)
+    pid: PIDConfig = field(default_factory=PIDConfig)
+    detector: DetectorConfig = field(default_factory=DetectorConfig)
+    classifiers: ClassifierConfig = field(default_factory=ClassifierConfig)
+    drive: DriveConfig = field(default_factory=DriveConfig)
+    speed: SpeedConfig = field(default_factory=SpeedConfig)
+    safety: SafetyConfig = field(default_factory=SafetyConfig)
+    signs: SignConfig = field(default_factory=SignConfig)
+    display: DisplayConfig = field(default_factory=DisplayConfig)
+    train: TrainConfig = field(default_factory=TrainConfig)
+    navigation: NavigationConfig = field(default_factory=NavigationConfig)
+    sim: SimConfig = field(default_factory=SimConfig)
+
+    def validate(self):
+        """Check types and ranges of every value, and the values depending on each other
+
+        Raises:
+            ValueError: Listing every invalid value
+        """
+        errors = []
+        for section in fields(self):
+            values = getattr(self, section.name)
+            for setting_field in fields(values):
+                error = _check(setting_field, getattr(values, setting_field.name))
+                if error:
+                    errors.append(f"{section.name}.{setting_field.name}: {error}")
+
+        if not errors:
+            if self.lane.y >= self.camera.height:
+                errors.append(f"lane.y: {self.lane.y} is outside the {self.camera.height} rows of the frame")
+            if self.lane.canny_low > self.lane.canny_high:
+                errors.append("lane.canny_low: must not exceed lane.canny_high")
+            if self.tracking.controller not in ('pid', 'pure_pursuit', 'stanley'):
+                errors.append(f"tracking.controller: expected pid, pure_pursuit or stanley, "
+                              f"got {self.tracking.controller!r}")
+            elif self.tracking.controller != 'pid' and not self.estimator.enabled:
+                errors.append(f"tracking.controller: {self.tracking.controller} steers on the lane "
+                              f"estimate, it needs estimator.enabled")
+            if self.detector.gate not in ('none', 'color', 'classifier'):
+                errors.append(f"detector.gate: expected none, color or classifier, got {self.detector.gate!r}")
+            elif self.detector.gate == 'classifier' and not self.detector.gate_weights:
+                errors.append("detector.gate: classifier needs detector.gate_weights (an exported ClassifierRuntime)")
+            if self.detector.tile_size and self.detector.tile_overlap >= self.detector.tile_size:
+                errors.append("detector.tile_overlap: must be below detector.tile_size")
+            roi = self.detector.roi
+            if roi and not (roi[0] < roi[2] <= self.camera.width and roi[1] < roi[3] <= self.camera.height):
+                errors.append(f"detector.roi: {roi} is not an (x1, y1, x2, y2) region of the "
+                              f"{self.camera.width}x{self.camera.height} frame")
+            if self.calibration.forward_min >= self.calibration.forward_max:
+                errors.append("calibration.forward_min: must be below calibration.forward_max")
+            if self.calibration.birds_eye and not (self.calibration.file and self.estimator.enabled):
+                errors.append("calibration.birds_eye: needs calibration.file and estimator.enabled")
+            if self.tracking.lookahead_min > self.tracking.lookahead_max:
+                errors.append("tracking.lookahead_min: must not exceed tracking.lookahead_max")
+            if self.speed.preview_y >= self.camera.height:
+                errors.append(f"speed.preview_y: {self.speed.preview_y} is outside the {self.camera.height} "
+                              f"rows of the frame")
+        if errors:
+            raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
+        return self
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _check(setting_field, value):
+    """Error message for an invalid value, None if it's valid"""
+    expected = setting_field.type
+    origin = typing.get_origin(expected)
+    if origin is typing.Union:
+        if value is None:
+            return None
+        expected = next(t for t in typing.get_args(expected) if t is not type(None))
+        origin = typing.get_origin(expected)
+
+    if origin is tuple:
+        item_types = typing.get_args(expected)
+        if not isinstance(value, tuple) or len(value) != len(item_types):
+            return f"expected {len(item_types)} values, got {value!r}"
+        if not all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+            return f"expected integers, got {value!r}"
+        items = value
+    elif expected is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"expected a number, got {value!r}"
+        items = (value,)
+    elif expected is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            return f"expected an integer, got {value!r}"
+        items = (value,)
+    elif not isinstance(value, expected):
+        return f"expected {expected.__name__}, got {value!r}"
+    else:
+        return None
+
+    minimum, maximum = setting_field.metadata['min'], setting_field.metadata['max']
+    for item in items:
+        if minimum is not None and item < minimum:
+            return f"{item} is below the minimum {minimum}"
+        if maximum is not None and item > maximum:
+            return f"{item} is above the maximum {maximum}"
+    return None
+
+
+def _coerce(setting_field, value):
+    """Convert a value from JSON or a string (env/override) to the field type"""
+    if isinstance(value, str):
+        if setting_field.type is str or typing.get_args(setting_field.type) == (str, type(None)):
+            return None if value.lower() in ('none', 'null') else value
+        if setting_field.type is bool and value.lower() in ('true', 'false', 'yes', 'no', '1', '0', 'on', 'off'):
+            return value.lower() in ('true', 'yes', '1', 'on')
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    if isinstance(value, list):
+        return tuple(value)
+    if setting_field.type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _section_fields(config, section):
+    if section not in {f.name for f in fields(config)}:
+        raise ValueError(f"Unknown config section '{section}'")
+    values = getattr(config, section)
+    return values, {f.name: f for f in fields(values)}
+
+
+def _set(config, section, key, value, source):
+    values, section_fields = _section_fields(config, section)
+    if key not in section_fields:
+        raise ValueError(f"{source}: unknown key '{key}' in section '{section}'")
+    setattr(values, key, _coerce(section_fields[key], value))
+
+
+def load_config(path=None, env=None, overrides=()):
+    """Build and validate the configuration
+
+    Args:
+        path (str): JSON file, defaults to $PICAR_CONFIG (no file if unset)
+        env (dict): Environment to read PICAR_<SECTION>_<KEY> from, defaults to os.environ
+        overrides (list): 'SECTION.KEY=VALUE' strings, applied last
+
+    Returns:
+        Config: The validated configuration
+
+    Raises:
+        ValueError: For unknown sections or keys and invalid values
+        OSError: If the file can't be read
+    """
+    env = os.environ if env is None else env
+    path = path or env.get('PICAR_CONFIG')
+    config = Config()
+
+    if path:
+        with open(path) as f:
+            loaded = json.load(f)
+        for section, values in loaded.items():
+            _section_fields(config, section)
+            for key, value in values.items():
+                _set(config, section, key, value, path)
+
+    section_names = [f.name for f in fields(config)]
+    for name, value in env.items():
+        if not name.startswith('PICAR_') or name == 'PICAR_CONFIG':
+            continue
+        rest = name[len('PICAR_'):].lower()
+        section = next((s for s in section_names if rest.startswith(s + '_')), None)
+        if section is None:
+            raise ValueError(f"{name}: unknown config section")
+        _set(config, section, rest[len(section) + 1:], value, name)
+
+    for override in overrides:
+        name, sep, value = override.partition('=')
+        section, dot, key = name.partition('.')
+        if not sep or not dot:
+            raise ValueError(f"Invalid override '{override}', expected SECTION.KEY=VALUE")
+        _set(config, section, key, value, override)
+
+    return config.validate()
+
+
+class ConfigWatcher:
+    """Reloads the config file when it changes and applies the hot values in place"""
+
+    def __init__(self, config, path=None, interval=1.0, env=None, overrides=()):
+        """Initialize the watcher
+
+        Args:
+            config (Config): Configuration in use, updated in place
+            path (str): JSON file to watch, defaults to $PICAR_CONFIG
+            interval (float): Seconds between checks of the file's modification time
+            env (dict): Environment, as given to load_config()
+            overrides (list): Overrides, as given to load_config(); they keep precedence
+        """
+        self.config = config
+        self.env = os.environ if env is None else env
+        self.path = path or self.env.get('PICAR_CONFIG')
+        self.interval = interval
+        self.overrides = list(overrides)
+
+        # Watcher state
+        self.is_running = False
+        self.watch_thread = None
+        self.reloads = 0
+        self._mtime = self._modified()
+
+    def _modified(self):
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
+    def start(self):
+        """Check the file in a background thread"""
+        if self.is_running or not self.path:
+            return
+        self.is_running = True
+        self.watch_thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self.watch_thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self.watch_thread:
+            self.watch_thread.join(timeout=self.interval + 1)
+            self.watch_thread = None
+
+    def _watch_loop(self):
+        while self.is_running:
+            time.sleep(self.interval)
+            self.check()
+
+    def check(self):
+        """Reload the file if it changed
+
+        An invalid file is reported and ignored, the running config stays as it is.
+
+        Returns:
+            list[str]: Names of the values that were changed
+        """
+        mtime = self._modified()
+        if mtime is None or mtime == self._mtime:
+            return []
+        self._mtime = mtime
+
+        try:
+            new = load_config(self.path, self.env, self.overrides)
+        except (OSError, ValueError) as e:
+            print(f"Config reload failed, keeping the current values: {e}")
+            return []
+
+        changed, restart = [], []
+        for section in fields(self.config):
+            current, updated = getattr(self.config, section.name), getattr(new, section.name)
+            for setting_field in fields(current):
+                value = getattr(updated, setting_field.name)
+                if getattr(current, setting_field.name) == value:
+                    continue
+                name = f"{section.name}.{setting_field.name}"
+                if setting_field.metadata['hot']:
+                    setattr(current, setting_field.name, value)
+                    changed.append(name)
+                else:
+                    restart.append(name)
+
+        if changed:
+            self.reloads += 1
+            print(f"Config reloaded: {', '.join(changed)}")
+        if restart:
+            print(f"Config changes that need a restart: {', '.join(restart)}")
+        return changed
+
@@ -0,0 +1,310 @@
+"""
+Near-duplicate image detection for the RoboEye library
+
+Computes 64-bit perceptual hashes (dHash or pHash) for batches of images with
+NumPy and finds near-duplicates with a multi-index hash table: a hash is split
+into threshold + 1 blocks, and by the pigeonhole principle two hashes within
+the Hamming threshold share at least one block exactly. Only hashes sharing a
+block are compared, which keeps the search close to linear in the number of
+images.
+
+Usage:
+    python dedup.py data/ --threshold 4            # report near-duplicates
+    python dedup.py data/ --threshold 4 --move dup/  # move them out of the dataset
+"""
+
+import argparse
+import csv
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Number of set bits of every byte value, used to count differing hash bits
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix, so that C @ x @ C.T is the 2D DCT of x"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+# Thumbnail (width, height) each hash is computed from
+THUMBNAIL_SIZES = {'dhash': (9, 8), 'phash': (32, 32)}
+
+
+def _pack(bits):
+    """Pack (N, 64) booleans into N uint64 hashes"""
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def dhash(thumbnails):
+    """Difference hash of a batch of grayscale thumbnails
+
+    Args:
+        thumbnails (np.ndarray): (N, 8, 9) grayscale images
+
+    Returns:
+        np.ndarray: N uint64 hashes
+    """
+    thumbnails = np.asarray(thumbnails, dtype=np.int16)
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    return _pack(bits.reshape(len(thumbnails), 64))
+
+
+def phash(thumbnails):
+    """DCT-based perceptual hash of a batch of grayscale thumbnails
+
+    Args:
+        thumbnails (np.ndarray): (N, 32, 32) grayscale images
+
+    Returns:
+        np.ndarray: N uint64 hashes
+    """
+    thumbnails = np.asarray(thumbnails, dtype=np.float32)
+    low = (_DCT_32 @ thumbnails @ _DCT_32.T)[:, :8, :8].reshape(len(thumbnails), 64)
+    # The DC term only encodes overall brightness, leave it out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def thumbnail(image, method='dhash'):
+    """Grayscale thumbnail of a frame, sized for a hash method
+
+    Args:
+        image (np.ndarray): BGR or grayscale image
+        method (str): 'dhash' or 'phash'
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(image, THUMBNAIL_SIZES[method], interpolation=cv2.INTER_AREA)
+
+
+def hash_frames(frames, method='dhash'):
+    """Hash a list of in-memory frames
+
+    Returns:
+        np.ndarray: One uint64 hash per frame
+    """
+    return HASH_FUNCTIONS[method](np.stack([thumbnail(frame, method) for frame in frames]))
+
+
+def _hash_files(job):
+    """Worker: hash a batch of image files, decoding JPEGs at reduced size"""
+    paths, method = job
+    thumbnails = []
+    valid = []
+    for path in paths:
+        # libjpeg can decode at 1/4 size directly, which is much faster than a full decode
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if image is None:
+            continue
+        thumbnails.append(thumbnail(image, method))
+        valid.append(path)
+    if not thumbnails:
+        return valid, np.zeros(0, dtype=np.uint64)
+    return valid, HASH_FUNCTIONS[method](np.stack(thumbnails))
+
+
+def hash_files(paths, method='dhash', workers=None, batch_size=256):
+    """Hash image files with a process pool
+
+    Args:
+        paths (list[str]): Image files
+        method (str): 'dhash' or 'phash'
+        workers (int): Number of worker processes, defaults to the CPU count
+        batch_size (int): Images hashed per task
+
+    Returns:
+        tuple: (paths, hashes) for the images that could be read
+    """
+    jobs = [(paths[i:i + batch_size], method) for i in range(0, len(paths), batch_size)]
+    valid_paths = []
+    hashes = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_paths, batch_hashes in executor.map(_hash_files, jobs):
+            valid_paths.extend(batch_paths)
+            hashes.append(batch_hashes)
+    return valid_paths, np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+
+def hamming(a, b):
+    """Number of differing bits between uint64 hashes (broadcasts like a ^ b)"""
+    x = np.ascontiguousarray(np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64)))
+    counts = _POPCOUNT[x.reshape(-1).view(np.uint8)].reshape(x.shape + (8,))
+    return counts.sum(axis=-1, dtype=np.int64)
+
+
+class HashIndex:
+    """Multi-index hash table answering 'which hashes are within a Hamming threshold'"""
+
+    def __init__(self, threshold=4):
+        """Initialize an empty index
+
+        Args:
+            threshold (int): Maximum Hamming distance of near-duplicates (0-63)
+        """
+        self.threshold = threshold
+        # threshold + 1 contiguous bit blocks covering the 64 hash bits
+        edges = np.linspace(0, 64, threshold + 2).astype(int)
+        self.blocks = [(int(lo), int(hi - lo)) for lo, hi in zip(edges[:-1], edges[1:])]
+        self.tables = [{} for _ in self.blocks]
+        self.hashes = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _keys(self, value):
+        value = int(value)
+        return [(value >> shift) & ((1 << width) - 1) for shift, width in self.blocks]
+
+    def add(self, value):
+        """Add a hash and return its id"""
+        item = len(self.hashes)
+        self.hashes.append(int(value))
+        for table, key in zip(self.tables, self._keys(value)):
+            table.setdefault(key, []).append(item)
+        return item
+
+    def query(self, value):
+        """Return the ids of all indexed hashes within the threshold of a hash"""
+        value = int(value)
+        candidates = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            candidates.update(table.get(key, ()))
+        # Candidate sets are small, plain integer operations beat a NumPy round trip here
+        return sorted(item for item in candidates
+                      if bin(self.hashes[item] ^ value).count('1') <= self.threshold)
+
+
+def find_duplicates(hashes, threshold=4):
+    """Find near-duplicates in a sequence of hashes
+
+    Images are processed in order; an image is a duplicate if it's within the
+    threshold of an earlier image that was kept. Sort the inputs (e.g. by file
+    name or capture time) to decide which image of a group survives.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes
+        threshold (int): Maximum Hamming distance of near-duplicates
+
+    Returns:
+        np.ndarray: For every image, the position of the kept image it
+            duplicates, or -1 if it is kept
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    duplicate_of = np.full(len(hashes), -1, dtype=np.int64)
+
+    # Exact duplicates are resolved without touching the index
+    _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    exact = first[inverse] != np.arange(len(hashes))
+
+    index = HashIndex(threshold)
+    kept_positions = []
+    for position in np.sort(first):
+        matches = index.query(hashes[position])
+        if matches:
+            duplicate_of[position] = kept_positions[matches[0]]
+        else:
+            index.add(hashes[position])
+            kept_positions.append(position)
+
+    # Exact copies point at the kept image of their group
+    targets = first[inverse[exact]]
+    duplicate_of[exact] = np.where(duplicate_of[targets] >= 0, duplicate_of[targets], targets)
+    return duplicate_of
+
+
+class OnlineDeduplicator:
+    """Decide in the capture loop whether a frame is worth saving"""
+
+    def __init__(self, threshold=6, method='dhash'):
+        """Initialize the deduplicator
+
+        Args:
+            threshold (int): Frames within this Hamming distance of the last
+                saved frame are skipped
+            method (str): 'dhash' (cheapest) or 'phash'
+        """
+        self.threshold = threshold
+        self.method = method
+        self.last_hash = None
+
+        # Statistics - accessible from outside the class
+        self.saved_frames = 0
+        self.skipped_frames = 0
+
+    def should_save(self, frame):
+        """Return True if a frame differs enough from the last saved one
+
+        A True result counts the frame as saved; call this only right before
+        saving the frame.
+        """
+        value = hash_frames([frame], self.method)[0]
+        if self.last_hash is not None and hamming(value, self.last_hash) <= self.threshold:
+            self.skipped_frames += 1
+            return False
+
+        self.last_hash = value
+        self.saved_frames += 1
+        return True
+
+
+def get_all_images(folder):
+    """Return the image files below a folder, sorted by path"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate images")
+    parser.add_argument("folder", help="folder to scan (recursively)")
+    parser.add_argument("--method", choices=sorted(HASH_FUNCTIONS), default="dhash")
+    parser.add_argument("--threshold", type=int, default=4, help="maximum Hamming distance (0-63)")
+    parser.add_argument("--report", default="duplicates.csv", help="CSV listing every duplicate")
+    parser.add_argument("--move", default=None, help="move duplicates into this folder")
+    parser.add_argument("--delete", action="store_true", help="delete duplicates")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    paths, hashes = hash_files(get_all_images(args.folder), args.method, args.workers)
+    duplicate_of = find_duplicates(hashes, args.threshold)
+    duplicates = np.flatnonzero(duplicate_of >= 0)
+
+    with open(args.report, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['duplicate', 'kept', 'distance'])
+        for position in duplicates:
+            kept = duplicate_of[position]
+            writer.writerow([paths[position], paths[kept], int(hamming(hashes[position], hashes[kept]))])
+
+    for position in duplicates:
+        if args.delete:
+            os.remove(paths[position])
+        elif args.move:
+            target = os.path.join(args.move, os.path.relpath(paths[position], args.folder))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(paths[position], target)
+
+    print(f"{len(duplicates)} near-duplicates among {len(paths)} images, listed in {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Cheap gates deciding which frames the YOLO detector runs on
+
+Most frames on the track contain no sign, so running YOLO on every frame
+wastes most of its compute. A gate is a callable run on every frame that
+returns candidate regions, (x1, y1, x2, y2) boxes in frame pixels; an empty
+list means "no sign here" and ObjectDetection skips YOLO for the frame.
+
+- ColorGate: red and blue blobs (stop and parking signs) in a downscaled
+  HSV image, about a millisecond per frame
+- ClassifierGate: a frame classifier (self_driving_car.runtime, e.g. a sign
+  head trained with a background class) that says whether a sign is visible
+
+The recall/compute trade-off is set by the gate's threshold (blob area or
+classifier confidence), by detector.gate_hold (YOLO keeps running for that
+many frames after it found a sign, so a sign being approached is tracked
+without gaps) and by detector.gate_every (YOLO runs on every n-th frame
+regardless of the gate; on these audit frames ObjectDetection also counts
+the signs the gate missed, which estimates its recall).
+
+Usage:
+    gate = ColorGate(min_area=0.001)
+    detector = ObjectDetection(camera, 'my_yolo.pt', gate=gate)
+    ...
+    print(detector.gate_stats())
+"""
+
+import cv2
+import numpy as np
+
+# HSV ranges (OpenCV hue 0-180) of the sign colours: red wraps around hue 0, blue is around 110.
+# Red and blue swap places in a BGR/RGB mix-up, so the gate passes both channel orders.
+SIGN_COLORS = (
+    ((0, 100, 60), (10, 255, 255)),
+    ((170, 100, 60), (180, 255, 255)),
+    ((100, 120, 50), (130, 255, 255)),
+)
+
+
+class ColorGate:
+    """Red and blue blob prefilter"""
+
+    def __init__(self, min_area=0.001, width=160, padding=0.5, colors=SIGN_COLORS, config=None):
+        """Initialize the gate
+
+        Args:
+            min_area (float): Smallest blob, as a fraction of the frame area, that opens the gate
+            width (int): Width the frame is downscaled to before thresholding
+            padding (float): Candidate boxes are grown by this fraction of their size on each side
+            colors (tuple): (lower, upper) HSV bounds of the sign colours
+            config (car_config.DetectorConfig): If given, gate_min_area is read from it for every frame
+        """
+        self.min_area = min_area
+        self.width = width
+        self.padding = padding
+        self.colors = [(np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8)) for lower, upper in colors]
+        self.config = config
+        self.kernel = np.ones((3, 3), np.uint8)
+
+    def mask(self, small):
+        """Binary mask of the sign colours in a downscaled frame"""
+        hsv = cv2.cvtColor(small, cv2.COLOR_RGB2HSV)
+        mask = cv2.inRange(hsv, *self.colors[0])
+        for lower, upper in self.colors[1:]:
+            mask |= cv2.inRange(hsv, lower, upper)
+        return cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+
+    def __call__(self, frame):
+        """Candidate boxes of the sign-coloured blobs
+
+        Args:
+            frame (np.ndarray): Camera frame
+
+        Returns:
+            list: (x1, y1, x2, y2) boxes in frame pixels, empty if no blob is large enough
+        """
+        if self.config is not None:
+            self.min_area = self.config.gate_min_area
+        height, width = frame.shape[:2]
+        scale = width / self.width
+        small = cv2.resize(frame[:, :, :3], (self.width, max(1, round(height / scale))), interpolation=cv2.INTER_AREA)
+        count, _, blobs, _ = cv2.connectedComponentsWithStats(self.mask(small))
+
+        min_pixels = self.min_area * small.shape[0] * small.shape[1]
+        boxes = []
+        for x, y, w, h, area in blobs[1:]:
+            if area < min_pixels:
+                continue
+            pad_x, pad_y = w * self.padding, h * self.padding
+            boxes.append((max(0, int((x - pad_x) * scale)), max(0, int((y - pad_y) * scale)),
+                          min(width, int((x + w + pad_x) * scale)), min(height, int((y + h + pad_y) * scale))))
+        return boxes
+
+
+class ClassifierGate:
+    """Frame classifier prefilter"""
+
+    def __init__(self, runtime, head='sign', background=('none', 'background'), threshold=0.5, config=None):
+        """Initialize the gate
+
+        Args:
+            runtime (ClassifierRuntime): Frame classifiers, see self_driving_car/runtime.py
+            head (str): Classifier saying whether a sign is visible
+            background (tuple): Labels of that classifier meaning "no sign"
+            threshold (float): Lowest confidence of a sign label that opens the gate
+            config (car_config.DetectorConfig): If given, gate_threshold is read from it for every frame
+        """
+        self.runtime = runtime
+        self.head = head
+        self.background = background
+        self.threshold = threshold
+        self.config = config
+
+    def __call__(self, frame):
+        """The whole frame as candidate if the classifier sees a sign, else no candidate"""
+        if self.config is not None:
+            self.threshold = self.config.gate_threshold
+        prediction = self.runtime.predict(frame)[self.head]
+        if prediction.label in self.background or prediction.confidence < self.threshold:
+            return []
+        height, width = frame.shape[:2]
+        return [(0, 0, width, height)]
+
+
+def make_gate(config, runtime=None):
+    """Gate selected by detector.gate
+
+    Args:
+        config (car_config.DetectorConfig): Detector section
+        runtime (ClassifierRuntime): Classifiers for the 'classifier' gate; loaded from
+            detector.gate_weights if None (imports torch, only for that gate)
+
+    Returns:
+        ColorGate, ClassifierGate or None for 'none'
+    """
+    if config.gate == 'none':
+        return None
+    if config.gate == 'color':
+        return ColorGate(config.gate_min_area, config=config)
+    if runtime is None:
+        from self_driving_car.runtime import ClassifierRuntime
+
+        runtime = ClassifierRuntime.load(config.gate_weights)
+    return ClassifierGate(runtime, threshold=config.gate_threshold, config=config)
@@ -0,0 +1,292 @@
+"""
+Drive log format for the RoboEye library
+
+A drive log is a directory holding everything recorded during one drive:
+
+    meta.json        Format version, frame size, chunk size, start time
+    index.bin        One fixed-size INDEX_DTYPE record per frame
+    chunk_00000.bin  JPEG payload followed by a JSON record, frame after frame
+    chunk_00001.bin  ...
+
+Frames are split over chunk files so that a crash only loses the chunk that
+was being written, and so that readers can open a time range without touching
+the rest of the drive. The index is a flat array of fixed-size records that is
+memory-mapped, which makes seeking by frame id or timestamp a binary search.
+Chunks are memory-mapped as well and frames are only decoded when accessed, so
+opening an hour-long drive costs no more than opening a short one.
+"""
+
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+
+FORMAT_NAME = "roboeye-drive"
+FORMAT_VERSION = 1
+
+META_FILENAME = "meta.json"
+INDEX_FILENAME = "index.bin"
+
+INDEX_DTYPE = np.dtype([
+    ('frame_id', '<u8'),        # Sequential frame number, starting at 0
+    ('timestamp', '<f8'),       # Capture time in seconds (time.time())
+    ('chunk', '<u4'),           # Chunk file number
+    ('offset', '<u8'),          # Byte offset of the JPEG payload in the chunk
+    ('jpeg_size', '<u4'),       # JPEG payload size in bytes
+    ('record_size', '<u4'),     # JSON record size, stored right after the JPEG
+    ('steering', '<f4'),        # Steering command, NaN if not logged
+    ('speed', '<f4'),           # Speed command, NaN if not logged
+    ('num_detections', '<u2'),  # Number of detections logged with the frame
+])
+
+
+def chunk_filename(chunk):
+    """Return the file name of a chunk
+
+    Args:
+        chunk (int): Chunk number
+
+    Returns:
+        str: File name relative to the drive directory
+    """
+    return f"chunk_{chunk:05d}.bin"
+
+
+def to_json(value):
+    """JSON fallback for NumPy values found in controls and detections"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class DriveLog:
+    """Memory-mapped read access to a recorded drive log"""
+
+    def __init__(self, path):
+        """Open a drive log
+
+        Args:
+            path (str): Drive log directory written by DriveRecorder
+        """
+        self.path = path
+
+        with open(os.path.join(path, META_FILENAME)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a drive log")
+        if self.meta.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported drive log version: {self.meta['version']}")
+
+        # A crash can leave a partially written record at the end of the index
+        index_path = os.path.join(path, INDEX_FILENAME)
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        if count:
+            self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+
+        # Chunk number -> mmap, opened on first access
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmap all chunk files"""
+        for chunk in self._chunks.values():
+            chunk.close()
+        self._chunks = {}
+
+    def __getstate__(self):
+        # Memory maps can't be pickled; worker processes map the files again
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @property
+    def start_time(self):
+        """Timestamp of the first frame, or None for an empty drive"""
+        return float(self.index['timestamp'][0]) if len(self.index) else None
+
+    @property
+    def duration(self):
+        """Time between the first and the last frame in seconds"""
+        if not len(self.index):
+            return 0.0
+        return float(self.index['timestamp'][-1] - self.index['timestamp'][0])
+
+    def position_of(self, frame_id):
+        """Return the index position of a frame id
+
+        Args:
+            frame_id (int): Frame id as assigned by the recorder
+
+        Returns:
+            int: Position in the index
+
+        Raises:
+            KeyError: If the frame is not in the log
+        """
+        position = int(np.searchsorted(self.index['frame_id'], frame_id))
+        if position == len(self.index) or self.index['frame_id'][position] != frame_id:
+            raise KeyError(f"Frame {frame_id} not in drive log")
+        return position
+
+    def seek(self, seconds):
+        """Return the position of the first frame captured at or after a time
+
+        Args:
+            seconds (float): Time relative to the start of the drive
+
+        Returns:
+            int: Position in the index, len(self) if past the end
+        """
+        if not len(self.index):
+            return 0
+        target = self.index['timestamp'][0] + seconds
+        return int(np.searchsorted(self.index['timestamp'], target, side='left'))
+
+    def positions(self, start=0.0, end=None):
+        """Return the index positions of a time range
+
+        Args:
+            start (float): Start time relative to the start of the drive
+            end (float): End time (exclusive), defaults to the end of the drive
+
+        Returns:
+            range: Index positions of the frames in [start, end)
+        """
+        stop = len(self.index) if end is None else self.seek(end)
+        return range(self.seek(start), stop)
+
+    def split(self, parts, start=0.0, end=None):
+        """Split a time range into consecutive ranges of similar frame count
+
+        Args:
+            parts (int): Number of ranges
+            start (float): Start time relative to the start of the drive
+            end (float): End time (exclusive), defaults to the end of the drive
+
+        Returns:
+            list[tuple]: (start, end) times relative to the start of the drive,
+                covering every frame of [start, end) exactly once
+        """
+        positions = self.positions(start, end)
+        parts = max(1, min(parts, len(positions)))
+        if not len(positions):
+            return []
+
+        bounds = np.linspace(positions.start, positions.stop, parts + 1).astype(int)
+        origin = float(self.index['timestamp'][0])
+        inner = [float(self.index['timestamp'][b]) - origin for b in bounds[1:-1]]
+        return list(zip([start] + inner, inner + [end]))
+
+    def _chunk(self, chunk):
+        """Return the memory map of a chunk file"""
+        if chunk not in self._chunks:
+            with open(os.path.join(self.path, chunk_filename(chunk)), 'rb') as f:
+                self._chunks[chunk] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._chunks[chunk]
+
+    def read_jpeg(self, position):
+        """Return the encoded JPEG of the frame at an index position
+
+        Returns:
+            memoryview: Zero-copy view into the mapped chunk
+        """
+        entry = self.index[position]
+        offset = int(entry['offset'])
+        return memoryview(self._chunk(int(entry['chunk'])))[offset:offset + int(entry['jpeg_size'])]
+
+    def read_frame(self, position):
+        """Decode the frame at an index position
+
+        Args:
+            position (int): Position in the index
+
+        Returns:
+            np.ndarray: Decoded frame, in the channel order it was recorded with
+        """
+        data = np.frombuffer(self.read_jpeg(position), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    def read_record(self, position):
+        """Return the controls and detections logged with a frame
+
+        Args:
+            position (int): Position in the index
+
+        Returns:
+            dict: {'frame_id', 'timestamp', 'controls', 'detections'}
+        """
+        entry = self.index[position]
+        offset = int(entry['offset']) + int(entry['jpeg_size'])
+        chunk = self._chunk(int(entry['chunk']))
+        return json.loads(chunk[offset:offset + int(entry['record_size'])])
+
+    def frames(self, start=0.0, end=None, step=1):
+        """Iterate over the frames of a time range, decoding each one on access
+
+        Args:
+            start (float): Start time relative to the start of the drive
+            end (float): End time (exclusive), defaults to the end of the drive
+            step (int): Yield every step-th frame
+
+        Yields:
+            tuple: (position, frame)
+        """
+        for position in self.positions(start, end)[::step]:
+            yield position, self.read_frame(position)
+
+
+def _map_range(path, function, start, end, step):
+    """Worker: apply a function to every frame of a time range"""
+    with DriveLog(path) as log:
+        return [function(log, position, frame) for position, frame in log.frames(start, end, step)]
+
+
+def map_frames(path, function, workers=None, start=0.0, end=None, step=1):
+    """Apply a function to the frames of a drive using several worker processes
+
+    The drive is split into one time range per worker. Every worker maps the
+    drive on its own, so frames are read from the shared page cache and decoded
+    in parallel; nothing but the results crosses process boundaries.
+
+    Args:
+        path (str): Drive log directory
+        function (callable): function(log, position, frame) -> result. Must be
+            a module-level function so it can be sent to the workers.
+        workers (int): Number of worker processes, defaults to the CPU count
+        start (float): Start time relative to the start of the drive
+        end (float): End time (exclusive), defaults to the end of the drive
+        step (int): Process every step-th frame of each range
+
+    Returns:
+        list: Results in frame order
+    """
+    workers = workers or os.cpu_count() or 1
+    with DriveLog(path) as log:
+        ranges = log.split(workers, start, end)
+    if not ranges:
+        return []
+
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_map_range, path, function, range_start, range_end, step)
+                   for range_start, range_end in ranges]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+    return results
@@ -0,0 +1,223 @@
+"""
+Background model loading for the RoboEye library
+
+Models are loaded in background threads while the camera and display start,
+warmed up with dummy inferences (the first YOLO call builds its predictor and
+is much slower than the following ones), and optionally cached on disk in a
+form that loads faster on the next boot: YOLO weights with Conv+BatchNorm
+already fused, or an exported format such as NCNN or ONNX.
+
+Usage:
+    registry = ModelRegistry()
+    registry.register_yolo('detector', 'my_yolo.pt', image_size=(224, 224))
+    registry.load_all()                    # returns immediately
+
+    camera.start()                         # camera warms up meanwhile
+    print(registry.status())
+    model = registry.get('detector', timeout=30)
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+
+# Loading states reported by status()
+PENDING = 'pending'
+LOADING = 'loading'
+WARMING_UP = 'warming up'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def file_digest(path, length=12):
+    """Short content hash of a file, used to name cached weights"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def load_yolo(weights, cache_dir='model_cache', export_format=None, image_size=(224, 224)):
+    """Load YOLO weights through the on-disk cache
+
+    Without export_format the weights are fused once and saved, so later boots
+    skip the fusion. With export_format (e.g. 'ncnn', 'onnx', 'torchscript')
+    the model is exported once and the exported model is loaded afterwards.
+    The cache entry is named after the content of the weights file, so
+    retrained weights never reuse a stale entry.
+
+    Args:
+        weights (str): .pt weights file
+        cache_dir (str): Cache folder, None disables the cache
+        export_format (str): Ultralytics export format, None for fused .pt weights
+        image_size (tuple): (width, height) the model runs at, needed for exports
+
+    Returns:
+        ultralytics.YOLO: The loaded model
+    """
+    # Importing ultralytics alone takes seconds on a Pi; it happens here, in the loading thread
+    from ultralytics import YOLO
+
+    if not cache_dir or not os.path.exists(weights):
+        return YOLO(weights)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    key = f"{stem}-{file_digest(weights)}"
+
+    if export_format is None:
+        cached = os.path.join(cache_dir, f"{key}-fused.pt")
+        if os.path.exists(cached):
+            return YOLO(cached)
+        model = YOLO(weights)
+        model.fuse()
+        model.save(cached)
+        return model
+
+    # Exports keep their file name as suffix (e.g. '..._ncnn_model', '.onnx'), ultralytics
+    # recognizes the format from it
+    prefix = f"{key}-{image_size[0]}x{image_size[1]}-{export_format}-"
+    cached = [entry for entry in sorted(os.listdir(cache_dir)) if entry.startswith(prefix)]
+    if cached:
+        return YOLO(os.path.join(cache_dir, cached[0]), task='detect')
+
+    exported = str(YOLO(weights).export(format=export_format, imgsz=(image_size[1], image_size[0])))
+    target = os.path.join(cache_dir, prefix + os.path.basename(exported.rstrip(os.sep)))
+    shutil.move(exported, target)
+    return YOLO(target, task='detect')
+
+
+def warm_up_yolo(model, image_size=(224, 224), runs=2):
+    """Run a few inferences on a blank image so the first real frame runs at full speed"""
+    blank = np.zeros((image_size[1], image_size[0], 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(blank, verbose=False)
+
+
+class ModelRegistry:
+    """Loads named models in the background and reports their readiness"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.entries = {}
+
+    def register(self, name, loader, warm_up=None):
+        """Register a model
+
+        Args:
+            name (str): Name the model is requested with
+            loader (callable): loader() returns the loaded model
+            warm_up (callable): Optional warm_up(model), run after loading
+        """
+        with self.lock:
+            self.entries[name] = {
+                'loader': loader, 'warm_up': warm_up, 'model': None, 'state': PENDING,
+                'error': None, 'load_time': None, 'warm_up_time': None, 'thread': None,
+            }
+
+    def register_yolo(self, name, weights, image_size=(224, 224), warm_up_runs=2, cache_dir='model_cache',
+                      export_format=None):
+        """Register YOLO weights, loaded through the cache and warmed up, see load_yolo()"""
+        self.register(
+            name,
+            lambda: load_yolo(weights, cache_dir, export_format, image_size),
+            (lambda model: warm_up_yolo(model, image_size, warm_up_runs)) if warm_up_runs else None,
+        )
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def load(self, name):
+        """Start loading a model in a background thread (no-op if already started)"""
+        with self.lock:
+            entry = self.entries[name]
+            if entry['state'] != PENDING:
+                return
+            entry['state'] = LOADING
+            entry['thread'] = threading.Thread(target=self._load, args=(name,), daemon=True)
+            entry['thread'].start()
+
+    def load_all(self):
+        """Start loading every registered model"""
+        for name in list(self.entries):
+            self.load(name)
+
+    def _load(self, name):
+        entry = self.entries[name]
+        try:
+            start = time.perf_counter()
+            model = entry['loader']()
+            load_time = time.perf_counter() - start
+            with self.lock:
+                entry['load_time'] = load_time
+                entry['state'] = WARMING_UP
+
+            if entry['warm_up'] is not None:
+                start = time.perf_counter()
+                entry['warm_up'](model)
+                entry['warm_up_time'] = time.perf_counter() - start
+
+            with self.lock:
+                entry['model'] = model
+                entry['state'] = READY
+                self.lock.notify_all()
+            print(f"Model '{name}' ready: loaded in {load_time:.1f}s, warmed up in {entry['warm_up_time'] or 0:.1f}s")
+        except Exception as e:
+            print(f"Model '{name}' failed to load: {e}")
+            with self.lock:
+                entry['error'] = e
+                entry['state'] = FAILED
+                self.lock.notify_all()
+
+    def is_ready(self, name=None):
+        """Whether a model (or every registered model) is loaded and warmed up"""
+        names = [name] if name is not None else list(self.entries)
+        return all(self.entries[n]['state'] == READY for n in names)
+
+    def get(self, name, timeout=None):
+        """Return a loaded model, loading it if needed and waiting until it is ready
+
+        Args:
+            name (str): Registered model name
+            timeout (float): Seconds to wait, None waits indefinitely
+
+        Returns:
+            The loaded model
+
+        Raises:
+            RuntimeError: If loading failed or timed out
+        """
+        self.load(name)
+        entry = self.entries[name]
+        with self.lock:
+            if not self.lock.wait_for(lambda: entry['state'] in (READY, FAILED), timeout):
+                raise RuntimeError(f"Model '{name}' not ready after {timeout}s (state: {entry['state']})")
+        if entry['state'] == FAILED:
+            raise RuntimeError(f"Model '{name}' failed to load: {entry['error']}")
+        return entry['model']
+
+    def wait(self, timeout=None):
+        """Wait until every started model is ready or failed; returns True if all are ready"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.lock.wait_for(lambda: all(e['state'] in (READY, FAILED, PENDING) for e in self.entries.values()),
+                               None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return self.is_ready()
+
+    def status(self):
+        """Readiness of every model
+
+        Returns:
+            dict: name -> {'state', 'load_time', 'warm_up_time', 'error'}
+        """
+        with self.lock:
+            return {name: {'state': entry['state'], 'load_time': entry['load_time'],
+                           'warm_up_time': entry['warm_up_time'],
+                           'error': str(entry['error']) if entry['error'] else None}
+                    for name, entry in self.entries.items()}
@@ -8,31 +8,96 @@ import threading
 import cv2
 import numpy as np
 
-from ultralytics import YOLO
-
 
 class ObjectDetection:
 
-    def __init__(self, camera, model_filename, model_image_size=(224, 224), is_image_thread=False):
+    def __init__(self, camera, model_filename, model_image_size=(224, 224), is_image_thread=False,
+                 model=None, registry=None, confidence=0.8, config=None, gate=None, gate_every=0, gate_hold=0,
+                 tile_size=0, tile_overlap=32, roi=None, tile_gate=False, verbose=False):
+        """
+        Args:
+            camera: Camera (or ReplayCamera) providing frames
+            model_filename (str): YOLO weights, also the model name in the registry
+            model_image_size (tuple): (width, height) frames are resized to
+            is_image_thread (bool): Draw detections into current_frame
+            model: Already loaded YOLO model, skips loading
+            registry (ModelRegistry): Registry the model is taken from; it's registered
+                there if missing. Loading then overlaps with the camera start.
+            confidence (float): Minimum confidence of a detection
+            config (car_config.DetectorConfig): If given, the confidence (and gate_every,
+                gate_hold) is read from it for every frame, so a config reload changes it while running
+            gate: Cheap check run on every frame (see detection_gate.py), YOLO only runs on
+                frames it returns candidate regions for; None runs YOLO on every frame
+            gate_every (int): Run YOLO on every n-th frame regardless of the gate and count the
+                signs the gate missed there; 0 never
+            gate_hold (int): Frames YOLO keeps running after it detected something
+            tile_size (int): Run YOLO on a batch of tile_size x tile_size crops at native resolution
+                instead of the frame resized to model_image_size (see tiling.py); 0 resizes
+            tile_overlap (int): Minimum overlap of neighbouring tiles in pixels
+            roi (tuple): (x1, y1, x2, y2) region the tiles cover, the whole frame if None
+            tile_gate (bool): With a gate, tile around the gate's candidate regions instead of the roi
+            verbose (bool): Print the detected classes of every frame; gate_stats() sums them up otherwise
+        """
 
         self.camera = camera
         self.is_running = False
         self.object_detection_thread = None
-        self.model = None
+        self.model = model
+        self.registry = registry
         self.model_filename = model_filename
-        self.model_image_size = model_image_size
+        self.model_image_size = tuple(model_image_size)
         self.is_image_thread = is_image_thread
+        self.confidence = confidence
+        self.config = config
+        self.gate = gate
+        self.gate_every = gate_every
+        self.gate_hold = gate_hold
+        self._hold = 0
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.roi = roi
+        self.tile_gate = tile_gate
+        self.verbose = verbose
+
+        # True once the model is loaded; detections stay empty until then
+        self.is_ready = model is not None
 
         # Frame storage - accessible from outside the class
         self.detected_objects = []
         self.detected_classes = {}
+        self.detection_time = None  # time.monotonic() when detected_classes was last updated
         self.current_frame = None
+        self.gate_regions = []  # Candidate regions of the gate on the last frame
+        self.tiles = []  # Tiles YOLO ran on for the last frame, with tile_size
+
+        # Gate statistics, see gate_stats()
+        self.frames = 0
+        self.yolo_runs = 0
+        self.held = 0
+        self.audits = 0
+        self.audit_misses = 0
+        self.gate_time = 0.0
+        self.yolo_time = 0.0
+
+    @classmethod
+    def from_config(cls, camera, config, **kwargs):
+        """Create the detector from a car_config.DetectorConfig (weights, input size, confidence, gate, tiles)
+
+        The gate is made from detector.gate unless given, see detection_gate.make_gate().
+        """
+        if 'gate' not in kwargs:
+            from detection_gate import make_gate
+
+            kwargs['gate'] = make_gate(config)
+        return cls(camera, config.weights, config.image_size, confidence=config.confidence, config=config,
+                   gate_every=config.gate_every, gate_hold=config.gate_hold, tile_size=config.tile_size,
+                   tile_overlap=config.tile_overlap, roi=config.roi, tile_gate=config.tile_gate, **kwargs)
 
     def start(self):
         self.object_detection_thread = threading.Thread(target=self._object_detection_loop, daemon=True)
         self.object_detection_thread.start()
 
-        # Wait for camera to start
+        # Wait for the thread to start; the model keeps loading in it, see is_ready
         start_time = time.time()
         while not self.is_running and time.time() - start_time < 5:
             time.sleep(0.1)
@@ -40,6 +105,14 @@ class ObjectDetection:
         if not self.is_running:
             raise RuntimeError("Failed to start object detection")
 
+    def wait_until_ready(self, timeout=None):
+        """Block until the model is loaded; returns False on timeout or load failure"""
+        start_time = time.time()
+        while not self.is_ready and self.is_running:
+            if timeout is not None and time.time() - start_time > timeout:
+                return False
+            time.sleep(0.05)
+        return self.is_ready
 
     def stop(self):
         if not self.is_running:
@@ -50,25 +123,37 @@ class ObjectDetection:
             self.object_detection_thread.join(timeout=3)
             self.object_detection_thread = None
 
+    def _load_model(self):
+        if self.model is not None:
+            return self.model
+        if self.registry is not None:
+            if self.model_filename not in self.registry:
+                self.registry.register_yolo(self.model_filename, self.model_filename, self.model_image_size)
+            return self.registry.get(self.model_filename)
+
+        from ultralytics import YOLO  # Slow import, kept out of module load
+        return YOLO(self.model_filename)
+
     def _object_detection_loop(self):
         try:
+            self.is_running = True
 
             print("Loading YOLO model...")
-            self.model = YOLO(self.model_filename)
+            self.model = self._load_model()
             print(f"Model classes: {self.model.names}")
             print("Model loaded successfully!")
-
-            self.is_running = True
+            self.is_ready = True
 
             while self.is_running:
                 frame = self.camera.get_image()
 
                 if frame is not None:
-                    detections = self.detect_objects(frame)
+                    detections = self._gated_detections(frame)
                     detected_objects = []
                     detected_classes = set()
                     if detections:
-                        print(f"Objects detected: {len(detections)}")
+                        if self.verbose:
+                            print(f"Objects detected: {len(detections)}")
                         for i, detection in enumerate(detections):
                             confidence = detection['confidence']
                             object_class = detection['class']
@@ -78,7 +163,9 @@ class ObjectDetection:
 
                     self.detected_objects = detected_objects
                     self.detected_classes = detected_classes
-                    print(self.detected_classes)
+                    self.detection_time = time.monotonic()
+                    if self.verbose:
+                        print(self.detected_classes)
                     if self.is_image_thread:
                         self.update_current_frame(frame)
 
@@ -88,34 +175,125 @@ class ObjectDetection:
             self.is_running = False
 
     def detect_objects(self, frame):
-        resized_frame = cv2.resize(frame, (224, 224))
+        if self.config is not None:
+            self.confidence = self.config.confidence
+            self.tile_size = self.config.tile_size
+            self.tile_overlap = self.config.tile_overlap
+            self.tile_gate = self.config.tile_gate
+        if self.tile_size:
+            return self._detect_tiles(frame)
 
-        results = self.model(resized_frame, verbose=False, conf=0.8)
+        resized_frame = cv2.resize(frame, self.model_image_size)
+
+        results = self.model(resized_frame, verbose=False, conf=self.confidence)
+
+        # Scale from the model input back to the camera frame
+        scale_x = frame.shape[1] / self.model_image_size[0]
+        scale_y = frame.shape[0] / self.model_image_size[1]
 
         detections = []
         for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    class_name = box.cls.cpu().numpy()[0].astype(np.int16)
-
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = box.conf[0].cpu().numpy()
-
-                    # Map coordinates back to original 640x480 frame
-                    orig_x1 = int(x1 * 640 / self.model_image_size[0])
-                    orig_y1 = int(y1 * 480 / self.model_image_size[1])
-                    orig_x2 = int(x2 * 640 / self.model_image_size[0])
-                    orig_y2 = int(y2 * 480 / self.model_image_size[1])
-
-                    detections.append({
-                        'bbox': (orig_x1, orig_y1, orig_x2, orig_y2),
-                        'confidence': confidence,
-                        'class': class_name
-                    })
+            detections.extend(self._result_detections(result, scale_x, scale_y))
+        return detections
+
+    def _detect_tiles(self, frame):
+        """Detections of native-resolution tiles of the ROI (or of the gate's regions), run as one batch"""
+        from tiling import crop_tiles, merge_detections, tile_grid, tiles_around
 
+        frame_size = (frame.shape[1], frame.shape[0])
+        if self.tile_gate and self.gate_regions:
+            tiles = tiles_around(self.gate_regions, frame_size, self.tile_size)
+        else:
+            tiles = tile_grid(frame_size, self.roi, self.tile_size, self.tile_overlap)
+        self.tiles = tiles
+        size = tiles[0][2] - tiles[0][0]
+        results = self.model(crop_tiles(frame, tiles), verbose=False, conf=self.confidence, imgsz=size)
+
+        detections = []
+        for (x, y, _, _), result in zip(tiles, results):
+            detections.extend(self._result_detections(result, 1.0, 1.0, x, y))
+        return merge_detections(detections)
+
+    @staticmethod
+    def _result_detections(result, scale_x, scale_y, offset_x=0, offset_y=0):
+        """Detections of one YOLO result, mapped back to the frame"""
+        detections = []
+        boxes = result.boxes
+        if boxes is not None:
+            for box in boxes:
+                class_name = box.cls.cpu().numpy()[0].astype(np.int16)
+
+                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                confidence = box.conf[0].cpu().numpy()
+
+                # Map coordinates back to the original frame
+                orig_x1 = int(x1 * scale_x + offset_x)
+                orig_y1 = int(y1 * scale_y + offset_y)
+                orig_x2 = int(x2 * scale_x + offset_x)
+                orig_y2 = int(y2 * scale_y + offset_y)
+
+                detections.append({
+                    'bbox': (orig_x1, orig_y1, orig_x2, orig_y2),
+                    'confidence': confidence,
+                    'class': class_name
+                })
+        return detections
+
+    def _gated_detections(self, frame):
+        """Detections of the frame, YOLO only running if the gate, an audit or the hold asks for it"""
+        self.frames += 1
+        if self.gate is None:
+            return self._timed_detections(frame)
+        if self.config is not None:
+            self.gate_every = self.config.gate_every
+            self.gate_hold = self.config.gate_hold
+
+        start = time.perf_counter()
+        self.gate_regions = self.gate(frame)
+        self.gate_time += time.perf_counter() - start
+
+        audit = self.gate_every > 0 and self.frames % self.gate_every == 0
+        held = not self.gate_regions and self._hold > 0
+        if not (self.gate_regions or held or audit):
+            return []
+
+        detections = self._timed_detections(frame)
+        if held:
+            self.held += 1
+            self._hold -= 1
+        elif audit and not self.gate_regions:
+            self.audits += 1
+            self.audit_misses += bool(detections)
+        if detections:
+            self._hold = self.gate_hold
         return detections
 
+    def _timed_detections(self, frame):
+        start = time.perf_counter()
+        detections = self.detect_objects(frame)
+        self.yolo_time += time.perf_counter() - start
+        self.yolo_runs += 1
+        return detections
+
+    def gate_stats(self):
+        """How often the gate saved a YOLO run, and what it cost
+
+        Returns:
+            dict: frames, yolo_runs, gated (fraction of frames without YOLO), held (YOLO runs
+                kept by gate_hold), audits and audit_misses (audit frames the gate had closed,
+                and those where YOLO found something), gate_ms and yolo_ms (mean per call)
+        """
+        return {
+            'frames': self.frames,
+            'yolo_runs': self.yolo_runs,
+            'gated': 1 - self.yolo_runs / self.frames if self.frames else 0.0,
+            'held': self.held,
+            'audits': self.audits,
+            'audit_misses': self.audit_misses,
+            'gate_ms': self.gate_time / self.frames * 1000 if self.frames and self.gate else 0.0,
+            'yolo_ms': self.yolo_time / self.yolo_runs * 1000 if self.yolo_runs else 0.0,
+        }
+
     def update_current_frame(self, frame, color=(0, 255, 0), thickness=2):
         if frame is not None and self.detected_objects:
 
@@ -0,0 +1,199 @@
+"""
+Drive recorder for the RoboEye library
+
+Records camera frames together with the control commands and detections that
+were active when each frame was captured. Encoding and disk writes happen on a
+background thread; the capture loop only pays for queueing the frame.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from drive_log import (FORMAT_NAME, FORMAT_VERSION, INDEX_DTYPE, INDEX_FILENAME,
+                       META_FILENAME, chunk_filename, to_json)
+
+
+class DriveRecorder:
+    """Write frames, controls and detections into a drive log"""
+
+    def __init__(self, path, frames_per_chunk=300, jpeg_quality=90, max_queue=64, copy_frames=True):
+        """Initialize the recorder
+
+        Args:
+            path (str): Drive log directory (created if it doesn't exist)
+            frames_per_chunk (int): Frames stored per chunk file
+            jpeg_quality (int): JPEG quality of the stored frames (0-100)
+            max_queue (int): Frames allowed to wait for the writer thread.
+                This bounds memory use; frames arriving while the queue is
+                full are dropped and counted in dropped_frames.
+            copy_frames (bool): Copy frames before queueing them. Disable only
+                if the caller never draws on a frame after recording it.
+        """
+        self.path = path
+        self.frames_per_chunk = frames_per_chunk
+        self.jpeg_quality = jpeg_quality
+        self.copy_frames = copy_frames
+
+        # Recorder state
+        self.is_running = False
+        self.writer_thread = None
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        # Statistics - accessible from outside the class
+        self.recorded_frames = 0
+        self.dropped_frames = 0
+
+        self._next_frame_id = 0
+        self._frame_size = None
+
+    def start(self):
+        """Create the drive log and start the writer thread"""
+        if self.is_running:
+            print("Recorder is already running")
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(os.path.join(self.path, INDEX_FILENAME)):
+            raise RuntimeError(f"Drive log already exists: {self.path}")
+
+        self._write_meta(started=time.time())
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+        print(f"Recording drive to {self.path}")
+
+    def stop(self):
+        """Write all queued frames and close the drive log"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        self.queue.put(None)
+        if self.writer_thread:
+            self.writer_thread.join()
+            self.writer_thread = None
+        print(f"Recorded {self.recorded_frames} frames ({self.dropped_frames} dropped)")
+
+    def record(self, frame, controls=None, detections=None, timestamp=None):
+        """Queue a frame with the controls and detections that belong to it
+
+        Args:
+            frame (np.ndarray): Camera frame
+            controls (dict): Control commands, e.g. {'steering': -12.0, 'speed': 0.1}.
+                'steering' and 'speed' are also stored in the index.
+            detections (list): Detections for the frame, e.g. ObjectDetection.detected_objects
+            timestamp (float): Capture time, defaults to now
+
+        Returns:
+            int or None: Frame id, or None if the frame was dropped
+        """
+        if not self.is_running or frame is None:
+            return None
+
+        if timestamp is None:
+            timestamp = time.time()
+        if self.copy_frames:
+            frame = frame.copy()
+
+        frame_id = self._next_frame_id
+        try:
+            self.queue.put_nowait((frame_id, timestamp, frame, controls or {}, detections or []))
+        except queue.Full:
+            self.dropped_frames += 1
+            return None
+
+        self._next_frame_id += 1
+        return frame_id
+
+    def _writer_loop(self):
+        """Encode queued frames and append them to the drive log"""
+        chunk = -1
+        chunk_file = None
+        index_file = open(os.path.join(self.path, INDEX_FILENAME), 'ab')
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+
+                frame_id, timestamp, frame, controls, detections = item
+
+                if frame_id // self.frames_per_chunk != chunk:
+                    if chunk_file:
+                        chunk_file.close()
+                        index_file.flush()
+                    chunk = frame_id // self.frames_per_chunk
+                    chunk_file = open(os.path.join(self.path, chunk_filename(chunk)), 'ab')
+
+                success, jpeg = cv2.imencode('.jpg', frame, encode_params)
+                if not success:
+                    print(f"Recorder error: could not encode frame {frame_id}")
+                    continue
+
+                record = json.dumps({
+                    'frame_id': frame_id,
+                    'timestamp': timestamp,
+                    'controls': controls,
+                    'detections': detections,
+                }, default=to_json).encode('utf-8')
+
+                # Payload first, index second: the index never points at missing data
+                offset = chunk_file.tell()
+                chunk_file.write(jpeg.tobytes())
+                chunk_file.write(record)
+
+                entry['frame_id'] = frame_id
+                entry['timestamp'] = timestamp
+                entry['chunk'] = chunk
+                entry['offset'] = offset
+                entry['jpeg_size'] = len(jpeg)
+                entry['record_size'] = len(record)
+                entry['steering'] = controls.get('steering', np.nan)
+                entry['speed'] = controls.get('speed', np.nan)
+                entry['num_detections'] = len(detections)
+                index_file.write(entry.tobytes())
+
+                if self._frame_size is None:
+                    self._frame_size = (frame.shape[1], frame.shape[0])
+                self.recorded_frames += 1
+
+        except Exception as e:
+            print(f"Recorder error: {e}")
+            self.is_running = False
+        finally:
+            if chunk_file:
+                chunk_file.close()
+            index_file.close()
+            self._write_meta()
+
+    def _write_meta(self, started=None):
+        """Write meta.json, keeping the start time of an earlier write"""
+        meta_path = os.path.join(self.path, META_FILENAME)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+        meta.update({
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'frames_per_chunk': self.frames_per_chunk,
+            'jpeg_quality': self.jpeg_quality,
+            'frame_size': self._frame_size,
+            'recorded_frames': self.recorded_frames,
+            'dropped_frames': self.dropped_frames,
+        })
+        if started is not None:
+            meta['started'] = started
+
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
@@ -0,0 +1,144 @@
+"""
+Replay camera for the RoboEye library
+
+Plays a recorded drive log back through the Camera interface, so Display,
+ObjectDetection and the control scripts can run on recorded drives instead of
+the live camera.
+"""
+
+import threading
+import time
+
+from drive_log import DriveLog
+
+
+class ReplayCamera:
+    """Camera replacement that serves frames from a drive log"""
+
+    def __init__(self, path, start=0.0, end=None, speed=1.0, loop=False):
+        """Initialize the replay camera
+
+        Args:
+            path (str): Drive log directory
+            start (float): Start time relative to the start of the drive
+            end (float): End time (exclusive), defaults to the end of the drive
+            speed (float): Playback speed for start(); 1.0 replays in real time,
+                None publishes frames as fast as they can be decoded
+            loop (bool): Restart from the beginning of the range at the end
+        """
+        self.log = DriveLog(path)
+        self.positions = self.log.positions(start, end)
+        self.speed = speed
+        self.loop = loop
+
+        # Camera state
+        self.is_running = False
+        self.camera_thread = None
+        self.position = None
+
+        # Frame storage - accessible from outside the class
+        self.current_frame = None
+        self.current_record = None
+
+        self.fps = 0
+        self.current_detections = []
+        self._cursor = 0
+        self._resync = True
+
+    def start(self):
+        """Start publishing frames in a separate thread, like Camera.start()"""
+        if self.is_running:
+            print("Camera is already running")
+            return
+
+        self.is_running = True
+        self.camera_thread = threading.Thread(target=self._replay_loop, daemon=True)
+        self.camera_thread.start()
+        return True
+
+    def stop(self):
+        """Stop playback and unmap the drive log"""
+        self.is_running = False
+        if self.camera_thread:
+            self.camera_thread.join(timeout=3)
+            self.camera_thread = None
+        self.log.close()
+
+    def _replay_loop(self):
+        """Publish frames with the timing they were recorded with"""
+        timestamps = self.log.index['timestamp']
+        fps_counter = 0
+        fps_timer = time.time()
+
+        while self.is_running:
+            if self._cursor >= len(self.positions):
+                if not self.loop or not len(self.positions):
+                    break
+                self._cursor = 0
+                self._resync = True
+
+            # Anchor playback to the wall clock so decode time doesn't add up as drift
+            if self._resync or self.speed is None:
+                self._resync = False
+                wall_start = time.monotonic()
+                drive_start = timestamps[self.positions[self._cursor]]
+
+            position = self.positions[self._cursor]
+            if self.speed:
+                delay = (timestamps[position] - drive_start) / self.speed - (time.monotonic() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.read()
+
+            fps_counter += 1
+            elapsed_time = time.time() - fps_timer
+            if elapsed_time > 1.0:
+                self.fps = round(fps_counter / elapsed_time, 1)
+                fps_counter = 0
+                fps_timer = time.time()
+
+        self.is_running = False
+
+    def read(self):
+        """Decode the next frame of the range and make it the current frame
+
+        Use this instead of start() to process a drive frame by frame, as fast
+        as the caller can consume it.
+
+        Returns:
+            np.ndarray or None: The frame, or None at the end of the range
+        """
+        if self._cursor >= len(self.positions):
+            return None
+
+        self.position = self.positions[self._cursor]
+        self.current_frame = self.log.read_frame(self.position)
+        self.current_record = self.log.read_record(self.position)
+        self._cursor += 1
+        return self.current_frame
+
+    def seek(self, seconds):
+        """Continue playback at a time relative to the start of the drive"""
+        position = self.log.seek(seconds)
+        self._cursor = max(0, min(position - self.positions.start, len(self.positions)))
+        self._resync = True
+
+    def get_image(self):
+        return self.current_frame
+
+    def get_frame(self):
+        """Alias used by the picar-library CameraController"""
+        return self.current_frame
+
+    def show_fps(self, show=True, color=None, size=None, origin=None):
+        """Accepted for Camera compatibility; replayed frames are not annotated"""
+
+    def set_controls(self, controls):
+        """Accepted for Camera compatibility; a recording has no controls to set"""
+
+    def update_detections(self, detections):
+        self.current_detections = detections
+
+    def enable_detection_overlay(self, enable=True, confidence=False):
+        """Accepted for Camera compatibility; replayed frames are not annotated"""
@@ -3,20 +3,26 @@ Example usage of the RoboEye library
 """
 
 # import time
+import sys
+
+from startup_profiler import StartupProfiler
+
+# Created before the other imports so their time is measured (python run_camera.py --profile)
+profiler = StartupProfiler(enabled='--profile' in sys.argv)
 
 from picarx import Picarx
 from camera import Camera
 from display import Display
 from pygame import time
-from pygame import mixer
-from robot_hat import PWM, Music, Buzzer, set_volume, enable_speaker, disable_speaker
-import os
-
+from robot_hat import disable_speaker
+from dedup import OnlineDeduplicator
 
 
-def main():
+def start_audio():
+    """Set up the speaker and sounds; called once the camera is running, so it doesn't delay the first frame"""
+    from pygame import mixer
+    from robot_hat import Music, enable_speaker
 
-    px = Picarx()
     enable_speaker()
     music = Music()
     # set_volume(80)
@@ -32,6 +38,12 @@ def main():
     mixer.music.load("californication.mp3")
     mixer.music.play()
     pop.play()
+    return pop
+
+
+def main():
+
+    px = Picarx()
     clock = time.Clock()
     FPS = 10
 
@@ -40,6 +52,9 @@ def main():
 
     timer = 0
 
+    # Skip photos that look like the previous saved one
+    deduplicator = OnlineDeduplicator(threshold=6)
+
     try:
         # Initialize camera (with optional parameters)
         camera = Camera(
@@ -54,6 +69,10 @@ def main():
 
         # Show FPS counter
         camera.show_fps(True)
+        profiler.mark("camera started")
+
+        with profiler.phase("audio setup"):
+            pop = start_audio()
 
         # Initialize display
         display = Display(camera)
@@ -68,13 +87,19 @@ def main():
         image_idx = 0
         px.set_cam_tilt_angle(0)
         px.set_cam_pan_angle(0)
+        profiler.mark("display started")
+        profiler.report()
         while True:
 
             if timer == 30:
-                print("Taking a photo #", image_idx)
-                camera.take_photo(f"stop_dataset_photo{image_idx}")
-                pop.play()
-                image_idx += 1
+                frame = camera.get_image()
+                if frame is not None and deduplicator.should_save(frame):
+                    print("Taking a photo #", image_idx)
+                    camera.take_photo(f"stop_dataset_photo{image_idx}")
+                    pop.play()
+                    image_idx += 1
+                else:
+                    print("Skipping photo, too similar to the previous one")
                 timer = 0
                 #px.set_cam_tilt_angle(0)
 
@@ -16,17 +16,20 @@ updates the display with bounding boxes and object info.
 
 # --- Imports ----------------------------------------------------------------
 
+import sys
+from startup_profiler import StartupProfiler
+
+# Started before the other imports so their cost shows up in the profile (run with --profile)
+profiler = StartupProfiler(enabled='--profile' in sys.argv)
+
 from picarx import Picarx                # Controls the physical robot (motors, servos)
 from camera import Camera                # Handles video capture and frame management
 from display import Display              # Provides both local and web-based video display
 from pygame import time                  # Used for frame rate timing
-from pygame import mixer                 # For potential sound effects (not used here)
-from robot_hat import PWM, Music, Buzzer, set_volume, enable_speaker, disable_speaker
-                                         # Hardware control and audio (speaker, PWM, etc.)
-import os
-import numpy as np
+from robot_hat import disable_speaker    # Speaker is switched off on exit
 import cv2                               # For image resizing and frame encoding
-from ultralytics import YOLO             # YOLOv8 object detection model
+from model_registry import ModelRegistry # Loads the YOLOv8 model in the background
+                                         # (ultralytics/torch are imported in its loading thread)
 
 # --- Constants ---------------------------------------------------------------
 
@@ -100,12 +103,14 @@ def main():
     clock = time.Clock()
     FPS = 30  # Desired frame rate
 
-    # Load YOLOv8 model (using the small 'n' version)
-    print("Loading YOLO model...")
-    model = YOLO('yolov8n.pt')
-    print("Model loaded successfully!")
+    # Load and warm up the YOLOv8 model (small 'n' version) in the background,
+    # while the camera and display start
+    registry = ModelRegistry()
+    registry.register_yolo('detector', 'yolov8n.pt', image_size=(416, 416))
+    registry.load_all()
     
     timer = 0  # Used to limit how often detections run
+    first_detection = True  # The startup profile is printed after the first detection
 
     try:
         # Initialize and start the RoboEye camera
@@ -117,6 +122,7 @@ def main():
 
         print("Starting camera...")
         camera.start()                     # Begin capturing frames
+        profiler.mark("camera started")
         camera.show_fps(True)              # Display FPS overlay
         camera.enable_detection_overlay(confidence=True)  # Enable bounding box overlay
 
@@ -137,9 +143,14 @@ def main():
             if timer > 30:  # Run detection every ~1 second (30 frames @ 30fps)
                 photo = camera.get_image()
                 
-                if photo is not None:
+                if photo is not None and registry.is_ready('detector'):
                     # Run YOLO detection
-                    detections = detect_objects(model, photo)
+                    detections = detect_objects(registry.get('detector'), photo)
+                    if first_detection:
+                        first_detection = False
+                        profiler.mark("first detection")
+                        profiler.add_model_status(registry.status())
+                        profiler.report()
                     camera_detections = []
 
                     if detections:
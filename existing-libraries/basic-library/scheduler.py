@@ -0,0 +1,195 @@
+"""
+Deadline-driven scheduler for the control loops of the RoboEye library
+
+Runs tasks at fixed periods against absolute monotonic deadlines: each
+release time is the previous one plus the period, so timing errors don't
+accumulate like with a sleep after every iteration, and the loop sleeps
+until the next deadline instead of spinning. For every task it measures
+the release jitter (how late it started), run time and overruns (periods
+missed because the task or the loop took too long).
+
+When the loop falls behind, non-critical tasks (status output, recording,
+telemetry) are skipped until it has caught up, so critical tasks such as
+steering keep their rate.
+
+Usage:
+    scheduler = Scheduler()
+    scheduler.add('control', control, period=1 / 30)                 # control(dt)
+    scheduler.add('status', print_status, period=1.0, critical=False)
+    try:
+        scheduler.run()
+    finally:
+        scheduler.report()
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+
+class Task:
+    """A periodic task and its timing statistics"""
+
+    def __init__(self, name, function, period, critical=True, delay=0.0, max_lateness=None, history=1000):
+        """Initialize the task
+
+        Args:
+            name (str): Name used in the statistics
+            function (callable): function(dt), dt being the seconds since its previous run
+            period (float): Seconds between releases
+            critical (bool): Critical tasks always run; others are skipped while the loop is behind
+            delay (float): Seconds before the first release, e.g. to let the camera warm up
+            max_lateness (float): A non-critical task starting later than this after its
+                release is skipped, defaults to one period
+            history (int): Number of jitter and run time samples kept for the percentiles
+        """
+        self.name = name
+        self.function = function
+        self.period = period
+        self.critical = critical
+        self.delay = delay
+        self.max_lateness = period if max_lateness is None else max_lateness
+
+        self.deadline = None
+        self.last_start = None
+
+        # Statistics - accessible from outside the class
+        self.runs = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.jitter = deque(maxlen=history)
+        self.durations = deque(maxlen=history)
+
+    def stats(self):
+        """Timing statistics in milliseconds
+
+        Returns:
+            dict: runs, skipped, overruns, mean/p95/max jitter and mean/p95/max run time
+        """
+        stats = {'runs': self.runs, 'skipped': self.skipped, 'overruns': self.overruns}
+        for name, samples in (('jitter', self.jitter), ('duration', self.durations)):
+            values = np.array(samples) * 1000 if samples else np.zeros(1)
+            stats[f'{name}_mean'] = float(values.mean())
+            stats[f'{name}_p95'] = float(np.percentile(values, 95))
+            stats[f'{name}_max'] = float(values.max())
+        return stats
+
+
+class Scheduler:
+    """Runs periodic tasks in the calling thread"""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        """Initialize the scheduler
+
+        Args:
+            clock (callable): Monotonic time in seconds
+            sleep (callable): sleep(seconds); with a simulated clock, e.g. Simulator.step,
+                the loop runs as fast as possible in simulated time
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks = []
+        self.is_running = False
+        self.behind = False
+        self.start_time = None
+
+    def add(self, name, function, period, critical=True, delay=0.0, max_lateness=None):
+        """Add a task, see Task for the arguments
+
+        Returns:
+            Task: The added task (its statistics are updated while running)
+        """
+        task = Task(name, function, period, critical, delay, max_lateness)
+        if self.start_time is not None:
+            task.deadline = self.clock() + delay
+        self.tasks.append(task)
+        return task
+
+    def stop(self):
+        """Stop run() after the task that is running (callable from any thread or task)"""
+        self.is_running = False
+
+    def run(self, duration=None):
+        """Run the tasks until stop() is called or for duration seconds
+
+        Tasks due at the same time run critical ones first, then in the order they were added.
+        """
+        self.start_time = self.clock()
+        for task in self.tasks:
+            if task.deadline is None:
+                task.deadline = self.start_time + task.delay
+        self.is_running = True
+        end = None if duration is None else self.start_time + duration
+
+        while self.is_running and self.tasks:
+            next_deadline = min(task.deadline for task in self.tasks)
+            if end is not None and next_deadline >= end:
+                break
+            wait = next_deadline - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+                if not self.is_running:
+                    break
+
+            due = [task for task in self.tasks if task.deadline <= self.clock()]
+            due.sort(key=lambda task: not task.critical)
+            for task in due:
+                if not self.is_running:
+                    break
+                self._run_task(task)
+
+        self.is_running = False
+
+    def _run_task(self, task):
+        now = self.clock()
+        lateness = now - task.deadline
+
+        if not task.critical and (self.behind or lateness > task.max_lateness):
+            task.skipped += 1
+            self._reschedule(task, now)
+            return
+
+        dt = now - task.last_start if task.last_start is not None else task.period
+        task.last_start = now
+        try:
+            task.function(dt)
+        finally:
+            finished = self.clock()
+            task.runs += 1
+            task.jitter.append(lateness)
+            task.durations.append(finished - now)
+            missed = self._reschedule(task, finished)
+            if task.critical:
+                # The loop is behind while critical tasks miss their deadlines
+                self.behind = missed > 0
+
+    def _reschedule(self, task, now):
+        """Move the deadline to the next release after now; returns the number of missed releases"""
+        task.deadline += task.period
+        if task.deadline > now:
+            return 0
+        missed = int((now - task.deadline) // task.period) + 1
+        task.deadline += missed * task.period
+        task.overruns += missed
+        return missed
+
+    def stats(self):
+        """Statistics of every task, see Task.stats()"""
+        return {task.name: task.stats() for task in self.tasks}
+
+    def report(self):
+        """Print the per-task statistics
+
+        Returns:
+            str: The printed report
+        """
+        lines = [f"{'task':<14}{'runs':>7}{'skipped':>9}{'overruns':>10}{'jitter ms':>22}{'run time ms':>22}",
+                 f"{'':<40}{'mean':>8}{'p95':>7}{'max':>7}{'mean':>8}{'p95':>7}{'max':>7}"]
+        for name, stats in self.stats().items():
+            lines.append(f"{name:<14}{stats['runs']:>7}{stats['skipped']:>9}{stats['overruns']:>10}"
+                         f"{stats['jitter_mean']:>8.2f}{stats['jitter_p95']:>7.2f}{stats['jitter_max']:>7.2f}"
+                         f"{stats['duration_mean']:>8.2f}{stats['duration_p95']:>7.2f}{stats['duration_max']:>7.2f}")
+        text = "\n".join(lines)
+        print(text)
+        return text
@@ -0,0 +1,127 @@
+"""
+Speed from the road ahead instead of a constant
+
+Replaces driving at one fixed speed (drive.speed, or forward(1) / stop in
+the examples) with a speed profile. SpeedController picks the forward speed
+of every tick as the lowest of three limits, capped by drive.speed:
+
+- curvature: the speed at which the lateral acceleration v^2 * curvature
+  stays below speed.lateral_accel, for the curvature of the lane ahead
+- signs: brakes at speed.decel to reach speed.min_speed safety.stop_distance
+  meters before the nearest stop or parking sign (distance from
+  self_driving_car.sign_range), so the car keeps its speed until the sign is near
+  and arrives there slowly instead of braking hard when it finally stops
+- latency: the distance driven during the perception latency (frame
+  processing plus the age of the detections) stays below
+  speed.max_blind_distance
+
+and ramps towards it with speed.accel / speed.decel (m/s^2) instead of jumping between 0 and the constant. Stops decided by the arbiter
+(signs, lost line, emergency) still happen at once, the controller ramps up
+again from the speed the car really got.
+
+Usage:
+    controller = SpeedController.from_config(config)
+    speed = controller.update(dt, curvature=follower.curvature, sign_distance=1.2, latency=0.05)
+    ...
+    controller.speed = 0.0   # the car was stopped, ramp up from standstill
+"""
+
+import math
+
+
+class SpeedController:
+    """Curvature, sign and latency aware speed with acceleration limits"""
+
+    def __init__(self, max_speed=30.0, min_speed=15.0, lateral_accel=1.5, accel=1.0, decel=3.0,
+                 stop_distance=0.4, max_blind_distance=0.15, speed_scale=0.01):
+        """Initialize the controller
+
+        Args:
+            max_speed (float): Speed cap (motor percent)
+            min_speed (float): Lowest speed the limits slow down to while driving
+            lateral_accel (float): Highest lateral acceleration in m/s^2 in curves
+            accel (float): Acceleration in m/s^2
+            decel (float): Braking deceleration in m/s^2
+            stop_distance (float): Meters before a sign where min_speed is reached
+            max_blind_distance (float): Meters the car may drive during the perception latency
+            speed_scale (float): m/s per speed unit
+        """
+        self.max_speed = max_speed
+        self.min_speed = min_speed
+        self.lateral_accel = lateral_accel
+        self.accel = accel
+        self.decel = decel
+        self.stop_distance = stop_distance
+        self.max_blind_distance = max_blind_distance
+        self.speed_scale = speed_scale
+        self.config = None
+
+        # Current speed and the limits of the last update - accessible from outside the class
+        self.speed = 0.0
+        self.limits = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Controller reading the speed, drive and safety sections of a car_config.Config at every update"""
+        controller = cls(speed_scale=config.sim.max_speed / 100)
+        controller.config = config
+        controller._sync()
+        return controller
+
+    def _sync(self):
+        speed = self.config.speed
+        self.max_speed = self.config.drive.speed
+        self.min_speed = min(speed.min_speed, self.max_speed)
+        self.lateral_accel = speed.lateral_accel
+        self.accel = speed.accel
+        self.decel = speed.decel
+        self.stop_distance = self.config.safety.stop_distance
+        self.max_blind_distance = speed.max_blind_distance
+
+    def curvature_limit(self, curvature):
+        """Highest speed for a curvature in 1/m"""
+        if not curvature:
+            return self.max_speed
+        return math.sqrt(self.lateral_accel / abs(curvature)) / self.speed_scale
+
+    def sign_limit(self, sign_distance):
+        """Highest speed braking at decel to min_speed at stop_distance before a sign sign_distance meters ahead"""
+        if sign_distance is None:
+            return self.max_speed
+        min_speed = self.min_speed * self.speed_scale
+        braking = max(0.0, sign_distance - self.stop_distance)
+        return math.sqrt(min_speed ** 2 + 2 * self.decel * braking) / self.speed_scale
+
+    def latency_limit(self, latency):
+        """Highest speed driving at most max_blind_distance during latency seconds"""
+        if not latency or latency <= 0:
+            return self.max_speed
+        return self.max_blind_distance / latency / self.speed_scale
+
+    def update(self, dt, curvature=None, sign_distance=None, latency=None):
+        """Speed for this tick
+
+        Args:
+            dt (float): Seconds since the previous update
+            curvature (float): Curvature of the lane ahead in 1/m
+            sign_distance (float): Meters to the nearest stop or parking sign
+            latency (float): Seconds between the frame and the command
+
+        Returns:
+            float: Speed command, ramped from the previous one
+        """
+        if self.config is not None:
+            self._sync()
+        self.limits = {
+            'curvature': self.curvature_limit(curvature),
+            'sign': self.sign_limit(sign_distance),
+            'latency': self.latency_limit(latency),
+        }
+        target = min(self.max_speed, *self.limits.values())
+        target = max(target, min(self.min_speed, self.max_speed))
+
+        if target > self.speed:
+            self.speed = min(target, self.speed + self.accel / self.speed_scale * dt)
+        else:
+            self.speed = max(target, self.speed - self.decel / self.speed_scale * dt)
+        return self.speed
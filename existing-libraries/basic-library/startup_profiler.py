@@ -0,0 +1,167 @@
+"""
+Startup-time profiling for the RoboEye entry points
+
+Measures where the time between process start and the first useful frame
+goes: how long each import takes (and whether it blocked the main thread or
+ran in a background loader), how long models took to load and warm up, and
+named milestones such as 'camera started' or 'first frame'.
+
+Usage:
+    from startup_profiler import StartupProfiler
+    profiler = StartupProfiler()           # before the heavy imports
+    import cv2
+    ...
+    profiler.mark('camera started')
+    with profiler.phase('model load'):
+        model = load()
+    profiler.report()
+
+    python startup_profiler.py cv2 torch ultralytics   # import-time breakdown
+"""
+
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """Records import times, timed phases and milestones since creation"""
+
+    def __init__(self, enabled=True):
+        """Initialize the profiler
+
+        Args:
+            enabled (bool): If False, every method is a cheap no-op, so the
+                profiler can stay in the code behind a --profile flag
+        """
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+        # name -> (cumulative seconds, thread name), for imports made by non-profiled code
+        self.imports = {}
+        self.phases = []
+        self.marks = []
+
+        self._local = threading.local()
+        self._original_import = None
+        if enabled:
+            self.install()
+
+    def elapsed(self):
+        """Seconds since the profiler was created"""
+        return time.perf_counter() - self.start_time
+
+    def install(self):
+        """Start timing imports"""
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        """Stop timing imports"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        # Only the outermost import of each chain is recorded; its time includes its dependencies
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self.lock:
+                    self.imports.setdefault(name, (time.perf_counter() - start, threading.current_thread().name))
+
+    def mark(self, name):
+        """Record a milestone at the current time"""
+        if self.enabled:
+            with self.lock:
+                self.marks.append((name, self.elapsed()))
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of code"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                with self.lock:
+                    self.phases.append((name, time.perf_counter() - start))
+
+    def add_model_status(self, status):
+        """Add the load and warm-up times reported by ModelRegistry.status()"""
+        if not self.enabled:
+            return
+        with self.lock:
+            for name, entry in status.items():
+                if entry['load_time'] is not None:
+                    self.phases.append((f"model '{name}' load", entry['load_time']))
+                if entry['warm_up_time'] is not None:
+                    self.phases.append((f"model '{name}' warm-up", entry['warm_up_time']))
+
+    def report(self, top=15):
+        """Print the breakdown
+
+        Args:
+            top (int): Number of imports listed, slowest first
+
+        Returns:
+            str: The printed report
+        """
+        if not self.enabled:
+            return ''
+
+        main_thread = threading.main_thread().name
+        lines = [f"Startup profile ({self.elapsed():.2f}s since start)"]
+        with self.lock:
+            if self.marks:
+                lines.append("  Milestones:")
+                lines.extend(f"    {seconds:8.2f}s  {name}" for name, seconds in self.marks)
+            if self.phases:
+                lines.append("  Phases:")
+                lines.extend(f"    {seconds:8.2f}s  {name}" for name, seconds in self.phases)
+            if self.imports:
+                imports = sorted(self.imports.items(), key=lambda item: -item[1][0])
+                blocking = sum(seconds for seconds, thread in self.imports.values() if thread == main_thread)
+                lines.append(f"  Imports ({blocking:.2f}s in the main thread; background threads in brackets):")
+                for name, (seconds, thread) in imports[:top]:
+                    where = '' if thread == main_thread else f"  [{thread}]"
+                    lines.append(f"    {seconds:8.2f}s  {name}{where}")
+
+        text = "\n".join(lines)
+        print(text)
+        return text
+
+
+def profile_imports(modules):
+    """Import modules one after the other and return the profiler holding their times"""
+    profiler = StartupProfiler()
+    for module in modules:
+        with profiler.phase(f"import {module}"):
+            try:
+                __import__(module)
+            except ImportError as e:
+                print(f"Could not import {module}: {e}")
+    profiler.uninstall()
+    return profiler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure the import time of modules")
+    parser.add_argument("modules", nargs="+", help="modules to import, e.g. cv2 torch ultralytics")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    profile_imports(args.modules).report(args.top)
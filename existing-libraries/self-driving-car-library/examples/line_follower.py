@@ -1,79 +1,20 @@
-import cv2
-import numpy as np
+import os
 from camera import Camera
 from picarx import Picarx
-from pygame import time
 from display import Display
+from car_config import load_config
+from scheduler import Scheduler
+from self_driving_car.lane import LaneFollower
 
-WIDTH = 640
-HEIGHT = 480
+# Lane band, gains and limits shared with main_loop.py, see car_config.py
+config = load_config(os.environ.get('PICAR_CONFIG', os.path.join(os.path.dirname(__file__), '..', 'picar.json')))
 
-Y = HEIGHT - 75
-REGION_HEIGHT = 100
-CENTER = WIDTH//2
+FPS = config.drive.fps
 
-FPS = 30
-
-MAX_STEERING = 35
-STEERING_MULTIPLIER = 40
-MAX_ERROR = WIDTH // 2
-
-class PID:
-    def __init__(self, kp, ki, kd):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.prev_error = 0
-        self.integral = 0
-
-    def compute(self, error, dt):
-        self.integral += error * dt
-        # Optional: Clamp the integral to avoid wind-up
-        self.integral = max(min(self.integral, 100), -100)
-
-        derivative = (error - self.prev_error) / dt if dt > 0 else 0
-
-        output = (
-            self.kp * error +
-            self.ki * self.integral +
-            self.kd * derivative
-        )
-
-        self.prev_error = error
-        return output
-
-def process_frame(frame):
-    if frame is None:
-        print("Warning")
-        return None, frame
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    region = gray[Y:Y+REGION_HEIGHT, :]
-    blurred = cv2.GaussianBlur(region, (5,5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
-    edge_indices = np.where(edges > 0 )[1]
-
-    if len(edge_indices) >= 2:
-        line_center = (np.min(edge_indices) + np.max(edge_indices)) // 2
-        print(f"line_center: {line_center}")
-
-        error = CENTER - line_center
-        print(f"error: {error}")
-
-        return error, frame
-    else:
-        return None, frame
-
-pid = PID(kp=0.9, ki=0, kd=0)
-
-running = True
+follower = LaneFollower.from_config(config)
 
 px = Picarx()
-clock = time.Clock()
-camera = Camera(
-    size=(640, 480),  # Resolution (width, height)
-    vflip=True,  # Vertical flip
-    hflip=True  # Horizontal flip
-)
+camera = Camera.from_config(config.camera)
 camera.start()
 camera.show_fps(True)
 
@@ -81,31 +22,30 @@ display = Display(camera)
 display.show(
     local=True,  # Show in local window
     web=True,  # Enable web streaming
-    port=9000  # Port for web streaming
+    port=config.display.port  # Port for web streaming
 )
 
-timer = 0
 
-while running:
+def control(dt):
+    frame = camera.get_image()
 
-    if timer > 10:
-        frame = camera.get_image()
+    steering, speed = follower.update(frame, dt)
+    if follower.error is not None:
+        px.forward(speed)
+        px.set_dir_servo_angle(steering)
+        print(f"steering: {steering}")
+    else:
+        print("Line not detected")
+        px.set_dir_servo_angle(0)
+        px.forward(0)
 
-        error, processed_frame = process_frame(frame)
 
-        dt = 1/FPS
-        if error is not None:
-            px.forward(1)
-            raw_steering = pid.compute(error, dt)
-            print(f"raw_steering: {raw_steering}")
-            scaled_steering = np.clip((raw_steering / MAX_ERROR) * STEERING_MULTIPLIER, -MAX_STEERING, MAX_STEERING)
-            px.set_dir_servo_angle(-scaled_steering)
-            print(f"scaled_steering: {scaled_steering}")
-        else:
-            print("Line not detected")
-            px.set_dir_servo_angle(0)
-            px.forward(0)
-    else:
-        timer += 1
+# Steer every 1/FPS seconds against fixed deadlines, starting after the camera's warm-up frames
+scheduler = Scheduler()
+scheduler.add('control', control, period=1 / FPS, delay=config.drive.warm_up_frames / FPS)
 
-    clock.tick(FPS)
+try:
+    scheduler.run()
+finally:
+    px.forward(0)
+    scheduler.report()
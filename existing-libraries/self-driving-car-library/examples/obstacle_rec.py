@@ -1,25 +1,18 @@
-import torch
-from torchvision import transforms
-from PIL import Image
 from picarx import Picarx
 from pygame import time
 
-from self_driving_car.models.forward import ForwardClassifier
+from self_driving_car.runtime import ClassifierRuntime
 from camera import Camera
+from speed import SpeedController
 
-model = ForwardClassifier()
-model.load_state_dict(torch.load("../forward_classifier.pth"))
-model.eval()
+runtime = ClassifierRuntime.from_weights({'forward': "../forward_classifier.pth"})
 
 running = True
 
-transform = transforms.Compose([
-    transforms.Resize((64, 64)),
-    transforms.ToTensor(),
-])
-
 px = Picarx()
 clock = time.Clock()
+# Ramps up to 30 while the way is free instead of jumping to a fixed speed
+speed_controller = SpeedController(max_speed=30)
 camera = Camera(
     size=(640, 480),  # Resolution (width, height)
     vflip=False,  # Vertical flip
@@ -30,20 +23,21 @@ camera.start()
 while running:
 
     img = camera.get_image()
-    img = Image.fromarray(img).convert("RGB")
-    img_tensor = transform(img).unsqueeze(0)
+    if img is None:
+        clock.tick(15)
+        continue
 
-    with torch.no_grad():
-        output = model(img_tensor)
-        _, predicted = torch.max(output, 1)
+    predicted = runtime.predict(img)['forward']
 
-    if predicted.item() == 0:
+    if predicted.index == 0:
         print("car cannot go")
         px.forward(0)
+        speed_controller.speed = 0.0
     else:
         print("car can go")
-        px.forward(1)
+        px.forward(speed_controller.update(1 / 15))
 
-    clock.tick(1)
+    # Classification takes a few milliseconds, so it keeps up with the camera (15 FPS)
+    clock.tick(15)
 
 camera.stop()
@@ -1,23 +1,15 @@
-import torch
-from torchvision import transforms
-from PIL import Image
 from picarx import Picarx
 from pygame import time
 
-from self_driving_car.models.sign import SignClassifier
+from self_driving_car.runtime import ClassifierRuntime
 from camera import Camera
 
-sign_model = SignClassifier()
-sign_model.load_state_dict(torch.load("../sign_classifier.pth"))
-sign_model.eval()
+# Both classifiers run on the same preprocessed frame in one call
+runtime = ClassifierRuntime.from_weights({'forward': "../forward_classifier.pth",
+                                          'sign': "../sign_classifier.pth"})
 
 running = True
 
-transform = transforms.Compose([
-    transforms.Resize((64, 64)),
-    transforms.ToTensor(),
-])
-
 px = Picarx()
 clock = time.Clock()
 camera = Camera(
@@ -30,18 +22,20 @@ camera.start()
 while running:
 
     img = camera.get_image()
-    img = Image.fromarray(img).convert("RGB")
-    img_tensor = transform(img).unsqueeze(0)
+    if img is None:
+        clock.tick(15)
+        continue
 
-    with torch.no_grad():
-        output = sign_model(img_tensor)
-        _, predicted = torch.max(output, 1)
+    results = runtime.predict(img)
 
-    if predicted.item() == 0:
+    if results['sign'].index == 0:
         print("parking")
     else:
         print("stop")
 
-    clock.tick(1)
+    if results['forward'].index == 0:
+        print("obstacle ahead")
+
+    clock.tick(15)
 
 camera.stop()
@@ -1,114 +1,41 @@
+import os
 from picarx import Picarx
 from camera import Camera
 from display import Display
-from pygame import time
-from pygame import mixer
-from robot_hat import PWM, Music, Buzzer, set_volume, enable_speaker, disable_speaker
-import os
-import numpy as np
-import cv2
-from ultralytics import YOLO
-
-"""Definition image size and region of interest"""
-WIDTH = 640
-HEIGHT = 480
-
-Y = HEIGHT - 100
-REGION_HEIGHT = 50
-CENTER = WIDTH//2
-
-FPS = 30
-
-MAX_STEERING = 30
-MAX_ERROR = WIDTH // 2
+from model_registry import ModelRegistry
+from car_config import ConfigWatcher, load_config
+from scheduler import Scheduler
+from self_driving_car.lane import LaneFollower
 
-"""Control loop mechanism calculating the lane's position to the CENTER"""
-class PID:
-
-    """
-       @param kp: Proportional gain - Reaction to current error
-       @param ki: Integral gain - Reaction to accumulated error
-       @param kd: Derivative gain - Reaction to rate of change of error
-    """
-    def __init__(self, kp, ki, kd):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.prev_error = 0
-        self.integral = 0
-
-    """
-        Compute the PID output based on the current error
-        @param error: The current error value 
-        @param dt: Time interval since the last computation
-        @return: The computed control output
-    """
-    def compute(self, error, dt):
-        self.integral += error * dt
-        # Optional: Clamp the integral to avoid wind-up
-        self.integral = max(min(self.integral, 100), -100)
-
-        derivative = (error - self.prev_error) / dt if dt > 0 else 0
-
-        output = (
-            self.kp * error +
-            self.ki * self.integral +
-            self.kd * derivative
-        )
+"""Image size, region of interest, gains and limits, from picar.json (see car_config.py)"""
+CONFIG_PATH = os.environ.get('PICAR_CONFIG', 'picar.json')
+config = load_config(CONFIG_PATH)
 
-        self.prev_error = error
-        return output
-
-"""
-    Process the input frame to detect lane lines and calculate the error
-    @param frame: The input image frame from the camera
-    @return: The calculated error and the processed frame
-"""
-def process_frame(frame):
-    if frame is None:
-        print("Warning")
-        return None, frame
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    region = gray[Y:Y+REGION_HEIGHT, :]
-    blurred = cv2.GaussianBlur(region, (5,5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
-    edge_indices = np.where(edges > 0 )[1]
-
-    if len(edge_indices) >= 2:
-        line_center = (np.min(edge_indices) + np.max(edge_indices)) // 2
-        print(f"line_center: {line_center}")
-
-        error = CENTER - line_center
-        print(f"error: {error}")
-
-        return error, frame
-    else:
-        return None, frame
-
-pid = PID(kp=0.9, ki=0, kd=0)
+"""Control loop mechanism calculating the lane's position to the center"""
+follower = LaneFollower.from_config(config)
 
 """
     Main control loop for the line-following robot
 """
 def main():
     px = Picarx()
-    clock = time.Clock()
-    FPS = 30
+    FPS = config.drive.fps
+    scheduler = Scheduler()
+    camera = None
 
-    # Load YOLO model
-    print("Loading YOLO model...")
-    model = YOLO('yolov8n.pt')  # Your trained model file
-    print("Model loaded successfully!")
+    # Gains and limits follow edits of picar.json while driving
+    watcher = ConfigWatcher(config, CONFIG_PATH)
+    watcher.start()
 
-    timer = 0
+    # Load YOLO model in the background while the camera starts
+    registry = ModelRegistry()
+    registry.register_yolo('detector', config.detector.weights or 'yolov8n.pt',  # Your trained model file
+                           image_size=config.detector.image_size)
+    registry.load_all()
 
     try:
         # Initialize camera
-        camera = Camera(
-            size=(640, 480),
-            vflip=True,
-            hflip=True
-        )
+        camera = Camera.from_config(config.camera)
 
         print("Starting camera...")
         camera.start()
@@ -120,28 +47,26 @@ def main():
         display.show(
             local=True,
             web=True,
-            port=9000
+            port=config.display.port
         )
 
         px.set_cam_tilt_angle(0)
         px.set_cam_pan_angle(0)
 
-        while True:
-            if timer > 30:
-                frame = camera.get_image()
-
-                if frame is not None:
-                    error, processed_frame = process_frame(frame)
-
-                    dt = 1/FPS
-                    if error is not None:
-                        raw_steering = pid.compute(error, dt)
-                        print(f"raw_steering: {raw_steering}")
-                        scaled_steering = np.clip((raw_steering / MAX_ERROR) * MAX_STEERING, -30, 30)
-                        px.set_dir_servo_angle(-scaled_steering)
-                        print(f"scaled_steering: {scaled_steering}")
-                    else:
-                        print("Line not detected")
+        def control(dt):
+            frame = camera.get_image()
+            if frame is None:
+                return
+            steering, _ = follower.update(frame, dt)
+            if follower.error is not None:
+                px.set_dir_servo_angle(steering)
+                print(f"steering: {steering}")
+            else:
+                print("Line not detected")
+
+        # Fixed-rate steering once the camera has warmed up, sleeping between frames
+        scheduler.add('control', control, period=1 / FPS, delay=config.drive.warm_up_frames / FPS)
+        scheduler.run()
 
     except KeyboardInterrupt:
         px.forward(0)
@@ -150,7 +75,9 @@ def main():
         print(f"Error: {e}")
     finally:
         px.forward(0)
-        camera.stop()
+        if camera:
+            camera.stop()
+        scheduler.report()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,5 @@
+import sys
+
+from self_driving_car.cli import main
+
+sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Safety behaviours of the driving loops, published to an arbiter.Arbiter
+
+Replaces the `0 in detected_classes` / `1 in detected_classes` checks of
+main_loop.py with behaviours that publish prioritized commands:
+
+- emergency stop: the detector stalled (no result for safety.max_detection_age seconds)
+- parking: a parking sign is detected, the car stays stopped while it is seen
+- stop sign: stop for safety.stop_hold seconds, then drive on past the sign
+
+With a sign_range.SignRanger (SignBehaviours.from_config() with
+signs.enabled) parking and stop signs only act once they are within
+safety.stop_distance meters, so the car keeps driving while a sign is still
+far away. Without, any detection of the class acts.
+
+Detections are stamped with the detector's detection_time and expire after
+safety.detection_ttl seconds, so a detection that isn't refreshed stops
+holding the car. The lane follower publishes its command with the lowest
+priority, see drive_tick(), with the speed of a speed.SpeedController if
+one is given: slower in curves, when a sign comes close and when perception
+lags behind.
+
+Usage:
+    arbiter = Arbiter(period=1 / config.drive.fps)
+    behaviours = SignBehaviours.from_config(config)
+    command = drive_tick(arbiter, behaviours, follower, detector, frame, dt,
+                         speed=SpeedController.from_config(config))
+"""
+
+import time
+
+from arbiter import EMERGENCY_STOP, LANE_FOLLOW, PARKING, StopSignHold
+
+# YOLO classes of my_yolo.pt
+PARKING_CLASS = 0
+STOP_CLASS = 1
+
+
+class SignBehaviours:
+    """Emergency stop, parking and stop-sign hold from the detector's results"""
+
+    def __init__(self, config, parking_class=PARKING_CLASS, stop_class=STOP_CLASS, ranger=None):
+        """Initialize the behaviours
+
+        Args:
+            config (car_config.SafetyConfig): Times and stop distance of the behaviours, read at every update
+            parking_class (int): Detector class of the parking sign
+            stop_class (int): Detector class of the stop sign
+            ranger (SignRanger): Distance of the signs, None to act on any detection
+        """
+        self.config = config
+        self.parking_class = parking_class
+        self.stop_class = stop_class
+        self.ranger = ranger
+        self.stop_sign = StopSignHold(config.stop_hold, config.stop_cooldown)
+
+    @classmethod
+    def from_config(cls, config):
+        """Behaviours of the safety section, with a SignRanger if signs.enabled"""
+        ranger = None
+        if config.signs.enabled:
+            from self_driving_car.sign_range import SignRanger
+
+            ranger = SignRanger.from_config(config)
+        return cls(config.safety, ranger=ranger)
+
+    def update(self, arbiter, detector, now):
+        """Publish the commands of the behaviours for the detector's latest results
+
+        Args:
+            arbiter (Arbiter): Arbiter to publish to
+            detector (ObjectDetection): Detector with detected_classes and detection_time
+            now (float): Current time of the arbiter's clock
+        """
+        config = self.config
+        stamp = detector.detection_time
+        if stamp is None or now - stamp > config.max_detection_age:
+            arbiter.publish('emergency_stop', EMERGENCY_STOP, speed=0.0, ttl=arbiter.period, stamp=now)
+            return
+        arbiter.withdraw('emergency_stop')
+
+        if self.ranger is not None:
+            self.ranger.update(detector.detected_objects, stamp)
+        if self.is_near(self.parking_class, detector, now):
+            arbiter.publish('parking', PARKING, speed=0.0, ttl=config.detection_ttl, stamp=stamp)
+
+        self.stop_sign.hold = config.stop_hold
+        self.stop_sign.cooldown = config.stop_cooldown
+        seen = self.is_near(self.stop_class, detector, now) and now - stamp <= config.detection_ttl
+        self.stop_sign.update(arbiter, seen, now, stamp)
+
+    def is_near(self, class_id, detector, now):
+        """Whether a sign of the class is detected, within safety.stop_distance with a ranger"""
+        if self.ranger is None:
+            return class_id in detector.detected_classes
+        track = self.ranger.nearest(now, (class_id,))
+        return (track is not None and now - track.stamp <= self.config.detection_ttl
+                and self.ranger.distance_at(track, now) <= self.config.stop_distance)
+
+    def sign_distance(self, now):
+        """Meters to the nearest parking or stop sign seen within safety.detection_ttl, None without ranger"""
+        if self.ranger is None:
+            return None
+        track = self.ranger.nearest(now, (self.parking_class, self.stop_class))
+        if track is None or now - track.stamp > self.config.detection_ttl:
+            return None
+        return self.ranger.distance_at(track, now)
+
+
+def drive_tick(arbiter, behaviours, follower, detector, frame, dt, speed=None):
+    """One control tick: publish the behaviours and the lane command, and choose the command
+
+    Args:
+        arbiter (Arbiter): Arbiter of the loop
+        behaviours (SignBehaviours): Sign behaviours, None without a detector
+        follower (LaneFollower): Lane follower
+        detector (ObjectDetection): Detector, None to drive without signs
+        frame (np.ndarray): Camera frame
+        dt (float): Seconds since the previous tick
+        speed (SpeedController): Speed profile of the lane command, None for the follower's constant speed
+
+    Returns:
+        Command: The command to send to the motors (stopped straight if nothing is valid)
+    """
+    now = arbiter.clock()
+    if behaviours is not None and detector is not None:
+        behaviours.update(arbiter, detector, now)
+
+    started = time.perf_counter()
+    steering, lane_speed = follower.update(frame, dt)
+    if follower.error is not None:
+        if speed is not None:
+            # Perception latency: processing this frame, predicting without measurement, old detections
+            latency = time.perf_counter() - started
+            if follower.estimator is not None:
+                latency += follower.estimator.since_measurement
+            if detector is not None and detector.detection_time is not None:
+                latency = max(latency, now - detector.detection_time)
+            sign_distance = behaviours.sign_distance(now) if behaviours is not None else None
+            lane_speed = speed.update(dt, follower.curvature, sign_distance, latency)
+        # Valid until the next tick, a lost line stops the car
+        arbiter.publish('lane', LANE_FOLLOW, steering=steering, speed=lane_speed, ttl=2 * dt, stamp=now)
+    else:
+        arbiter.withdraw('lane')
+    command = arbiter.decide()
+    if speed is not None:
+        # Ramp up again from the speed the car really got, e.g. 0 after a stop
+        speed.speed = command.speed
+    # What the car really does, e.g. stopped at a sign, drives the lane estimator's prediction
+    follower.command = (command.steering, command.speed)
+    return command
@@ -0,0 +1,335 @@
+"""
+Camera calibration and precomputed bird's-eye remap tables
+
+Calibration, done once per car and saved to a JSON file:
+
+1. Intrinsics: camera matrix and lens distortion from 10-20 photos of a
+   printed checkerboard held at different angles (cv2.calibrateCamera).
+2. Ground plane: one photo of the checkerboard lying flat on the floor in
+   front of the car, at a measured position. Its corners give the
+   homography from (undistorted) pixels to floor coordinates in meters
+   (x forward, y left of the camera).
+
+At run time BirdsEyeView composes undistortion and the ground homography
+into one pair of remap tables, computed once, covering only the rows of the
+frame that see the lane region. Each frame then costs a single cv2.remap of
+that region instead of cv2.undistort + cv2.warpPerspective of the whole
+frame. Every pixel of the top view is resolution meters, so lane geometry
+(and the gains steering on it) no longer depends on the camera resolution.
+
+Usage:
+    python -m self_driving_car.calibration intrinsics calibration.json photos/board_*.jpg --pattern 9x6 --square 0.025
+    python -m self_driving_car.calibration ground calibration.json floor.jpg --pattern 9x6 --square 0.025 --origin 0.20,0.10
+    python -m self_driving_car.calibration view calibration.json frame.jpg -o top.png
+
+    calibration = Calibration.load('calibration.json')
+    view = BirdsEyeView(calibration, frame_size=(640, 480))
+    top = view.warp(frame)                  # (forward_max - forward_min) / resolution rows
+    points = view.line_points(frame)        # [(forward, left), ...] in meters
+"""
+
+import argparse
+import json
+import math
+
+import cv2
+import numpy as np
+
+
+def find_corners(image, pattern):
+    """Checkerboard inner corners with sub-pixel refinement
+
+    Args:
+        image (np.ndarray): BGR or gray image
+        pattern (tuple): Inner corners per row and column, e.g. (9, 6)
+
+    Returns:
+        np.ndarray: (N, 1, 2) float32 corners, None if the board wasn't found
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    found, corners = cv2.findChessboardCorners(gray, pattern, cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    return cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+
+
+def board_points(pattern, square):
+    """Corner coordinates on the board in meters, in the order findChessboardCorners returns them"""
+    columns, rows = pattern
+    points = np.zeros((rows * columns, 3), np.float32)
+    points[:, :2] = np.mgrid[0:columns, 0:rows].T.reshape(-1, 2) * square
+    return points
+
+
+class Calibration:
+    """Camera matrix, distortion and ground homography of a camera"""
+
+    def __init__(self, image_size, camera_matrix=None, distortion=None, homography=None, rms=None):
+        """
+        Args:
+            image_size (tuple): (width, height) the calibration was made at
+            camera_matrix (np.ndarray): 3x3 intrinsics, a pinhole guess if None
+            distortion (np.ndarray): OpenCV distortion coefficients, none if None
+            homography (np.ndarray): 3x3 from undistorted pixels to floor (forward, left) in meters
+            rms (float): Reprojection error of the intrinsics in pixels
+        """
+        self.image_size = tuple(int(value) for value in image_size)
+        if camera_matrix is None:
+            width, height = self.image_size
+            camera_matrix = [[width, 0, width / 2], [0, width, height / 2], [0, 0, 1]]
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.distortion = np.zeros(5) if distortion is None else np.asarray(distortion, dtype=np.float64).ravel()
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64)
+        self.rms = rms
+
+    @classmethod
+    def from_intrinsics(cls, images, pattern=(9, 6), square=0.025):
+        """Calibrate the camera matrix and distortion from checkerboard photos
+
+        Args:
+            images (list): BGR images of the board in different poses
+            pattern (tuple): Inner corners per row and column
+            square (float): Side of a square in meters
+
+        Returns:
+            Calibration: The intrinsics, no homography yet
+
+        Raises:
+            ValueError: If the board was found in fewer than 3 images
+        """
+        object_points, image_points = [], []
+        for image in images:
+            corners = find_corners(image, pattern)
+            if corners is not None:
+                object_points.append(board_points(pattern, square))
+                image_points.append(corners)
+        if len(image_points) < 3:
+            raise ValueError(f"Checkerboard {pattern[0]}x{pattern[1]} found in {len(image_points)} "
+                             f"of {len(images)} images, at least 3 are needed")
+
+        height, width = images[0].shape[:2]
+        rms, camera_matrix, distortion, _, _ = cv2.calibrateCamera(object_points, image_points, (width, height),
+                                                                   None, None)
+        print(f"Intrinsics from {len(image_points)} of {len(images)} images, reprojection error {rms:.3f} px")
+        return cls((width, height), camera_matrix, distortion, rms=rms)
+
+    def calibrate_ground(self, image, pattern=(9, 6), square=0.025, origin=(0.2, 0.0)):
+        """Ground homography from a photo of the board lying on the floor
+
+        The board lies flat with its corner rows across the car. Use a board with different
+        numbers of corners per row and column, so its orientation is unambiguous.
+
+        Args:
+            image (np.ndarray): BGR photo from the car's camera at its driving pose
+            pattern (tuple): Inner corners per row and column
+            square (float): Side of a square in meters
+            origin (tuple): (forward, left) in meters of the far-left inner corner (as seen
+                by the camera), measured from the point on the floor below the camera
+
+        Returns:
+            np.ndarray: The homography, also stored in self.homography
+
+        Raises:
+            ValueError: If the board isn't found
+        """
+        corners = find_corners(image, pattern)
+        if corners is None:
+            raise ValueError(f"Checkerboard {pattern[0]}x{pattern[1]} not found")
+        undistorted = self.undistort_points(corners.reshape(-1, 2))
+
+        # Orient the board by the image: corner rows run left to right, columns from far to near
+        board = board_points(pattern, square)[:, :2]
+        floor = np.stack([origin[0] - board[:, 1], origin[1] - board[:, 0]], axis=1)
+        if undistorted[0, 0] > undistorted[-1, 0]:
+            # findChessboardCorners started from the other end of the board
+            floor = floor[::-1]
+        self.homography, _ = cv2.findHomography(undistorted, floor)
+        residual = np.linalg.norm(self.pixel_to_floor(corners.reshape(-1, 2)) - floor, axis=1)
+        print(f"Ground homography, mean corner error {residual.mean() * 1000:.1f} mm")
+        return self.homography
+
+    def undistort_points(self, points):
+        """Pixel coordinates with the lens distortion removed (same camera matrix)"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if not self.distortion.any():
+            return points.reshape(-1, 2)
+        return cv2.undistortPoints(points, self.camera_matrix, self.distortion, P=self.camera_matrix).reshape(-1, 2)
+
+    def pixel_to_floor(self, points):
+        """Floor points (forward, left) in meters of raw image pixels"""
+        undistorted = self.undistort_points(points).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(undistorted, self.homography).reshape(-1, 2)
+
+    def scaled(self, image_size):
+        """The calibration for frames of another resolution (same camera and field of view)"""
+        sx = image_size[0] / self.image_size[0]
+        sy = image_size[1] / self.image_size[1]
+        scale = np.diag([sx, sy, 1.0])
+        camera_matrix = scale @ self.camera_matrix
+        homography = None if self.homography is None else self.homography @ np.linalg.inv(scale)
+        return Calibration(image_size, camera_matrix, self.distortion, homography, self.rms)
+
+    def to_dict(self):
+        return {
+            'image_size': list(self.image_size),
+            'camera_matrix': self.camera_matrix.tolist(),
+            'distortion': self.distortion.tolist(),
+            'homography': None if self.homography is None else self.homography.tolist(),
+            'rms': self.rms,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Calibration written to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['image_size'], data['camera_matrix'], data['distortion'], data.get('homography'),
+                   data.get('rms'))
+
+
+class BirdsEyeView:
+    """Undistorted top view of the floor in front of the car, by one precomputed remap"""
+
+    def __init__(self, calibration, frame_size=None, forward_range=(0.12, 0.45), half_width=0.25, resolution=0.005):
+        """Precompute the remap tables
+
+        Args:
+            calibration (Calibration): Calibration with a ground homography
+            frame_size (tuple): (width, height) of the frames, defaults to the calibration's
+            forward_range (tuple): Floor distances in meters covered by the view (near, far)
+            half_width (float): Meters covered left and right of the camera
+            resolution (float): Meters per pixel of the view
+        """
+        if calibration.homography is None:
+            raise ValueError("The calibration has no ground homography, run the ground calibration first")
+        if frame_size is not None and tuple(frame_size) != calibration.image_size:
+            calibration = calibration.scaled(frame_size)
+        self.calibration = calibration
+        self.forward_range = forward_range
+        self.half_width = half_width
+        self.resolution = resolution
+
+        # Row 0 is the far edge, column 0 the left edge
+        rows = int(round((forward_range[1] - forward_range[0]) / resolution))
+        columns = int(round(2 * half_width / resolution))
+        self.forward = forward_range[1] - (np.arange(rows) + 0.5) * resolution
+        self.left = half_width - (np.arange(columns) + 0.5) * resolution
+        forward, left = np.meshgrid(self.forward, self.left, indexing='ij')
+
+        # Floor -> undistorted pixel -> raw (distorted) pixel
+        floor = np.stack([forward, left], axis=-1).reshape(-1, 1, 2)
+        undistorted = cv2.perspectiveTransform(floor, np.linalg.inv(calibration.homography)).reshape(-1, 2)
+        k = calibration.camera_matrix
+        normalized = np.stack([(undistorted[:, 0] - k[0, 2]) / k[0, 0], (undistorted[:, 1] - k[1, 2]) / k[1, 1],
+                               np.ones(len(undistorted))], axis=1)
+        raw, _ = cv2.projectPoints(normalized, np.zeros(3), np.zeros(3), k, calibration.distortion)
+        raw = raw.reshape(rows, columns, 2).astype(np.float32)
+
+        # Only the rows the view reads from are passed to remap
+        width, height = calibration.image_size
+        inside = (raw[..., 0] >= 0) & (raw[..., 0] < width) & (raw[..., 1] >= 0) & (raw[..., 1] < height)
+        if not inside.any():
+            raise ValueError("The bird's-eye region is not visible in the frame")
+        self.roi = (max(0, int(math.floor(raw[..., 1][inside].min())) - 1),
+                    min(height, int(math.ceil(raw[..., 1][inside].max())) + 2))
+        raw[..., 1] -= self.roi[0]
+        self.coverage = float(inside.mean())
+        # Fixed point maps make remap about twice as fast as float maps
+        self.map1, self.map2 = cv2.convertMaps(raw[..., 0], raw[..., 1], cv2.CV_16SC2)
+
+    @property
+    def shape(self):
+        return len(self.forward), len(self.left)
+
+    def warp(self, frame):
+        """Top view of the floor, (rows far to near, columns left to right), resolution meters per pixel"""
+        roi = frame[self.roi[0]:self.roi[1]]
+        return cv2.remap(roi, self.map1, self.map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def line_points(self, frame, strips=6, canny_low=50, canny_high=150):
+        """Line center on the floor in several strips of the top view
+
+        Args:
+            frame (np.ndarray or None): Camera frame
+            strips (int): Number of strips, from near to far
+            canny_low (int): Lower edge detection threshold
+            canny_high (int): Upper edge detection threshold
+
+        Returns:
+            list: (forward, left) in meters of the line center of every strip where it was found
+        """
+        if frame is None:
+            return []
+        top = self.warp(frame)
+        gray = cv2.cvtColor(top, cv2.COLOR_RGB2GRAY) if top.ndim == 3 else top
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), canny_low, canny_high)
+
+        points = []
+        bounds = np.linspace(0, len(self.forward), strips + 1).astype(int)
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            columns = np.flatnonzero(edges[first:last].any(axis=0))
+            if len(columns) < 2:
+                continue
+            center = (columns[0] + columns[-1]) / 2
+            points.append((float(self.forward[first:last].mean()), float(self.half_width - (center + 0.5) * self.resolution)))
+        return points
+
+
+def _pattern(text):
+    columns, rows = text.lower().split('x')
+    return int(columns), int(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Camera intrinsics, ground homography and bird's-eye view")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    intrinsics = subcommands.add_parser("intrinsics", help="camera matrix and distortion from checkerboard photos")
+    intrinsics.add_argument("output", help="calibration JSON file to write")
+    intrinsics.add_argument("images", nargs="+", help="photos of the board in different poses")
+
+    ground = subcommands.add_parser("ground", help="add the ground homography from a photo of the board on the floor")
+    ground.add_argument("calibration", help="calibration JSON file, updated (created without intrinsics if missing)")
+    ground.add_argument("image", help="photo of the board lying on the floor, from the driving pose")
+    ground.add_argument("--origin", default="0.2,0.0",
+                        help="forward,left meters of the board's far-left inner corner from the point below the camera")
+
+    for subparser in (intrinsics, ground):
+        subparser.add_argument("--pattern", type=_pattern, default=(9, 6), help="inner corners, e.g. 9x6")
+        subparser.add_argument("--square", type=float, default=0.025, help="square size in meters")
+
+    view = subcommands.add_parser("view", help="write the bird's-eye view of an image")
+    view.add_argument("calibration")
+    view.add_argument("image")
+    view.add_argument("-o", "--output", default="birds_eye.png")
+    args = parser.parse_args(argv)
+
+    if args.command == "intrinsics":
+        images = [cv2.imread(path) for path in args.images]
+        Calibration.from_intrinsics([image for image in images if image is not None],
+                                    args.pattern, args.square).save(args.output)
+    elif args.command == "ground":
+        image = cv2.imread(args.image)
+        try:
+            calibration = Calibration.load(args.calibration)
+        except FileNotFoundError:
+            calibration = Calibration((image.shape[1], image.shape[0]))
+        if (image.shape[1], image.shape[0]) != calibration.image_size:
+            calibration = calibration.scaled((image.shape[1], image.shape[0]))
+        origin = tuple(float(value) for value in args.origin.split(','))
+        calibration.calibrate_ground(image, args.pattern, args.square, origin)
+        calibration.save(args.calibration)
+    elif args.command == "view":
+        image = cv2.imread(args.image)
+        birds_eye = BirdsEyeView(Calibration.load(args.calibration), (image.shape[1], image.shape[0]))
+        cv2.imwrite(args.output, birds_eye.warp(image))
+        print(f"Bird's-eye view written to {args.output} ({birds_eye.resolution * 1000:.0f} mm per pixel)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+"""
+picar: one command line for driving, recording, training, benchmarking and streaming
+
+Every subcommand builds the car from a JSON config file instead of the
+constants hard-coded in main_loop.py and the examples, so the same
+experiment can be repeated on another car (or in the simulator) by
+switching the config file or overriding single values. Options of every
+subcommand:
+
+    --config FILE          JSON file (see car_config.py in basic-library), default $PICAR_CONFIG
+    --set SECTION.KEY=VAL  override one value; PICAR_<SECTION>_<KEY> variables work too
+    --backend pi|sim       PiCar-X hardware, or the headless simulator
+    --profile              print a startup profile (imports, model loading, first frame)
+
+drive and record also take --watch, which applies edits of the config file's
+gains, thresholds and speeds while driving.
+
+Heavy modules (torch, ultralytics, picamera2, the web server) are imported by
+the subcommands that use them, so e.g. `picar drive --backend sim` never loads
+the detector.
+
+Usage (from self-driving-car-library; basic-library is found next to it):
+    python -m self_driving_car drive --backend sim --duration 60
+    python -m self_driving_car drive --config picar.json
+    python -m self_driving_car record drives/run1 --config picar.json --duration 120
+    python -m self_driving_car train sign self_driving_car/sign --epochs 10
+    python -m self_driving_car benchmark --backend sim --frames 300
+    python -m self_driving_car compare --speeds 60,100 --set lane.y=300 --set lane.region_height=180
+    python -m self_driving_car stream --config picar.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BASIC_LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'basic-library')
+
+
+def make_backend(config, backend, realtime=False):
+    """Car and camera for the backend
+
+    Returns:
+        tuple: (car, camera, simulator); simulator is None on the hardware
+    """
+    if backend == 'sim':
+        from self_driving_car.simulator import SimCar, Simulator
+
+        sim_config = config.sim
+        car = SimCar(wheelbase=sim_config.wheelbase, max_speed=sim_config.max_speed,
+                     max_steering=config.lane.max_steering, grip=sim_config.grip)
+        camera_options = {'size': (config.camera.width, config.camera.height), 'fov': sim_config.fov,
+                          'height': sim_config.camera_height, 'pitch': sim_config.camera_pitch,
+                          'fps': config.drive.fps}
+        simulator = Simulator(car=car, camera_options=camera_options, realtime=realtime,
+                              start_offset=sim_config.start_offset)
+        return simulator.car, simulator.camera, simulator
+
+    from picarx import Picarx
+    from camera import Camera
+
+    return Picarx(), Camera.from_config(config.camera), None
+
+
+def make_follower(config):
+    from self_driving_car.lane import LaneFollower
+
+    return LaneFollower.from_config(config)
+
+
+def start_detector(config, camera):
+    """ObjectDetection thread on the camera, its model loading in the background"""
+    from model_registry import ModelRegistry
+    from object_detection import ObjectDetection
+
+    detector_config = config.detector
+    registry = ModelRegistry()
+    registry.register_yolo(detector_config.weights, detector_config.weights, image_size=detector_config.image_size)
+    registry.load_all()
+
+    detector = ObjectDetection.from_config(camera, detector_config, registry=registry)
+    detector.start()
+    return detector, registry
+
+
+def start_display(config, camera, force=False):
+    display_config = config.display
+    if not (force or display_config.local or display_config.web):
+        return None
+    from display import Display
+
+    display = Display(camera)
+    display.show(local=display_config.local, web=display_config.web or force, port=display_config.port)
+    return display
+
+
+def print_summary(stats):
+    print("\nSummary:")
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            print(f"  {name}:")
+            for key, item in value.items():
+                print(f"    {key}: {item}")
+            continue
+        if isinstance(value, float):
+            value = round(value, 4)
+        elif isinstance(value, list):
+            value = [round(v, 2) for v in value]
+        print(f"  {name}: {value}")
+
+
+def write_json(path, data):
+    if path:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f"Results written to {path}")
+
+
+def drive(config, args, profiler, recorder_path=None):
+    """Lane following with optional sign detection, display and recording
+
+    Stops for parking and stop signs like main_loop.py. On the simulator the
+    scheduler's sleep advances simulated time instead of waiting.
+    """
+    from arbiter import Arbiter
+    from scheduler import Scheduler
+    from speed import SpeedController
+    from self_driving_car.behaviours import SignBehaviours, drive_tick
+
+    car, camera, simulator = make_backend(config, args.backend)
+    follower = make_follower(config)
+    speed_controller = SpeedController.from_config(config) if config.speed.enabled else None
+    period = 1 / config.drive.fps
+    detector = registry = display = recorder = control_task = arbiter = None
+    start = time.monotonic()
+    frames = 0
+
+    try:
+        with profiler.phase("camera start"):
+            camera.start()
+        profiler.mark("camera started")
+
+        if config.detector.weights:
+            detector, registry = start_detector(config, camera)
+        display = start_display(config, camera)
+
+        if recorder_path:
+            from recorder import DriveRecorder
+            recorder = DriveRecorder(recorder_path)
+            recorder.start()
+
+        car.set_cam_tilt_angle(0)
+        car.set_cam_pan_angle(0)
+
+        frames = 0
+        steering = speed = 0.0
+
+        def control(dt):
+            nonlocal frames, steering, speed
+            # Don't drive before the detector can see signs
+            if detector is not None and not detector.is_ready:
+                return
+            frame = camera.get_image()
+            if frames == 0:
+                profiler.mark("first frame")
+            frames += 1
+
+            command = drive_tick(arbiter, behaviours, follower, detector, frame, dt, speed=speed_controller)
+            steering, speed = command.steering, command.speed
+            car.set_dir_servo_angle(steering)
+            car.forward(speed)
+
+            if recorder:
+                recorder.record(frame, controls={'steering': steering, 'speed': speed},
+                                detections=detector.detected_objects if detector else None,
+                                timestamp=simulator.time if simulator else None)
+
+        # The simulator's clock only advances when the scheduler "sleeps" until the next deadline
+        if simulator:
+            clock = lambda: simulator.time
+            scheduler = Scheduler(clock=clock, sleep=simulator.step)
+        else:
+            clock = time.monotonic
+            scheduler = Scheduler()
+        # Sign behaviours and lane following publish prioritized commands, the arbiter picks one per tick
+        arbiter = Arbiter(period, clock=clock)
+        behaviours = SignBehaviours.from_config(config) if detector else None
+        # Start after the camera's warm-up frames
+        control_task = scheduler.add('control', control, period, delay=config.drive.warm_up_frames * period)
+        start = time.monotonic()
+        scheduler.run(args.duration)
+
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        car.forward(0)
+        if recorder:
+            recorder.stop()
+        if detector:
+            detector.stop()
+        if display:
+            display.close()
+        camera.stop()
+
+    wall_time = time.monotonic() - start
+    stats = {'frames': frames, 'wall_time': wall_time, 'loop_rate': frames / wall_time if wall_time else 0.0}
+    if control_task:
+        timing = control_task.stats()
+        stats.update({'overruns': timing['overruns'], 'jitter_p95_ms': timing['jitter_p95'],
+                      'control_p95_ms': timing['duration_p95']})
+    if arbiter:
+        stats['reactions'] = arbiter.stats()
+    if detector and detector.gate:
+        stats['gate'] = detector.gate_stats()
+    if simulator:
+        stats.update(simulator.stats())
+    if registry:
+        profiler.add_model_status(registry.status())
+    print_summary(stats)
+    write_json(args.json, stats)
+    return stats
+
+
+def record(config, args, profiler):
+    """Drive and record frames, controls and detections into a drive log"""
+    return drive(config, args, profiler, recorder_path=args.output)
+
+
+def stream(config, args, profiler):
+    """Stream the camera (and detections, if a detector is configured) to the web/local display"""
+    car, camera, simulator = make_backend(config, args.backend, realtime=True)
+    detector = display = None
+    try:
+        camera.start()
+        profiler.mark("camera started")
+        if config.detector.weights:
+            detector, _ = start_detector(config, camera)
+            detector.is_image_thread = True
+        display = start_display(config, detector or camera, force=True)
+        profiler.mark("display started")
+
+        start = time.monotonic()
+        while args.duration is None or time.monotonic() - start < args.duration:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        if detector:
+            detector.stop()
+        if display:
+            display.close()
+        camera.stop()
+
+
+def train(config, args, profiler):
+    """Train SignClassifier or ForwardClassifier with the training harness"""
+    from self_driving_car.training import MODELS, train_classifier
+
+    train_config = config.train
+    output = args.output or getattr(config.classifiers, args.model) or f"{args.model}_classifier.pth"
+    with profiler.phase("training"):
+        train_classifier(MODELS[args.model](), args.root, output, n_epochs=args.epochs or train_config.epochs,
+                         batch_size=train_config.batch_size, workers=train_config.workers, bf16=args.bf16)
+
+
+def _timed(function, *inputs):
+    start = time.perf_counter()
+    result = function(*inputs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def benchmark(config, args, profiler):
+    """Per-stage latency of the driving pipeline on frames of the backend camera
+
+    Stages: capture (rendering on the simulator), lane detection, the frame
+    classifiers (if their weights exist), the detector gate and the YOLO
+    detector (if configured; the batch of tiles with detector.tile_size).
+    On the simulator the car follows the line, so the frames vary like on a drive.
+    """
+    import numpy as np
+
+    car, camera, simulator = make_backend(config, args.backend)
+    follower = make_follower(config)
+    period = 1 / config.drive.fps
+
+    stages = {'capture': [], 'lane': []}
+    classifiers = None
+    weights = {name: path for name, path in vars(config.classifiers).items() if path and os.path.exists(path)}
+    if weights:
+        from self_driving_car.runtime import ClassifierRuntime
+        with profiler.phase("classifier load"):
+            classifiers = ClassifierRuntime.from_weights(weights)
+        stages['classifiers'] = []
+
+    from detection_gate import make_gate
+
+    gate = make_gate(config.detector)
+    if gate:
+        stages['gate'] = []
+
+    detector = None
+    if config.detector.weights:
+        from model_registry import load_yolo, warm_up_yolo
+        image_size = config.detector.image_size
+        with profiler.phase("detector load"):
+            detector = load_yolo(config.detector.weights, image_size=image_size)
+            warm_up_yolo(detector, image_size)
+        stages['detector'] = []
+
+    try:
+        camera.start()
+        profiler.mark("camera started")
+        for _ in range(args.frames):
+            frame, elapsed = _timed(camera.get_image)
+            stages['capture'].append(elapsed)
+            if frame is None:
+                time.sleep(period)
+                continue
+
+            (steering, speed), elapsed = _timed(follower.update, frame, period)
+            stages['lane'].append(elapsed)
+            if classifiers:
+                stages['classifiers'].append(_timed(classifiers.predict, frame)[1])
+            if gate:
+                stages['gate'].append(_timed(gate, frame)[1])
+            if detector and config.detector.tile_size:
+                from tiling import crop_tiles, tile_grid
+
+                tiles = tile_grid((frame.shape[1], frame.shape[0]), config.detector.roi, config.detector.tile_size,
+                                  config.detector.tile_overlap)
+                crops = crop_tiles(frame, tiles)
+                stages['detector'].append(_timed(lambda: detector(crops, verbose=False, imgsz=len(crops[0])))[1])
+            elif detector:
+                import cv2
+                resized = cv2.resize(frame, image_size)
+                stages['detector'].append(_timed(detector, resized)[1])
+
+            if simulator:
+                car.set_dir_servo_angle(steering)
+                car.forward(speed)
+                simulator.step(period)
+            else:
+                time.sleep(period)
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        car.forward(0)
+        camera.stop()
+
+    results = {}
+    print(f"{'stage':<14}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, times in stages.items():
+        if not times:
+            continue
+        times = np.array(times)
+        results[name] = {'mean': float(times.mean()), 'p50': float(np.percentile(times, 50)),
+                         'p95': float(np.percentile(times, 95)), 'max': float(times.max())}
+        row = results[name]
+        print(f"{name:<14}{row['mean']:>10.2f}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['max']:>10.2f}")
+    total = sum(row['mean'] for row in results.values())
+    print(f"{'total':<14}{total:>10.2f}   ({1000 / total:.0f} FPS if run sequentially)")
+    write_json(args.json, results)
+    return results
+
+
+def compare(config, args, profiler):
+    """Lap time and cross-track error of the steering controllers at several speeds, on the simulator
+
+    All runs use the lane estimator. With speed.enabled the speeds are the caps of the speed profile.
+    """
+    import copy
+
+    from arbiter import Arbiter
+    from speed import SpeedController
+    from self_driving_car.behaviours import drive_tick
+
+    results = []
+    print(f"{'controller':<14}{'speed':>7}{'lap s':>9}{'mean cte mm':>13}{'max cte mm':>12}{'stopped %':>11}")
+    for speed in args.speeds:
+        for controller in args.controllers:
+            run_config = copy.deepcopy(config)
+            run_config.drive.speed = float(speed)
+            run_config.tracking.controller = controller
+            # The estimator's sim geometry is exact in the simulator, and all controllers get the same filter
+            run_config.estimator.enabled = True
+            run_config.validate()
+
+            car, camera, simulator = make_backend(run_config, 'sim')
+            follower = make_follower(run_config)
+            period = 1 / run_config.drive.fps
+            arbiter = Arbiter(period, clock=lambda: simulator.time)
+            speed_controller = SpeedController.from_config(run_config) if run_config.speed.enabled else None
+            ticks = stopped = 0
+            camera.start()
+            while simulator.time < args.duration:
+                command = drive_tick(arbiter, None, follower, None, camera.get_image(), period, speed=speed_controller)
+                car.set_dir_servo_angle(command.steering)
+                car.forward(command.speed)
+                simulator.step(period)
+                ticks += 1
+                stopped += command.speed == 0
+            camera.stop()
+
+            stats = simulator.stats()
+            # The first lap starts from standing, later ones are flying laps
+            laps = stats['laps'][1:] or stats['laps']
+            row = {'controller': controller, 'speed': speed,
+                   'lap_time': sum(laps) / len(laps) if laps else None,
+                   'mean_cte': stats['mean_cte'], 'max_cte': stats['max_cte'], 'stopped': stopped / ticks}
+            results.append(row)
+            lap = f"{row['lap_time']:.2f}" if laps else "-"
+            print(f"{controller:<14}{speed:>7}{lap:>9}{row['mean_cte'] * 1000:>13.1f}{row['max_cte'] * 1000:>12.1f}"
+                  f"{row['stopped'] * 100:>11.1f}")
+    write_json(args.json, results)
+    return results
+
+
+def build_parser():
+    # Options shared by every subcommand, given after its name: picar drive --backend sim
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", default=None, help="JSON config file, see car_config.py (default: $PICAR_CONFIG)")
+    common.add_argument("--set", action="append", default=[], metavar="SECTION.KEY=VALUE",
+                        help="override a config value, e.g. --set pid.kp=1.2 (repeatable)")
+    common.add_argument("--backend", choices=("pi", "sim"), default="pi",
+                        help="PiCar-X hardware or the headless simulator")
+    common.add_argument("--profile", action="store_true", help="print a startup-time profile")
+
+    parser = argparse.ArgumentParser(prog="picar", description="PiCar-X driving, recording, training, "
+                                                               "benchmarking and streaming")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    drive_parser = subcommands.add_parser("drive", parents=[common], help="follow the line, stopping at signs")
+    record_parser = subcommands.add_parser("record", parents=[common], help="drive and record a drive log")
+    record_parser.add_argument("output", help="drive log directory")
+    for subparser in (drive_parser, record_parser):
+        subparser.add_argument("--duration", type=float, default=None,
+                               help="seconds to drive (simulated seconds on the simulator), until Ctrl+C if omitted")
+        subparser.add_argument("--json", default=None, help="write the run statistics to this file")
+        subparser.add_argument("--watch", action="store_true",
+                               help="reload gains, thresholds and speeds when the config file changes")
+
+    train_parser = subcommands.add_parser("train", parents=[common], help="train a frame classifier")
+    train_parser.add_argument("model", choices=("forward", "sign"))
+    train_parser.add_argument("root", help="ImageFolder dataset (one sub folder per class)")
+    train_parser.add_argument("-o", "--output", default=None, help="checkpoint, defaults to classifiers.<model>")
+    train_parser.add_argument("--epochs", type=int, default=None, help="defaults to train.epochs")
+    train_parser.add_argument("--bf16", action="store_true", help="bfloat16 mixed precision on CPU")
+
+    benchmark_parser = subcommands.add_parser("benchmark", parents=[common], help="per-stage latency of the driving pipeline")
+    benchmark_parser.add_argument("--frames", type=int, default=200)
+    benchmark_parser.add_argument("--json", default=None, help="write the results to this file")
+
+    compare_parser = subcommands.add_parser("compare", parents=[common],
+                                            help="lap time and cross-track error of the steering controllers (simulator)")
+    compare_parser.add_argument("--controllers", type=lambda text: text.split(','),
+                                default=['pid', 'pure_pursuit', 'stanley'], help="comma separated")
+    compare_parser.add_argument("--speeds", type=lambda text: [int(speed) for speed in text.split(',')],
+                                default=[30, 60, 80, 100], help="comma separated speed commands")
+    compare_parser.add_argument("--duration", type=float, default=30, help="simulated seconds per run")
+    compare_parser.add_argument("--json", default=None, help="write the results to this file")
+
+    stream_parser = subcommands.add_parser("stream", parents=[common], help="stream the camera to the web/local display")
+    stream_parser.add_argument("--duration", type=float, default=None, help="seconds, until Ctrl+C if omitted")
+    return parser
+
+
+COMMANDS = {'drive': drive, 'record': record, 'train': train, 'benchmark': benchmark, 'compare': compare,
+            'stream': stream}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # basic-library modules (camera, display, recorder, ...) are imported by name
+    if os.path.isdir(BASIC_LIBRARY) and BASIC_LIBRARY not in sys.path:
+        sys.path.append(BASIC_LIBRARY)
+    from startup_profiler import StartupProfiler
+
+    profiler = StartupProfiler(enabled=args.profile)
+    from car_config import ConfigWatcher, load_config
+
+    try:
+        config = load_config(args.config, overrides=args.set)
+    except (OSError, ValueError) as e:
+        print(f"Config error: {e}")
+        return 2
+
+    watcher = None
+    if getattr(args, 'watch', False):
+        watcher = ConfigWatcher(config, args.config, overrides=args.set)
+        watcher.start()
+
+    try:
+        COMMANDS[args.command](config, args, profiler)
+    finally:
+        if watcher:
+            watcher.stop()
+        profiler.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Post-training compression of the small frame classifiers
+
+Produces smaller and faster variants of SignClassifier / ForwardClassifier and
+reports accuracy, size and CPU latency of each against the float model:
+
+- structured pruning: removes whole conv channels and fc1 units with the
+  smallest L1 norm, so the layers actually shrink (optionally fine-tuned)
+- dynamic INT8 quantization: Linear weights in int8, activations quantized on the fly
+- static INT8 quantization: weights and activations in int8, activation ranges
+  calibrated on images from the training folder
+
+The fc1 layer (32*16*16 -> 100) holds almost all parameters, so pruning conv2
+channels (its inputs) and fc1 units (its outputs) gives most of the size gain.
+
+Usage:
+    python -m self_driving_car.compression sign sign_classifier.pth self_driving_car/sign \\
+        --prune-conv 0.25 --prune-fc 0.5 --finetune 3 --export sign_int8.pt
+"""
+
+import argparse
+import io
+import os
+import platform
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from self_driving_car.runtime import CLASSIFIERS, ClassifierRuntime, MultiHeadClassifier
+from self_driving_car.training import (CachedImageDataset, MODELS, build_cache, evaluate, make_loader,
+                                       train_classifier)
+
+
+class CompactClassifier(nn.Module):
+    """SignClassifier / ForwardClassifier architecture with configurable layer widths
+
+    Same layers and parameter names as the original models, so their weights
+    load as is; flattening with torch.flatten keeps it traceable for static
+    quantization, whose channels-last int8 tensors don't support view().
+    """
+
+    def __init__(self, channels1=16, channels2=32, hidden=100, classes=2):
+        super().__init__()
+        self.config = {'channels1': channels1, 'channels2': channels2, 'hidden': hidden, 'classes': classes}
+        self.conv1 = nn.Conv2d(3, channels1, kernel_size=5, padding=2)
+        self.pool = nn.MaxPool2d(2, 2)
+        self.conv2 = nn.Conv2d(channels1, channels2, kernel_size=5, padding=2)
+        self.fc1 = nn.Linear(channels2 * 16 * 16, hidden)
+        self.fc2 = nn.Linear(hidden, classes)
+
+    def forward(self, x):
+        x = self.pool(F.relu(self.conv1(x)))
+        x = self.pool(F.relu(self.conv2(x)))
+        x = torch.flatten(x, 1)
+        x = F.relu(self.fc1(x))
+        return self.fc2(x)
+
+    @classmethod
+    def from_model(cls, model):
+        """Copy a SignClassifier / ForwardClassifier (or CompactClassifier)"""
+        compact = cls(model.conv1.out_channels, model.conv2.out_channels, model.fc1.out_features,
+                      model.fc2.out_features)
+        compact.load_state_dict(model.state_dict())
+        return compact.eval()
+
+    @classmethod
+    def load(cls, path):
+        """Load a checkpoint written by save()"""
+        checkpoint = torch.load(path, map_location='cpu')
+        model = cls(**checkpoint['config'])
+        model.load_state_dict(checkpoint['state_dict'])
+        return model.eval()
+
+    def save(self, path):
+        """Save the state dict with the layer widths needed to rebuild the model"""
+        torch.save({'config': self.config, 'state_dict': self.state_dict()}, path)
+
+
+def _keep(scores, amount):
+    """Sorted indices of the (1 - amount) highest scores, at least one"""
+    count = max(1, int(round(len(scores) * (1 - amount))))
+    return torch.sort(torch.topk(scores, count).indices).values
+
+
+def prune_structured(model, conv_amount=0.0, fc_amount=0.0):
+    """Remove the conv channels and fc1 units with the smallest L1 norm
+
+    Args:
+        model (nn.Module): SignClassifier, ForwardClassifier or CompactClassifier
+        conv_amount (float): Fraction of the channels of conv1 and conv2 to remove
+        fc_amount (float): Fraction of the fc1 units to remove
+
+    Returns:
+        CompactClassifier: A new, smaller model (fine-tune it to recover accuracy)
+    """
+    model = CompactClassifier.from_model(model)
+    spatial = 16 * 16
+    with torch.no_grad():
+        keep1 = _keep(model.conv1.weight.abs().sum(dim=(1, 2, 3)), conv_amount)
+        keep2 = _keep(model.conv2.weight[:, keep1].abs().sum(dim=(1, 2, 3)), conv_amount)
+        # fc1 inputs are laid out channel by channel, spatial positions within a channel
+        fc1_inputs = (keep2[:, None] * spatial + torch.arange(spatial)[None, :]).reshape(-1)
+        keep_hidden = _keep(model.fc1.weight[:, fc1_inputs].abs().sum(dim=1), fc_amount)
+
+        pruned = CompactClassifier(len(keep1), len(keep2), len(keep_hidden), model.fc2.out_features)
+        pruned.conv1.weight.copy_(model.conv1.weight[keep1])
+        pruned.conv1.bias.copy_(model.conv1.bias[keep1])
+        pruned.conv2.weight.copy_(model.conv2.weight[keep2][:, keep1])
+        pruned.conv2.bias.copy_(model.conv2.bias[keep2])
+        pruned.fc1.weight.copy_(model.fc1.weight[keep_hidden][:, fc1_inputs])
+        pruned.fc1.bias.copy_(model.fc1.bias[keep_hidden])
+        pruned.fc2.weight.copy_(model.fc2.weight[:, keep_hidden])
+        pruned.fc2.bias.copy_(model.fc2.bias)
+    return pruned.eval()
+
+
+def quantized_engine():
+    """qnnpack on ARM (Raspberry Pi), x86 kernels elsewhere"""
+    engines = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ('aarch64', 'arm64', 'armv7l') and 'qnnpack' in engines:
+        return 'qnnpack'
+    return 'x86' if 'x86' in engines else 'fbgemm'
+
+
+def quantize_dynamic(model):
+    """INT8 weights for the Linear layers, activations quantized at run time"""
+    torch.backends.quantized.engine = quantized_engine()
+    return torch.ao.quantization.quantize_dynamic(CompactClassifier.from_model(model), {nn.Linear},
+                                                  dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_loader, batches=16):
+    """INT8 weights and activations, with activation ranges calibrated on real images
+
+    Args:
+        model (nn.Module): Float classifier
+        calibration_loader: Loader of uint8 (N, 3, 64, 64) image batches
+        batches (int): Number of calibration batches
+
+    Returns:
+        torch.fx.GraphModule: Quantized model
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = quantized_engine()
+    torch.backends.quantized.engine = engine
+    example = torch.zeros(1, 3, 64, 64)
+    prepared = prepare_fx(CompactClassifier.from_model(model), get_default_qconfig_mapping(engine), (example,))
+    with torch.inference_mode():
+        for i, (images, _) in enumerate(calibration_loader):
+            if i >= batches:
+                break
+            prepared(images.float().div_(255.0))
+    return convert_fx(prepared).eval()
+
+
+def model_size(model):
+    """Size in bytes of the serialized state dict"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def latency(model, iterations=300, batch_size=1):
+    """Milliseconds per call on CPU"""
+    x = torch.rand(batch_size, 3, 64, 64)
+    with torch.inference_mode():
+        for _ in range(20):
+            model(x)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            model(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def report(variants, loader):
+    """Measure every variant against the first one
+
+    Args:
+        variants (dict): Name -> model, the first entry is the reference
+        loader: Validation loader
+
+    Returns:
+        list[dict]: One row per variant: name, accuracy, accuracy_delta, size_kb, latency_ms, speedup
+    """
+    rows = []
+    for name, model in variants.items():
+        _, accuracy = evaluate(model, loader, torch.device('cpu'))
+        rows.append({'name': name, 'accuracy': accuracy, 'size_kb': model_size(model) / 1024,
+                     'latency_ms': latency(model)})
+    for row in rows:
+        row['accuracy_delta'] = row['accuracy'] - rows[0]['accuracy']
+        row['speedup'] = rows[0]['latency_ms'] / row['latency_ms']
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize and prune a frame classifier")
+    parser.add_argument("model", choices=sorted(MODELS))
+    parser.add_argument("weights", help="float state dict (.pth)")
+    parser.add_argument("root", help="ImageFolder training dataset, used for calibration and evaluation")
+    parser.add_argument("--prune-conv", type=float, default=0.0, help="fraction of conv channels to remove")
+    parser.add_argument("--prune-fc", type=float, default=0.0, help="fraction of fc1 units to remove")
+    parser.add_argument("--finetune", type=int, default=0, help="epochs of fine-tuning after pruning")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--export", default=None,
+                        help="TorchScript file for the statically quantized (pruned) model, loadable "
+                             "with ClassifierRuntime.load()")
+    args = parser.parse_args()
+
+    model = MODELS[args.model]()
+    model.load_state_dict(torch.load(args.weights, map_location='cpu'))
+    model.eval()
+
+    dataset = CachedImageDataset(build_cache(args.root))
+    train_set, val_set = dataset.split(args.val_fraction)
+    if len(val_set) == 0:
+        val_set = dataset
+    calibration_loader = make_loader(train_set, batch_size=32, shuffle=True, workers=0)
+    val_loader = make_loader(val_set, batch_size=64, shuffle=False, workers=0)
+
+    variants = {'float32': model, 'dynamic int8': quantize_dynamic(model),
+                'static int8': quantize_static(model, calibration_loader)}
+
+    if args.prune_conv or args.prune_fc:
+        pruned = prune_structured(model, args.prune_conv, args.prune_fc)
+        checkpoint = os.path.splitext(args.weights)[0] + '_pruned.pth'
+        if args.finetune:
+            train_classifier(pruned, args.root, checkpoint, n_epochs=args.finetune,
+                             val_fraction=args.val_fraction, workers=0)
+            pruned.load_state_dict(torch.load(checkpoint, map_location='cpu'))
+            pruned.eval()
+        # Saved with its layer widths, load it with CompactClassifier.load()
+        pruned.save(checkpoint)
+        print(f"Pruned model {pruned.config} saved to {checkpoint}")
+        variants['pruned'] = pruned
+        variants['pruned static int8'] = quantize_static(pruned, calibration_loader)
+
+    rows = report(variants, val_loader)
+    print(f"{'variant':<20}{'accuracy':>10}{'delta':>8}{'size KB':>10}{'latency ms':>12}{'speedup':>9}")
+    for row in rows:
+        print(f"{row['name']:<20}{row['accuracy']:>10.3f}{row['accuracy_delta']:>+8.3f}{row['size_kb']:>10.0f}"
+              f"{row['latency_ms']:>12.3f}{row['speedup']:>8.2f}x")
+
+    if args.export:
+        final = variants['pruned static int8' if 'pruned' in variants else 'static int8']
+        runtime = ClassifierRuntime(MultiHeadClassifier({args.model: final}), [args.model],
+                                    {args.model: CLASSIFIERS[args.model][1]})
+        runtime.export(args.export)
+        print(f"Exported to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
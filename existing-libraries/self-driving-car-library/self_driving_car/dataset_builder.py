@@ -0,0 +1,290 @@
+"""
+Build labelled training datasets from recorded drives.
+
+Frames are sampled from drive logs (see basic-library/drive_log.py) either at a
+fixed rate or by skipping frames that look like the last one kept, labelled
+with the driver's activity from the logged control commands, resized and
+written as an ImageFolder tree (for SignClassifier / ForwardClassifier) or a
+YOLO dataset (for YOLOModel). Decoding, resizing and writing run in a process
+pool, one task per time range of every drive.
+
+Usage (from self-driving-car-library, with basic-library on PYTHONPATH):
+    python -m self_driving_car.dataset_builder drives/drive_* -o dataset_activity --fps 5
+"""
+
+import argparse
+import csv
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from drive_log import DriveLog
+
+STOPPED = "stopped"
+STRAIGHT = "straight"
+TURNING = "turning"
+LEFT = "left"
+RIGHT = "right"
+UNKNOWN = "unknown"  # Frames without logged controls; left out of ImageFolder datasets
+
+
+def label_frames(steering, speed, turn_threshold=10.0, stop_speed=0.0, split_turns=False):
+    """Label frames with the driver's activity from logged controls.
+
+    Args:
+        steering (np.ndarray): Steering servo angles (negative steers left), NaN if not logged
+        speed (np.ndarray): Speed commands, NaN if not logged
+        turn_threshold (float): Minimum absolute steering angle that counts as turning
+        stop_speed (float): Speed at or below which the car counts as stopped
+        split_turns (bool): Label turns as 'left'/'right' instead of 'turning'
+
+    Returns:
+        np.ndarray: One label string per frame, UNKNOWN where the steering or speed is NaN
+    """
+    steering = np.asarray(steering, dtype=np.float32)
+    speed = np.asarray(speed, dtype=np.float32)
+
+    labels = np.full(len(steering), STRAIGHT, dtype=object)
+    if split_turns:
+        labels[steering <= -turn_threshold] = LEFT
+        labels[steering >= turn_threshold] = RIGHT
+    else:
+        labels[np.abs(steering) >= turn_threshold] = TURNING
+    labels[speed <= stop_speed] = STOPPED
+    labels[np.isnan(steering) | np.isnan(speed)] = UNKNOWN
+    return labels
+
+
+def sample_by_time(timestamps, fps):
+    """Return the positions of the first frame in every 1/fps interval.
+
+    Args:
+        timestamps (np.ndarray): Frame timestamps in seconds, ascending
+        fps (float): Target sampling rate
+
+    Returns:
+        np.ndarray: Selected positions
+    """
+    if not len(timestamps):
+        return np.zeros(0, dtype=np.int64)
+    slots = np.floor((timestamps - timestamps[0]) * fps).astype(np.int64)
+    _, positions = np.unique(slots, return_index=True)
+    return positions
+
+
+def thumbnail(frame, size=16):
+    """Small grayscale version of a frame used to compare frames cheaply"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def split_of(drive_name, frame_id, val_fraction):
+    """Deterministic train/valid assignment that doesn't depend on sampling order"""
+    key = zlib.crc32(f"{drive_name}/{frame_id}".encode("utf-8")) % 1000
+    return "valid" if key < val_fraction * 1000 else "train"
+
+
+def yolo_lines(detections, width, height, min_confidence):
+    """Convert logged detections to YOLO label lines.
+
+    Args:
+        detections (list): ObjectDetection.detected_objects entries
+            (i, class, confidence, (x1, y1, x2, y2)) or dicts with 'class',
+            'confidence' and 'bbox'
+        width (int): Frame width the boxes refer to
+        height (int): Frame height the boxes refer to
+        min_confidence (float): Detections below this confidence are skipped
+
+    Returns:
+        list[str]: 'class x_center y_center width height' lines, normalized
+    """
+    lines = []
+    for detection in detections:
+        if isinstance(detection, dict):
+            object_class, confidence, bbox = detection['class'], detection.get('confidence', 1.0), detection['bbox']
+        else:
+            _, object_class, confidence, bbox = detection
+        if confidence < min_confidence:
+            continue
+
+        x1, y1, x2, y2 = np.clip(np.asarray(bbox, dtype=np.float64), 0, [width, height, width, height])
+        if x2 <= x1 or y2 <= y1:
+            continue
+        lines.append(f"{int(object_class)} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                     f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+    return lines
+
+
+def _export_range(task):
+    """Worker: decode, deduplicate, resize and write the frames of one time range"""
+    (drive_path, drive_name, positions, labels, output_dir, layout, size,
+     dedup_threshold, val_fraction, min_confidence) = task
+
+    rows = []
+    previous = None
+    with DriveLog(drive_path) as log:
+        for position, label in zip(positions, labels):
+            frame = log.read_frame(position)
+            if frame is None:
+                continue
+
+            if dedup_threshold is not None:
+                current = thumbnail(frame)
+                if previous is not None and np.mean(np.abs(current - previous)) < dedup_threshold:
+                    continue
+                previous = current
+
+            entry = log.index[position]
+            frame_id = int(entry['frame_id'])
+            split = split_of(drive_name, frame_id, val_fraction)
+            filename = f"{drive_name}_{frame_id:07d}.jpg"
+
+            if layout == "yolo":
+                image_path = os.path.join(output_dir, split, "images", filename)
+            else:
+                image_path = os.path.join(output_dir, split, label, filename)
+
+            height, width = frame.shape[:2]
+            if size is not None and (width, height) != tuple(size):
+                frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(image_path, frame)
+
+            if layout == "yolo":
+                record = log.read_record(position)
+                label_path = os.path.join(output_dir, split, "labels", filename[:-4] + ".txt")
+                with open(label_path, "w") as f:
+                    f.write("\n".join(yolo_lines(record['detections'], width, height, min_confidence)))
+
+            rows.append([os.path.relpath(image_path, output_dir), drive_name, frame_id,
+                         float(entry['timestamp']), float(entry['steering']), float(entry['speed']),
+                         label, split])
+    return rows
+
+
+def write_data_yaml(output_dir, class_names):
+    """Write the data.yaml file YOLOModel trains from"""
+    with open(os.path.join(output_dir, "data.yaml"), "w") as f:
+        f.write(f"path: {os.path.abspath(output_dir)}\n")
+        f.write("train: train/images\n")
+        f.write("val: valid/images\n\n")
+        f.write(f"nc: {len(class_names)}\n")
+        f.write(f"names: {list(class_names)}\n")
+
+
+def build_dataset(drive_paths, output_dir, layout="imagefolder", fps=5.0, dedup_threshold=None,
+                  size=(64, 64), turn_threshold=10.0, stop_speed=0.0, split_turns=False,
+                  val_fraction=0.2, class_names=None, min_confidence=0.5, workers=None):
+    """Build a dataset from recorded drives.
+
+    Args:
+        drive_paths (list[str]): Drive log directories
+        output_dir (str): Dataset directory
+        layout (str): 'imagefolder' (one folder per activity label) or 'yolo'
+        fps (float): Sampling rate; None keeps every frame (before deduplication)
+        dedup_threshold (float): Skip frames whose 16x16 grayscale thumbnail differs
+            from the last kept frame by less than this mean absolute difference (0-255)
+        size (tuple): Output (width, height), None keeps the recorded size
+        turn_threshold (float): Minimum absolute steering angle that counts as turning
+        stop_speed (float): Speed at or below which the car counts as stopped
+        split_turns (bool): Label turns as 'left'/'right' instead of 'turning'
+        val_fraction (float): Fraction of frames assigned to the validation split
+        class_names (list[str]): YOLO class names, by class id
+        min_confidence (float): Minimum confidence of logged detections used as YOLO labels
+        workers (int): Number of worker processes, defaults to the CPU count
+
+    Frames recorded without controls are labelled UNKNOWN and left out of 'imagefolder'
+    datasets; 'yolo' datasets keep them, as their labels come from the logged detections.
+
+    Returns:
+        list[list]: Manifest rows, also written to labels.csv in output_dir
+    """
+    if layout not in ("imagefolder", "yolo"):
+        raise ValueError(f"Unknown dataset layout: {layout}")
+    workers = workers or os.cpu_count() or 1
+
+    tasks = []
+    for drive_path in drive_paths:
+        drive_name = os.path.basename(os.path.normpath(drive_path))
+        with DriveLog(drive_path) as log:
+            if not len(log):
+                continue
+            timestamps = np.asarray(log.index['timestamp'])
+            positions = sample_by_time(timestamps, fps) if fps else np.arange(len(log))
+            labels = label_frames(log.index['steering'][positions], log.index['speed'][positions],
+                                  turn_threshold, stop_speed, split_turns)
+            if layout == "imagefolder":
+                # Without logged controls the activity is unknown, don't guess a class for these frames
+                known = labels != UNKNOWN
+                positions, labels = positions[known], labels[known]
+
+        # Split every drive so that all workers have work even with a single drive
+        for chunk_positions, chunk_labels in zip(np.array_split(positions, workers),
+                                                 np.array_split(labels, workers)):
+            if len(chunk_positions):
+                tasks.append((drive_path, drive_name, chunk_positions, chunk_labels, output_dir, layout,
+                              size, dedup_threshold, val_fraction, min_confidence))
+
+    for split in ("train", "valid"):
+        if layout == "yolo":
+            os.makedirs(os.path.join(output_dir, split, "images"), exist_ok=True)
+            os.makedirs(os.path.join(output_dir, split, "labels"), exist_ok=True)
+        else:
+            for label in (STOPPED, STRAIGHT, LEFT, RIGHT) if split_turns else (STOPPED, STRAIGHT, TURNING):
+                os.makedirs(os.path.join(output_dir, split, label), exist_ok=True)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for task_rows in executor.map(_export_range, tasks):
+            rows.extend(task_rows)
+
+    with open(os.path.join(output_dir, "labels.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "drive", "frame_id", "timestamp", "steering", "speed", "label", "split"])
+        writer.writerows(rows)
+
+    if layout == "yolo":
+        if class_names is None:
+            highest = max((int(line.split()[0]) for line in _label_lines(output_dir)), default=-1)
+            class_names = [f"class{i}" for i in range(highest + 1)]
+        write_data_yaml(output_dir, class_names)
+
+    return rows
+
+
+def _label_lines(output_dir):
+    """Iterate over all YOLO label lines written to a dataset"""
+    for split in ("train", "valid"):
+        label_dir = os.path.join(output_dir, split, "labels")
+        for filename in os.listdir(label_dir):
+            with open(os.path.join(label_dir, filename)) as f:
+                yield from (line for line in f.read().splitlines() if line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a labelled dataset from recorded drives")
+    parser.add_argument("drives", nargs="+", help="drive log directories")
+    parser.add_argument("-o", "--output", required=True, help="dataset directory")
+    parser.add_argument("--layout", choices=["imagefolder", "yolo"], default="imagefolder")
+    parser.add_argument("--fps", type=float, default=5.0, help="sampling rate, 0 keeps every frame")
+    parser.add_argument("--dedup", type=float, default=None,
+                        help="skip frames that differ from the last kept one by less than this (0-255)")
+    parser.add_argument("--size", type=int, nargs=2, default=[64, 64], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--turn-threshold", type=float, default=10.0)
+    parser.add_argument("--split-turns", action="store_true", help="label turns as left/right")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--names", nargs="*", default=None, help="YOLO class names by id")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    rows = build_dataset(args.drives, args.output, layout=args.layout, fps=args.fps or None,
+                         dedup_threshold=args.dedup, size=tuple(args.size),
+                         turn_threshold=args.turn_threshold, split_turns=args.split_turns,
+                         val_fraction=args.val_fraction, class_names=args.names, workers=args.workers)
+    print(f"Wrote {len(rows)} images to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,39 @@
 from PIL import Image
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-dir = "self_driving_car/stop_sign/parking_sign_raw"
-num_im = 1
+SOURCE_DIR = "self_driving_car/stop_sign/parking_sign_raw"
+OUTPUT_DIR = "self_driving_car/stop_sign"
+SIZE = (640, 480)
 
-for file in os.listdir(dir):
-    filename = os.fsdecode(file)
-    im = Image.open(rf"{dir}/{filename}")
 
-    im = im.resize((640,480))
-    im.save(f"self_driving_car/stop_sign/parking_sign{num_im}.jpg")
+def downscale(job):
+    source, target, size = job
+    with Image.open(source) as im:
+        im.resize(size).save(target)
 
-    num_im += 1
+
+def downscale_folder(source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR, size=SIZE, prefix="parking_sign", workers=None):
+    """Resize every image of a folder in parallel.
+
+    Args:
+        source_dir (str): Folder with the raw images
+        output_dir (str): Folder the resized images are written to
+        size (tuple): Output (width, height)
+        prefix (str): Output files are named <prefix><n>.jpg, numbered from 1 in file name order
+        workers (int): Number of worker processes, defaults to the CPU count
+
+    Returns:
+        int: Number of resized images
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(os.path.join(source_dir, filename), os.path.join(output_dir, f"{prefix}{num_im}.jpg"), size)
+            for num_im, filename in enumerate(sorted(os.listdir(source_dir)), start=1)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(downscale, jobs, chunksize=16))
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    print(f"{downscale_folder()} images resized")
@@ -0,0 +1,381 @@
+"""
+Lane following shared by the picar CLI and the simulator
+
+The PID controller and line detection of main_loop.py / examples/line_follower.py,
+parameterized instead of using module-level constants, and combined into a
+LaneFollower that turns a camera frame into a steering angle and a speed.
+
+Built with from_config(), the PID and the follower read their gains, band
+and limits from the car_config sections on every call, so ConfigWatcher
+reloads take effect at the next frame.
+
+With a LaneEstimator (lane_estimator.py, estimator.enabled in the config) the
+follower steers on the Kalman-filtered line position, which keeps being
+predicted when a frame has no detection or detection only runs every
+detect_every frames; the car only stops once the estimate is no longer
+confident. With the estimator, tracking.controller can replace the PID by
+a geometric controller on the estimated lane curve (path_tracking.py), and
+with calibration.birds_eye the line is measured in a metric top view of the
+floor (calibration.py) instead of the band of rows y to y + region_height.
+For a speed profile (speed.py) the follower also measures the line in a
+far preview band, so curves are seen before the car reaches them.
+
+Usage:
+    follower = LaneFollower.from_config(load_config('picar.json'))
+    steering, speed = follower.update(frame, dt)
+    px.set_dir_servo_angle(steering)
+    px.forward(speed)
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+
+class PID:
+    """Simple PID controller for steering correction.
+
+    Attributes:
+        kp (float): Proportional gain. Scales the current error.
+        ki (float): Integral gain. Scales the accumulated error to remove steady-state offsets.
+        kd (float): Derivative gain. Scales the rate of change of the error for damping/predictive action.
+        integral_limit (float): The integral term is clamped to [-integral_limit, integral_limit].
+    """
+
+    def __init__(self, kp, ki, kd, integral_limit=100):
+        """Initialize the PID controller.
+
+        Args:
+            kp (float): Proportional gain.
+            ki (float): Integral gain.
+            kd (float): Derivative gain.
+            integral_limit (float): Bound of the integral, against wind-up.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.prev_error = 0
+        self.integral = 0
+        self.config = None
+
+    @classmethod
+    def from_config(cls, config):
+        """PID following a car_config.PIDConfig"""
+        pid = cls(config.kp, config.ki, config.kd, config.integral_limit)
+        pid.config = config
+        return pid
+
+    def compute(self, error, dt):
+        """Compute the PID output for a given error and timestep.
+
+        Args:
+            error (float): Current error (e.g., target position - current position).
+            dt (float): Time elapsed since last compute call in seconds.
+
+        Returns:
+            float: The PID controller output (P + I + D).
+        """
+        if self.config is not None:
+            config = self.config
+            self.kp, self.ki, self.kd, self.integral_limit = config.kp, config.ki, config.kd, config.integral_limit
+
+        self.integral += error * dt
+        self.integral = max(min(self.integral, self.integral_limit), -self.integral_limit)
+
+        derivative = (error - self.prev_error) / dt if dt > 0 else 0
+
+        output = (
+                self.kp * error +
+                self.ki * self.integral +
+                self.kd * derivative
+        )
+
+        self.prev_error = error
+        return output
+
+    def reset(self):
+        """Forget the accumulated integral and the previous error"""
+        self.prev_error = 0
+        self.integral = 0
+
+
+def process_frame(frame, y, region_height, center, canny_low=50, canny_high=150):
+    """Detect the line in a horizontal band of the frame and compute the lateral error.
+
+    Args:
+        frame (np.ndarray or None): Input image (RGB or BGR) or None.
+        y (int): First row of the band.
+        region_height (int): Height of the band in rows.
+        center (int): Column the line should be on.
+        canny_low (int): Lower hysteresis threshold of the edge detection.
+        canny_high (int): Upper hysteresis threshold of the edge detection.
+
+    Returns:
+        int or None: Signed pixel error = center - line_center (positive: line left of center),
+            None if the frame is None or fewer than two edge pixels were found.
+    """
+    if frame is None:
+        return None
+
+    gray = cv2.cvtColor(frame[y:y + region_height], cv2.COLOR_RGB2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, canny_low, canny_high)
+
+    edge_columns = np.flatnonzero(edges.any(axis=0))
+    if len(edge_columns) < 2:
+        return None
+
+    line_center = (int(edge_columns[0]) + int(edge_columns[-1])) // 2
+    return center - line_center
+
+
+def line_points(frame, y, region_height, strips=3, canny_low=50, canny_high=150):
+    """Line center in several horizontal strips of the detection band
+
+    Args:
+        frame (np.ndarray or None): Camera frame
+        y (int): First row of the band
+        region_height (int): Height of the band
+        strips (int): Number of strips the band is split into
+        canny_low (int): Lower edge detection threshold
+        canny_high (int): Upper edge detection threshold
+
+    Returns:
+        list: (u, v) pixel of the line center of every strip where it was found
+    """
+    if frame is None:
+        return []
+    y = min(y, frame.shape[0] - 1)
+    region_height = min(region_height, frame.shape[0] - y)
+    bounds = np.linspace(y, y + region_height, strips + 1).astype(int)
+    points = []
+    for top, bottom in zip(bounds[:-1], bounds[1:]):
+        if bottom - top < 1:
+            continue
+        # With center 0 the error is minus the line's column
+        error = process_frame(frame, top, bottom - top, 0, canny_low, canny_high)
+        if error is not None:
+            points.append((-error + 0.5, (top + bottom) / 2))
+    return points
+
+
+class LaneFollower:
+    """Steering and speed from camera frames, as in main_loop.py"""
+
+    def __init__(self, width=640, height=480, y=405, region_height=100, kp=0.9, ki=0.0, kd=0.0,
+                 max_steering=35, steering_multiplier=40, speed=30, canny_low=50, canny_high=150,
+                 estimator=None, detect_every=1, strips=3, tracker=None, speed_scale=0.01, wheelbase=0.095):
+        """Initialize the follower
+
+        Args:
+            width (int): Frame width
+            height (int): Frame height
+            y (int): First row of the detection band (clamped to the frame)
+            region_height (int): Height of the detection band
+            kp (float): Proportional gain
+            ki (float): Integral gain
+            kd (float): Derivative gain
+            max_steering (float): Steering limit in degrees
+            steering_multiplier (float): Steering angle at an error of half the frame width
+            speed (float): Forward speed while the line is seen
+            canny_low (int): Lower edge detection threshold
+            canny_high (int): Upper edge detection threshold
+            estimator (LaneEstimator): Filter of the line position, None to steer on raw detections
+            detect_every (int): With an estimator, detect the line only every detect_every frames
+            strips (int): With an estimator, strips of the band the line is measured in
+            tracker (PurePursuit or Stanley): With an estimator, steers on the lane estimate instead of the PID
+            speed_scale (float): m/s per unit of speed, for the tracker
+            wheelbase (float): Distance between the axles in meters, for the curvature of the steering
+        """
+        self.width = width
+        self.height = height
+        self.y = min(y, height - 1)
+        self.region_height = region_height
+        self.center = width // 2
+        self.max_error = width // 2
+        self.max_steering = max_steering
+        self.steering_multiplier = steering_multiplier
+        self.speed = speed
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+        self.pid = PID(kp, ki, kd)
+        self.estimator = estimator
+        self.detect_every = detect_every
+        self.strips = strips
+        self.tracker = tracker
+        self.trackers = {}
+        self.birds_eye = None
+        # Far band (y, height) whose line points give preview_curvature, None to skip it
+        self.preview = None
+        self.speed_scale = speed_scale
+        self.wheelbase = wheelbase
+        self.config = None
+        self.frames = 0
+
+        # Command executed since the last update (steering, speed), predicts the estimator's motion;
+        # set it when something else (e.g. an arbiter.Arbiter) decides what the car does
+        self.command = (0.0, 0.0)
+
+        # Last result - accessible from outside the class
+        self.error = None
+        self.measured = False
+        self.preview_curvature = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Follower reading the camera, lane, pid and drive sections of a car_config.Config"""
+        lane = config.lane
+        follower = cls(width=config.camera.width, height=config.camera.height, y=lane.y,
+                       region_height=lane.region_height, max_steering=lane.max_steering,
+                       steering_multiplier=lane.steering_multiplier, speed=config.drive.speed,
+                       canny_low=lane.canny_low, canny_high=lane.canny_high, wheelbase=config.sim.wheelbase)
+        follower.pid = PID.from_config(config.pid)
+        if config.estimator.enabled:
+            from self_driving_car.lane_estimator import LaneEstimator, ground_homography
+
+            sim = config.sim
+            size = (config.camera.width, config.camera.height)
+            homography = ground_homography(*size, sim.fov, sim.camera_height, sim.camera_pitch)
+            calibration = None
+            if config.calibration.file:
+                from self_driving_car.calibration import BirdsEyeView, Calibration
+
+                calibration = Calibration.load(config.calibration.file).scaled(size)
+                if calibration.homography is not None:
+                    homography = calibration.homography
+                if config.calibration.birds_eye:
+                    view = config.calibration
+                    follower.birds_eye = BirdsEyeView(calibration, size, (view.forward_min, view.forward_max),
+                                                      view.half_width, view.resolution)
+            follower.estimator = LaneEstimator(homography, wheelbase=sim.wheelbase, speed_scale=sim.max_speed / 100,
+                                               calibration=calibration)
+
+            from self_driving_car.path_tracking import PurePursuit, Stanley
+
+            # Both are built so tracking.controller can be switched while driving
+            follower.trackers = {
+                'pure_pursuit': PurePursuit(sim.wheelbase, max_steering=lane.max_steering, config=config.tracking),
+                'stanley': Stanley(sim.wheelbase, max_steering=lane.max_steering, config=config.tracking),
+            }
+            follower.speed_scale = sim.max_speed / 100
+        follower.config = config
+        follower._sync()
+        return follower
+
+    def _sync(self):
+        """Take over reloaded values of the config"""
+        lane = self.config.lane
+        self.y = min(lane.y, self.height - 1)
+        self.region_height = lane.region_height
+        self.max_steering = lane.max_steering
+        self.steering_multiplier = lane.steering_multiplier
+        self.canny_low = lane.canny_low
+        self.canny_high = lane.canny_high
+        self.speed = self.config.drive.speed
+        estimator = self.config.estimator
+        self.detect_every = estimator.detect_every
+        self.strips = estimator.strips
+        if self.config.speed.enabled and self.estimator is not None:
+            self.preview = (self.config.speed.preview_y, self.config.speed.preview_height)
+        else:
+            self.preview = None
+        self.tracker = self.trackers.get(self.config.tracking.controller)
+        for tracker in self.trackers.values():
+            tracker.max_steering = self.max_steering
+        if self.estimator is not None:
+            self.estimator.measurement_noise = estimator.measurement_noise
+            self.estimator.max_dropout = estimator.max_dropout
+            self.estimator.max_offset_std = estimator.max_offset_std
+
+    def steering_angle(self, error, dt):
+        """Servo angle for a pixel error (negative steers left)"""
+        raw_steering = self.pid.compute(error, dt)
+        scaled_steering = np.clip((raw_steering / self.max_error) * self.steering_multiplier,
+                                  -self.max_steering, self.max_steering)
+        return -float(scaled_steering)
+
+    def update(self, frame, dt):
+        """Process a frame
+
+        Args:
+            frame (np.ndarray): Camera frame
+            dt (float): Seconds since the previous update
+
+        Returns:
+            tuple: (steering angle, speed); (0, 0) when the line is not detected (or, with an
+                estimator, no longer confidently predicted)
+        """
+        if self.config is not None:
+            self._sync()
+        self.frames += 1
+        if self.estimator is None:
+            self.error = process_frame(frame, self.y, self.region_height, self.center, self.canny_low, self.canny_high)
+            self.measured = self.error is not None
+        else:
+            self.error = self._estimated_error(frame, dt)
+            self.preview_curvature = self._preview_curvature(frame) if self.preview else None
+
+        if self.error is None:
+            self.command = (0.0, 0.0)
+        elif self.tracker is not None and self.estimator is not None:
+            # The speed the car drives, below drive.speed with a speed profile
+            self.command = (self.tracker.steering(self.estimator.state, self.command[1] * self.speed_scale), self.speed)
+        else:
+            self.command = (self.steering_angle(self.error, dt), self.speed)
+        return self.command
+
+    @property
+    def curvature(self):
+        """Curvature in 1/m of the lane ahead (positive: left), for speed.SpeedController
+
+        The sharper of the estimated lane curve and the preview with an estimator, otherwise the
+        curve the steering command drives.
+        """
+        if self.estimator is not None and self.estimator.is_confident:
+            curvature = float(self.estimator.state[2])
+            if self.preview_curvature is not None and abs(self.preview_curvature) > abs(curvature):
+                return self.preview_curvature
+            return curvature
+        return math.tan(math.radians(-self.command[0])) / self.wheelbase
+
+    def _preview_curvature(self, frame):
+        """Sharpest curvature of the arcs from the car to the line points of the preview band, None without"""
+        from self_driving_car.lane_estimator import apply_homography
+
+        y, region_height = self.preview
+        points = line_points(frame, y, region_height, 4, self.canny_low, self.canny_high)
+        if region_height < 1 or not points:
+            return None
+        if self.estimator.calibration is not None:
+            points = self.estimator.calibration.undistort_points(points)
+        u, v = np.array(points, dtype=float).T
+        forward, left = apply_homography(self.estimator.homography, u, v)
+        valid = np.isfinite(forward) & (forward > 0)
+        if not valid.any():
+            return None
+        # Arc tangent to the car's heading through each point, like pure pursuit
+        curvatures = 2 * left[valid] / (forward[valid] ** 2 + left[valid] ** 2)
+        return float(curvatures[np.argmax(np.abs(curvatures))])
+
+    def _estimated_error(self, frame, dt):
+        """Pixel error of the estimated line in the middle of the band, None if not confident"""
+        estimator = self.estimator
+        estimator.predict(dt, *self.command)
+        self.measured = False
+        if self.frames % self.detect_every == 0:
+            if self.birds_eye is not None:
+                points = self.birds_eye.line_points(frame, self.strips, self.canny_low, self.canny_high)
+                self.measured = estimator.update_floor(points)
+            else:
+                points = line_points(frame, self.y, self.region_height, self.strips, self.canny_low, self.canny_high)
+                self.measured = estimator.update(points)
+        if not estimator.is_confident:
+            return None
+
+        row = min(self.y + self.region_height / 2, self.height - 1)
+        column = estimator.image_column(row, self.center + 0.5)
+        if column is None:
+            return None
+        return self.center - (column - 0.5)
@@ -0,0 +1,250 @@
+"""
+Kalman-filtered lane state with prediction across dropped detections
+
+The lane line is modeled on the floor, in the car's frame (x forward, y left,
+meters), as y(x) = offset + heading * x + curvature * x^2 / 2. A Kalman filter
+estimates (offset, heading, curvature):
+
+- predict(dt, steering, speed): moves the line by the distance driven and the
+  yaw of the steering command (kinematic bicycle, like the simulator)
+- update(points): fuses line points measured in several strips of the
+  detection band, projected to the floor by a ground homography
+
+When detections are missing (glare, a frame without edges, or detection
+running only every other frame) the state keeps being predicted from the
+commands, and its covariance grows. is_confident gates on the covariance and
+on the time since the last accepted measurement, so the car drives through
+short dropouts and still stops when the line is really lost.
+
+The homography comes from the camera geometry (height, pitch, field of view)
+assuming a flat floor, or from a calibration.Calibration, which also removes
+the lens distortion of the measured points. Points measured directly on the
+floor (calibration.BirdsEyeView.line_points) go to update_floor().
+
+Usage:
+    from self_driving_car.lane import line_points
+
+    estimator = LaneEstimator(ground_homography(640, 480, fov=62.2, camera_height=0.12, pitch=20))
+    estimator.predict(dt, steering, speed)
+    estimator.update(line_points(frame, y=405, region_height=100))
+    if estimator.is_confident:
+        offset, heading, curvature = estimator.state
+"""
+
+import math
+
+import numpy as np
+
+
+def ground_homography(width, height, fov, camera_height, pitch):
+    """Homography from pixels (u, v) to floor points (forward, left) in meters
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        fov (float): Horizontal field of view in degrees
+        camera_height (float): Height of the lens above the floor in meters
+        pitch (float): Downward tilt of the camera in degrees
+
+    Returns:
+        np.ndarray: 3x3 matrix, [forward, left, 1] ~ H @ [u, v, 1]
+    """
+    fx = width / 2 / math.tan(math.radians(fov) / 2)
+    k = np.array([[fx, 0, width / 2], [0, fx, height / 2], [0, 0, 1]])
+    p = math.radians(pitch)
+    # Ray (x right, y down, z forward) pitched down, scaled to hit the floor camera_height below
+    m = np.array([[0, -math.sin(p), math.cos(p)],
+                  [-1, 0, 0],
+                  [0, math.cos(p) / camera_height, math.sin(p) / camera_height]])
+    return m @ np.linalg.inv(k)
+
+
+def apply_homography(h, a, b):
+    """Map points (a, b) with a homography, e.g. pixels to floor or, with its inverse, back"""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    x = h[0, 0] * a + h[0, 1] * b + h[0, 2]
+    y = h[1, 0] * a + h[1, 1] * b + h[1, 2]
+    w = h[2, 0] * a + h[2, 1] * b + h[2, 2]
+    return x / w, y / w
+
+
+class LaneEstimator:
+    """Kalman filter of the lane line's offset, heading and curvature"""
+
+    def __init__(self, homography, wheelbase=0.095, speed_scale=0.01, process_noise=(0.02, 0.1, 0.5),
+                 measurement_noise=0.01, initial_std=(0.1, 0.3, 2.0), gate=4.0, max_dropout=0.5,
+                 max_offset_std=0.05, calibration=None):
+        """Initialize the estimator
+
+        Args:
+            homography (np.ndarray): Pixels to floor (forward, left), see ground_homography()
+            wheelbase (float): Distance between the axles in meters
+            speed_scale (float): m/s per unit of the speed command (forward(100) -> 100 * speed_scale)
+            process_noise (tuple): Random walk of offset (m), heading (rad) and curvature (1/m) per second
+            measurement_noise (float): Standard deviation of a measured line point in meters
+            initial_std (tuple): Standard deviations of a state started from a first measurement
+            gate (float): Measurements with a normalized innovation (per point, in standard
+                deviations) above this are rejected as outliers
+            max_dropout (float): Seconds without accepted measurement the prediction is trusted for
+            max_offset_std (float): Offset standard deviation in meters the estimate is trusted up to
+            calibration (Calibration): Undistorts measured pixels before the homography
+        """
+        self.calibration = calibration
+        self.homography = np.asarray(homography, dtype=float)
+        self.inverse_homography = np.linalg.inv(self.homography)
+        self.wheelbase = wheelbase
+        self.speed_scale = speed_scale
+        self.process_noise = np.asarray(process_noise, dtype=float)
+        self.measurement_noise = measurement_noise
+        self.initial_std = np.asarray(initial_std, dtype=float)
+        self.gate = gate
+        self.max_dropout = max_dropout
+        self.max_offset_std = max_offset_std
+
+        # Filter state - accessible from outside the class
+        self.state = np.zeros(3)
+        self.covariance = np.diag(self.initial_std ** 2)
+        self.initialized = False
+        self.since_measurement = math.inf
+        self.rejected_in_row = 0
+
+        # Statistics
+        self.measurements = 0
+        self.rejections = 0
+        self.predictions = 0
+
+    def reset(self):
+        """Forget the state, the next measurement starts it again"""
+        self.state = np.zeros(3)
+        self.covariance = np.diag(self.initial_std ** 2)
+        self.initialized = False
+        self.since_measurement = math.inf
+        self.rejected_in_row = 0
+
+    def predict(self, dt, steering=0.0, speed=0.0):
+        """Move the lane by the motion of the car during dt
+
+        Args:
+            dt (float): Seconds since the previous prediction
+            steering (float): Steering command in degrees (negative steers left)
+            speed (float): Speed command, scaled by speed_scale to m/s
+        """
+        if dt <= 0:
+            return
+        self.since_measurement += dt
+        if not self.initialized:
+            return
+        self.predictions += 1
+
+        distance = speed * self.speed_scale * dt
+        yaw = distance * math.tan(math.radians(-steering)) / self.wheelbase
+        f = np.array([[1, distance, distance ** 2 / 2],
+                      [0, 1, distance],
+                      [0, 0, 1]])
+        self.state = f @ self.state
+        # Turning left by yaw turns the line right, in the car's frame
+        self.state[1] -= yaw
+        q = np.diag((self.process_noise ** 2) * dt)
+        self.covariance = f @ self.covariance @ f.T + q
+
+    def update(self, points):
+        """Fuse line points measured in the image
+
+        Args:
+            points (list): (u, v) pixels on the line, see lane.line_points()
+
+        Returns:
+            bool: Whether the measurement was accepted
+        """
+        if not points:
+            return False
+        if self.calibration is not None:
+            points = self.calibration.undistort_points(points)
+        u, v = np.array(points, dtype=float).T
+        return self.update_floor(np.stack(apply_homography(self.homography, u, v), axis=1))
+
+    def update_floor(self, points):
+        """Fuse line points measured on the floor
+
+        Args:
+            points (list): (forward, left) in meters
+
+        Returns:
+            bool: Whether the measurement was accepted
+        """
+        if len(points) == 0:
+            return False
+        forward, left = np.array(points, dtype=float).T
+        valid = np.isfinite(forward) & np.isfinite(left) & (forward > 0)
+        forward, left = forward[valid], left[valid]
+        if len(forward) == 0:
+            return False
+
+        h = np.stack([np.ones_like(forward), forward, forward ** 2 / 2], axis=1)
+        r = np.eye(len(forward)) * self.measurement_noise ** 2
+
+        if not self.initialized or self.since_measurement > self.max_dropout or self.rejected_in_row >= 3:
+            self._start(h, left, r)
+            return True
+
+        innovation = left - h @ self.state
+        s = h @ self.covariance @ h.T + r
+        s_inverse = np.linalg.inv(s)
+        if innovation @ s_inverse @ innovation > self.gate ** 2 * len(forward):
+            self.rejections += 1
+            self.rejected_in_row += 1
+            return False
+
+        gain = self.covariance @ h.T @ s_inverse
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(3) - gain @ h) @ self.covariance
+        self._accepted()
+        return True
+
+    def _start(self, h, left, r):
+        """(Re)start the filter from a measurement and the prior of the state"""
+        prior = np.diag(self.initial_std ** 2)
+        s_inverse = np.linalg.inv(h @ prior @ h.T + r)
+        gain = prior @ h.T @ s_inverse
+        self.state = gain @ left
+        self.covariance = (np.eye(3) - gain @ h) @ prior
+        self.initialized = True
+        self._accepted()
+
+    def _accepted(self):
+        self.since_measurement = 0.0
+        self.rejected_in_row = 0
+        self.measurements += 1
+
+    @property
+    def offset_std(self):
+        """Standard deviation of the offset in meters"""
+        return math.sqrt(self.covariance[0, 0])
+
+    @property
+    def is_confident(self):
+        """Whether the estimate can be steered on"""
+        return (self.initialized and self.since_measurement <= self.max_dropout
+                and self.offset_std <= self.max_offset_std)
+
+    def lateral(self, forward):
+        """Left distance of the line in meters, forward meters ahead of the camera"""
+        offset, heading, curvature = self.state
+        return offset + heading * forward + curvature * forward ** 2 / 2
+
+    def image_column(self, v, center):
+        """Column where the estimated line crosses image row v
+
+        Args:
+            v (float): Image row
+            center (float): Image column looking straight ahead
+
+        Returns:
+            float: Column of the line, None if row v doesn't see the floor
+        """
+        forward, _ = apply_homography(self.homography, center, v)
+        if not np.isfinite(forward) or forward <= 0:
+            return None
+        # The floor point at this distance, projected back into the image (nearly the same row)
+        u, _ = apply_homography(self.inverse_homography, forward, self.lateral(float(forward)))
+        return float(u)
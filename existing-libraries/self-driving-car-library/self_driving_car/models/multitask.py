@@ -0,0 +1,173 @@
+import argparse
+import itertools
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+import torch.optim as optim
+from torchvision import transforms
+from torch.utils.data import DataLoader
+from torchvision.datasets import ImageFolder
+
+from self_driving_car.models.forward import ForwardClassifier
+from self_driving_car.models.sign import SignClassifier
+
+
+class MultiTaskClassifier(nn.Module):
+    """SignClassifier and ForwardClassifier sharing one conv trunk
+
+    The trunk is the conv part of the single-task models and costs most of their
+    compute; each task keeps its own fully connected head. forward() returns
+    (sign logits, forward logits), the output order of HEADS.
+    """
+
+    HEADS = ('sign', 'forward')
+
+    def __init__(self, sign_classes=2, forward_classes=2):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 16, kernel_size=5, padding=2)
+        self.pool = nn.MaxPool2d(2, 2)
+        self.conv2 = nn.Conv2d(16, 32, kernel_size=5, padding=2)
+        self.sign_fc1 = nn.Linear(32 * 16 * 16, 100)
+        self.sign_fc2 = nn.Linear(100, sign_classes)
+        self.forward_fc1 = nn.Linear(32 * 16 * 16, 100)
+        self.forward_fc2 = nn.Linear(100, forward_classes)
+
+    def features(self, x):
+        x = self.pool(F.relu(self.conv1(x)))
+        x = self.pool(F.relu(self.conv2(x)))
+        return x.view(-1, 32 * 16 * 16)
+
+    def forward(self, x):
+        x = self.features(x)
+        sign = self.sign_fc2(F.relu(self.sign_fc1(x)))
+        forward = self.forward_fc2(F.relu(self.forward_fc1(x)))
+        return sign, forward
+
+    @classmethod
+    def from_single_task(cls, sign_model, forward_model):
+        """Start from trained single-task models: the sign trunk and both heads are copied"""
+        model = cls(sign_model.fc2.out_features, forward_model.fc2.out_features)
+        model.conv1.load_state_dict(sign_model.conv1.state_dict())
+        model.conv2.load_state_dict(sign_model.conv2.state_dict())
+        model.sign_fc1.load_state_dict(sign_model.fc1.state_dict())
+        model.sign_fc2.load_state_dict(sign_model.fc2.state_dict())
+        model.forward_fc1.load_state_dict(forward_model.fc1.state_dict())
+        model.forward_fc2.load_state_dict(forward_model.fc2.state_dict())
+        return model
+
+
+def train(sign_root, forward_root, output="multitask_classifier.pth", n_epochs=10, batch_size=16,
+          forward_weight=1.0, init=None):
+    """Train the shared trunk and both heads together
+
+    Each step takes one batch of each dataset, runs both through the trunk in a
+    single pass, and minimizes sign loss + forward_weight * forward loss. The
+    smaller dataset is cycled, so an epoch covers the larger one once.
+
+    Args:
+        sign_root (str): ImageFolder of sign images (parking/, stop/)
+        forward_root (str): ImageFolder of go/no-go images
+        output (str): State dict written after every epoch
+        n_epochs (int): Number of epochs
+        batch_size (int): Images of each dataset per step
+        forward_weight (float): Weight of the forward loss in the combined loss
+        init (tuple): Optional (sign .pth, forward .pth) single-task weights to start from
+
+    Returns:
+        MultiTaskClassifier: The trained model
+    """
+    transform = transforms.Compose([
+        transforms.Resize((64, 64)),
+        transforms.ToTensor(),
+    ])
+    sign_dataset = ImageFolder(root=sign_root, transform=transform)
+    forward_dataset = ImageFolder(root=forward_root, transform=transform)
+    sign_loader = DataLoader(sign_dataset, batch_size=batch_size, shuffle=True)
+    forward_loader = DataLoader(forward_dataset, batch_size=batch_size, shuffle=True)
+
+    device = torch.device("cpu")
+    if init:
+        sign_model, forward_model = SignClassifier(), ForwardClassifier()
+        sign_model.load_state_dict(torch.load(init[0], map_location=device))
+        forward_model.load_state_dict(torch.load(init[1], map_location=device))
+        model = MultiTaskClassifier.from_single_task(sign_model, forward_model)
+    else:
+        model = MultiTaskClassifier(len(sign_dataset.classes), len(forward_dataset.classes))
+    model = model.to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+
+    for epoch in range(n_epochs):
+        running_loss = 0.0
+        if len(sign_loader) >= len(forward_loader):
+            batches = zip(sign_loader, itertools.cycle(forward_loader))
+        else:
+            batches = ((s, f) for f, s in zip(forward_loader, itertools.cycle(sign_loader)))
+
+        for (sign_images, sign_labels), (forward_images, forward_labels) in batches:
+            images = torch.cat([sign_images, forward_images]).to(device)
+            optimizer.zero_grad()
+            sign_outputs, forward_outputs = model(images)
+            count = len(sign_images)
+            loss = criterion(sign_outputs[:count], sign_labels.to(device)) + \
+                forward_weight * criterion(forward_outputs[count:], forward_labels.to(device))
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item()
+        print(f"epoch {epoch+1}/{n_epochs}, perte {running_loss:.4f}")
+
+        torch.save(model.state_dict(), output)
+        print("model saved")
+    return model
+
+
+def benchmark(batch_size=1, iterations=500, threads=None):
+    """Compare the latency of the shared-trunk model with two separate models
+
+    Returns:
+        dict: Milliseconds per call for 'separate' and 'multitask'
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    sign_model, forward_model = SignClassifier().eval(), ForwardClassifier().eval()
+    model = MultiTaskClassifier().eval()
+    x = torch.rand(batch_size, 3, 64, 64)
+
+    def measure(function):
+        with torch.inference_mode():
+            for _ in range(20):
+                function()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                function()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    return {
+        'separate': measure(lambda: (sign_model(x), forward_model(x))),
+        'multitask': measure(lambda: model(x)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or benchmark the shared-trunk classifier")
+    parser.add_argument("--sign-data", default="self_driving_car/sign")
+    parser.add_argument("--forward-data", default="self-driving-car/dataset_forward")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--init", nargs=2, metavar=("SIGN_PTH", "FORWARD_PTH"), default=None,
+                        help="start from trained single-task weights")
+    parser.add_argument("--benchmark", action="store_true", help="only measure latency")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for batch_size in (1, 8):
+            result = benchmark(batch_size, threads=args.threads)
+            print(f"batch {batch_size}: separate {result['separate']:.2f} ms, "
+                  f"multitask {result['multitask']:.2f} ms "
+                  f"({result['separate'] / result['multitask']:.2f}x)")
+    else:
+        train(args.sign_data, args.forward_data, n_epochs=args.epochs, init=args.init)
@@ -1,12 +1,6 @@
-import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-import torch.optim as optim
-from torchvision import transforms
-from torch.utils.data import DataLoader
-from torchvision.datasets import ImageFolder
-
 class SignClassifier(nn.Module):
     def __init__(self):
         super(SignClassifier, self).__init__()
@@ -25,32 +19,7 @@ class SignClassifier(nn.Module):
         return x
 
 if __name__ == "__main__":
-    transform = transforms.Compose([
-        transforms.Resize((64,64)),
-        transforms.ToTensor(),
-    ])
-
-    dataset = ImageFolder(root="self_driving_car/sign", transform=transform)
-    train_loader = DataLoader(dataset, batch_size=16, shuffle=True)
-
-    device = torch.device("cpu")
-    model = SignClassifier().to(device)
-    criterion = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-    n_epochs = 10
-    for epoch in range(n_epochs):
-        running_loss = 0.0
-        for images, labels in train_loader:
-            images, labels = images.to(device), labels.to(device)
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += loss.item()
-        print(f"epoch {epoch+1}/{n_epochs}, perte {running_loss:.4f}")
+    # Decodes the dataset once into a cache and keeps the best epoch, see self_driving_car/training.py
+    from self_driving_car.training import train_classifier
 
-        torch.save(model.state_dict(), "sign_classifier.pth")
-        print("model saved")
+    train_classifier(SignClassifier(), "self_driving_car/sign", "sign_classifier.pth", n_epochs=10)
@@ -0,0 +1,131 @@
+"""
+Geometric path tracking on the estimated lane line
+
+Alternatives to the pixel-error PID of lane.py: both controllers steer on
+the lane curve y(x) = offset + heading * x + curvature * x^2 / 2 estimated
+on the floor by lane_estimator.LaneEstimator (x forward, y left, meters),
+so their gains don't depend on the camera resolution or the detection row.
+
+- PurePursuit: steers the car on the circle through a look-ahead point of
+  the line; the look-ahead distance grows with the speed, which keeps fast
+  driving stable while slow driving tracks curves tightly.
+- Stanley: steers along the line's direction at the front axle, plus a
+  correction of the cross-track error that shrinks with the speed.
+
+Both return PiCar-X servo angles (negative steers left). LaneFollower uses
+them when tracking.controller is 'pure_pursuit' or 'stanley'.
+
+Usage:
+    controller = PurePursuit(wheelbase=0.095)
+    steering = controller.steering(estimator.state, speed=0.5)   # m/s
+"""
+
+import math
+
+import numpy as np
+
+
+def lane_point(state, forward):
+    """Left position and direction (radians) of the lane line forward meters ahead"""
+    offset, heading, curvature = state
+    left = offset + heading * forward + curvature * forward ** 2 / 2
+    return left, math.atan(heading + curvature * forward)
+
+
+def servo_angle(steer, max_steering):
+    """PiCar-X servo angle in degrees for a wheel angle in radians (positive: left)"""
+    return float(np.clip(-math.degrees(steer), -max_steering, max_steering))
+
+
+class PurePursuit:
+    """Pure pursuit of a look-ahead point on the lane line"""
+
+    def __init__(self, wheelbase=0.095, lookahead_min=0.12, lookahead_gain=0.25, lookahead_max=0.6,
+                 max_steering=35, config=None):
+        """Initialize the controller
+
+        Args:
+            wheelbase (float): Distance between the axles in meters
+            lookahead_min (float): Look-ahead distance in meters when standing
+            lookahead_gain (float): Seconds of driving added to the look-ahead distance
+            lookahead_max (float): Upper limit of the look-ahead distance in meters
+            max_steering (float): Servo limit in degrees
+            config (car_config.TrackingConfig): Read at every call instead of the gains above
+        """
+        self.wheelbase = wheelbase
+        self.lookahead_min = lookahead_min
+        self.lookahead_gain = lookahead_gain
+        self.lookahead_max = lookahead_max
+        self.max_steering = max_steering
+        self.config = config
+
+        # Last look-ahead point (forward, left) - accessible from outside the class
+        self.target = None
+
+    def lookahead(self, speed):
+        """Look-ahead distance in meters at speed m/s"""
+        if self.config is not None:
+            self.lookahead_min = self.config.lookahead_min
+            self.lookahead_gain = self.config.lookahead_gain
+            self.lookahead_max = self.config.lookahead_max
+        return min(self.lookahead_min + self.lookahead_gain * abs(speed), self.lookahead_max)
+
+    def steering(self, state, speed):
+        """Servo angle towards the look-ahead point
+
+        Args:
+            state (np.ndarray): (offset, heading, curvature) of the lane line
+            speed (float): Speed in m/s
+
+        Returns:
+            float: Servo angle in degrees (negative steers left)
+        """
+        distance = self.lookahead(speed)
+        # Point of the line at the look-ahead distance from the car
+        forward = distance
+        for _ in range(3):
+            left, _ = lane_point(state, forward)
+            forward = math.sqrt(max(distance ** 2 - left ** 2, 1e-6))
+        left, _ = lane_point(state, forward)
+        self.target = (forward, left)
+
+        alpha = math.atan2(left, forward)
+        curvature = 2 * math.sin(alpha) / math.hypot(forward, left)
+        return servo_angle(math.atan(curvature * self.wheelbase), self.max_steering)
+
+
+class Stanley:
+    """Stanley controller: line direction plus a speed-scaled cross-track correction at the front axle"""
+
+    def __init__(self, wheelbase=0.095, gain=3.0, softening=0.2, max_steering=35, config=None):
+        """Initialize the controller
+
+        Args:
+            wheelbase (float): Distance between the axles in meters, the front axle is this far ahead
+            gain (float): Cross-track gain in 1/s
+            softening (float): m/s added to the speed, limits the correction when slow
+            max_steering (float): Servo limit in degrees
+            config (car_config.TrackingConfig): Read at every call instead of the gains above
+        """
+        self.wheelbase = wheelbase
+        self.gain = gain
+        self.softening = softening
+        self.max_steering = max_steering
+        self.config = config
+
+    def steering(self, state, speed):
+        """Servo angle aligning the car with the line and pulling it onto it
+
+        Args:
+            state (np.ndarray): (offset, heading, curvature) of the lane line
+            speed (float): Speed in m/s
+
+        Returns:
+            float: Servo angle in degrees (negative steers left)
+        """
+        if self.config is not None:
+            self.gain = self.config.stanley_gain
+            self.softening = self.config.stanley_softening
+        cross_track, direction = lane_point(state, self.wheelbase)
+        steer = direction + math.atan2(self.gain * cross_track, abs(speed) + self.softening)
+        return servo_angle(steer, self.max_steering)
@@ -0,0 +1,265 @@
+"""
+Shared runtime for the frame classifiers (ForwardClassifier, SignClassifier)
+
+A camera frame is resized once to the 64x64 input the classifiers were trained
+on, converted to a tensor with NumPy (no PIL round trip), and every classifier
+runs on that same tensor in one call of a multi-head module under
+torch.inference_mode. The multi-head module can be exported to TorchScript or
+ONNX and loaded back without the model classes.
+
+Usage:
+    runtime = ClassifierRuntime.from_weights({'forward': 'forward_classifier.pth',
+                                              'sign': 'sign_classifier.pth'})
+    results = runtime.predict(camera.get_image())
+    if results['forward'].label == 'blocked': ...
+
+    runtime = ClassifierRuntime.from_multitask('multitask_classifier.pth')  # one shared trunk
+
+    runtime.export('classifiers.pt')            # TorchScript
+    runtime = ClassifierRuntime.load('classifiers.pt')
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+from self_driving_car.models.forward import ForwardClassifier
+from self_driving_car.models.multitask import MultiTaskClassifier
+from self_driving_car.models.sign import SignClassifier
+
+
+INPUT_SIZE = 64
+
+# Model class and class names (ImageFolder order, i.e. sorted folder names) of each classifier
+CLASSIFIERS = {
+    'forward': (ForwardClassifier, ('blocked', 'free')),
+    'sign': (SignClassifier, ('parking', 'stop')),
+}
+
+Prediction = namedtuple('Prediction', ['index', 'label', 'confidence'])
+
+
+def preprocess(frame, size=INPUT_SIZE, swap_rb=False):
+    """Turn a camera frame into a classifier input tensor
+
+    Equivalent to transforms.Resize((size, size)) + transforms.ToTensor() up to
+    resampling differences, computed directly on the NumPy frame.
+
+    Args:
+        frame (np.ndarray): (H, W, 3) or (H, W, 4) uint8 frame
+        size (int): Input width and height of the classifiers
+        swap_rb (bool): Swap the red and blue channels (for BGR frames when the
+            classifiers were trained on RGB images)
+
+    Returns:
+        torch.Tensor: (1, 3, size, size) float tensor in [0, 1]
+    """
+    # INTER_AREA averages the pixels that make up each output pixel, like an antialiased resize
+    small = cv2.resize(frame[:, :, :3], (size, size), interpolation=cv2.INTER_AREA)
+    if swap_rb:
+        small = small[:, :, ::-1]
+    chw = np.ascontiguousarray(small.transpose(2, 0, 1))
+    return torch.from_numpy(chw).unsqueeze(0).float().div_(255.0)
+
+
+class MultiHeadClassifier(nn.Module):
+    """Runs several classifiers on the same input and returns all their logits"""
+
+    def __init__(self, models):
+        """Initialize the module
+
+        Args:
+            models (dict): Classifier name -> nn.Module, in output order
+        """
+        super().__init__()
+        self.names = list(models)
+        self.heads = nn.ModuleList(models.values())
+
+    def forward(self, x):
+        return tuple(head(x) for head in self.heads)
+
+
+class ClassifierRuntime:
+    """Preprocesses frames once and runs every classifier on them"""
+
+    def __init__(self, module, names, labels, input_size=INPUT_SIZE, swap_rb=False, threads=None):
+        """Initialize the runtime
+
+        Prefer from_weights() or load() over calling this directly.
+
+        Args:
+            module: Callable returning one logits tensor/array per classifier:
+                a MultiHeadClassifier, a TorchScript module or an ONNX session wrapper
+            names (list[str]): Classifier names in output order
+            labels (dict): Classifier name -> class names
+            input_size (int): Input width and height
+            swap_rb (bool): Swap red and blue before inference, see preprocess()
+            threads (int): Number of torch threads, None keeps the torch default
+        """
+        self.module = module
+        self.names = list(names)
+        self.labels = {name: tuple(labels[name]) for name in self.names}
+        self.input_size = input_size
+        self.swap_rb = swap_rb
+
+        if threads:
+            torch.set_num_threads(threads)
+
+    @classmethod
+    def from_weights(cls, weights, **kwargs):
+        """Build a runtime from state dicts saved by the training scripts
+
+        Args:
+            weights (dict): Classifier name (a key of CLASSIFIERS) -> .pth file
+            **kwargs: Passed to the constructor
+
+        Returns:
+            ClassifierRuntime
+        """
+        models = {}
+        for name, path in weights.items():
+            model_class, _ = CLASSIFIERS[name]
+            model = model_class()
+            model.load_state_dict(torch.load(path, map_location='cpu'))
+            models[name] = model.eval()
+
+        labels = {name: CLASSIFIERS[name][1] for name in models}
+        return cls(MultiHeadClassifier(models).eval(), list(models), labels, **kwargs)
+
+    @classmethod
+    def from_multitask(cls, path, **kwargs):
+        """Build a runtime from a MultiTaskClassifier state dict (one shared trunk for both classifiers)
+
+        Args:
+            path (str): .pth file written by self_driving_car.models.multitask
+            **kwargs: Passed to the constructor
+
+        Returns:
+            ClassifierRuntime
+        """
+        state = torch.load(path, map_location='cpu')
+        model = MultiTaskClassifier(state['sign_fc2.weight'].shape[0], state['forward_fc2.weight'].shape[0])
+        model.load_state_dict(state)
+
+        labels = {}
+        for name, head in zip(MultiTaskClassifier.HEADS, (model.sign_fc2, model.forward_fc2)):
+            default = CLASSIFIERS[name][1]
+            labels[name] = default if head.out_features == len(default) else \
+                tuple(str(i) for i in range(head.out_features))
+        return cls(model.eval(), MultiTaskClassifier.HEADS, labels, **kwargs)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a runtime exported with export()
+
+        Args:
+            path (str): .pt (TorchScript) or .onnx file; its .json metadata file must be next to it
+            **kwargs: Passed to the constructor
+
+        Returns:
+            ClassifierRuntime
+        """
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+
+        if path.endswith('.onnx'):
+            module = _OnnxModule(path)
+        else:
+            module = torch.jit.load(path, map_location='cpu').eval()
+        kwargs.setdefault('input_size', metadata['input_size'])
+        return cls(module, metadata['names'], metadata['labels'], **kwargs)
+
+    def export(self, path):
+        """Export the multi-head module to TorchScript (.pt) or ONNX (.onnx)
+
+        A <path>.json file with the classifier names and class names is written next to it.
+
+        Args:
+            path (str): Output file, the extension selects the format
+        """
+        if not isinstance(self.module, (MultiHeadClassifier, MultiTaskClassifier)):
+            raise ValueError("Only runtimes built with from_weights() or from_multitask() can be exported")
+
+        example = torch.zeros(1, 3, self.input_size, self.input_size)
+        if path.endswith('.onnx'):
+            torch.onnx.export(self.module, (example,), path, input_names=['input'], output_names=self.names,
+                              dynamic_axes={'input': {0: 'batch'}})
+        else:
+            with torch.inference_mode():
+                traced = torch.jit.trace(self.module, example)
+            torch.jit.save(torch.jit.freeze(traced.eval()), path)
+
+        with open(path + '.json', 'w') as f:
+            json.dump({'names': self.names, 'labels': self.labels, 'input_size': self.input_size}, f, indent=2)
+
+    def preprocess(self, frame):
+        """Frame -> (1, 3, S, S) input tensor, see preprocess()"""
+        return preprocess(frame, self.input_size, self.swap_rb)
+
+    def logits(self, inputs):
+        """Run every classifier on a preprocessed batch
+
+        Returns:
+            dict: Classifier name -> (N, classes) logits tensor
+        """
+        with torch.inference_mode():
+            outputs = self.module(inputs)
+        return {name: torch.as_tensor(output) for name, output in zip(self.names, outputs)}
+
+    def predict(self, frame):
+        """Classify a camera frame with every classifier
+
+        Args:
+            frame (np.ndarray): (H, W, 3) uint8 frame
+
+        Returns:
+            dict: Classifier name -> Prediction(index, label, confidence)
+        """
+        results = {}
+        for name, logits in self.logits(self.preprocess(frame)).items():
+            confidence, index = torch.softmax(logits[0], dim=0).max(dim=0)
+            index = int(index)
+            results[name] = Prediction(index, self.labels[name][index], float(confidence))
+        return results
+
+
+class _OnnxModule:
+    """Makes an ONNX Runtime session callable like the torch modules"""
+
+    def __init__(self, path):
+        import onnxruntime  # Only needed for ONNX models
+
+        self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, inputs):
+        return self.session.run(None, {self.input_name: inputs.numpy()})
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the frame classifiers as one multi-head model")
+    parser.add_argument("output", help="output file: .pt for TorchScript, .onnx for ONNX")
+    parser.add_argument("--forward", default="forward_classifier.pth", help="ForwardClassifier weights")
+    parser.add_argument("--sign", default="sign_classifier.pth", help="SignClassifier weights")
+    parser.add_argument("--multitask", default=None, help="MultiTaskClassifier weights, replace --forward and --sign")
+    args = parser.parse_args()
+
+    if args.multitask:
+        runtime = ClassifierRuntime.from_multitask(args.multitask)
+    else:
+        weights = {name: path for name, path in (('forward', args.forward), ('sign', args.sign))
+                   if path and os.path.exists(path)}
+        runtime = ClassifierRuntime.from_weights(weights)
+    runtime.export(args.output)
+    print(f"Exported {', '.join(runtime.names)} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Distance and time-to-contact of detected signs
+
+A sign of known physical height H whose bounding box is h pixels high is
+about f * H / h meters from the camera, with f the focal length in pixels
+(camera intrinsics). SignRanger measures this for every stop and parking
+sign in the detector's results, using the per-class heights of the signs
+config section, and follows each sign over the frames in a track:
+
+- detections are associated to the nearest track of the same class in the
+  image, new signs open a track
+- an alpha-beta filter smooths the distance and estimates its rate, which
+  gives the time-to-contact (distance / closing speed)
+- tracks not seen for signs.max_age seconds are dropped
+
+Between detections (YOLO runs slower than the control loop) a track's
+distance is predicted with its rate, so behaviours can act when the sign is
+actually near instead of as soon as it appears in the frame.
+
+The focal length comes from a calibration.Calibration (which also removes
+the lens distortion of the box), from signs.focal, or from the horizontal
+field of view of the sim section.
+
+Usage:
+    ranger = SignRanger.from_config(config)
+    ranger.update(detector.detected_objects, detector.detection_time)
+    track = ranger.nearest(now)
+    if track and ranger.distance_at(track, now) < 0.4:
+        ...
+"""
+
+import math
+
+from self_driving_car.behaviours import PARKING_CLASS, STOP_CLASS
+
+
+class SignTrack:
+    """One sign followed over the detector's results"""
+
+    def __init__(self, class_id, distance, center, stamp):
+        self.class_id = class_id
+        self.distance = distance
+        self.rate = 0.0
+        self.center = center
+        self.stamp = stamp
+        self.hits = 1
+
+    @property
+    def time_to_contact(self):
+        """Seconds until the camera reaches the sign at the current closing speed, inf if not closing"""
+        if self.rate >= 0:
+            return math.inf
+        return self.distance / -self.rate
+
+
+class SignRanger:
+    """Range, smoothing and time-to-contact of stop and parking signs"""
+
+    def __init__(self, focal, heights, alpha=0.5, beta=0.2, max_age=0.5, gate=0.25, calibration=None):
+        """Initialize the ranger
+
+        Args:
+            focal (float): Vertical focal length in pixels of the detector's frames
+            heights (dict): Physical height in meters of the sign of each class
+            alpha (float): Weight of a measured distance against the predicted one
+            beta (float): Weight of the measured distance's residual in the rate
+            max_age (float): Seconds a track is kept without detection
+            gate (float): Largest move of a sign's box center, as a fraction of the focal length,
+                to be associated with a track
+            calibration (Calibration): Removes the lens distortion of the boxes
+        """
+        self.focal = focal
+        self.heights = heights
+        self.alpha = alpha
+        self.beta = beta
+        self.max_age = max_age
+        self.gate = gate
+        self.calibration = calibration
+        self.config = None
+
+        # Tracked signs and the detection stamp they were last updated with - accessible from outside the class
+        self.tracks = []
+        self.stamp = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Ranger with the focal length of calibration.file (or signs.focal, or sim.fov) and the signs section"""
+        width, height = config.camera.width, config.camera.height
+        calibration = None
+        if config.signs.focal:
+            focal = config.signs.focal
+        elif config.calibration.file:
+            from self_driving_car.calibration import Calibration
+
+            calibration = Calibration.load(config.calibration.file).scaled((width, height))
+            focal = float(calibration.camera_matrix[1, 1])
+        else:
+            focal = width / 2 / math.tan(math.radians(config.sim.fov) / 2)
+        ranger = cls(focal, {}, calibration=calibration)
+        ranger.config = config.signs
+        ranger._sync()
+        return ranger
+
+    def _sync(self):
+        config = self.config
+        self.heights = {PARKING_CLASS: config.parking_height, STOP_CLASS: config.stop_height}
+        self.alpha = config.alpha
+        self.beta = config.beta
+        self.max_age = config.max_age
+
+    def measure(self, class_id, bbox):
+        """Distance in meters of a sign from its bounding box, None for classes without a height"""
+        sign_height = self.heights.get(class_id)
+        if sign_height is None:
+            return None
+        x1, y1, x2, y2 = bbox
+        top, bottom = ((x1 + x2) / 2, y1), ((x1 + x2) / 2, y2)
+        if self.calibration is not None:
+            top, bottom = self.calibration.undistort_points([top, bottom])
+        pixels = math.hypot(bottom[0] - top[0], bottom[1] - top[1])
+        if pixels < 1:
+            return None
+        return self.focal * sign_height / pixels
+
+    def update(self, detections, stamp):
+        """Update the tracks with a detector result
+
+        Args:
+            detections (list): (index, class, confidence, (x1, y1, x2, y2)) as in ObjectDetection.detected_objects
+            stamp (float): Time of the detection, results with an already seen stamp are ignored
+
+        Returns:
+            list: The tracks
+        """
+        if stamp is None or stamp == self.stamp:
+            return self.tracks
+        if self.config is not None:
+            self._sync()
+        self.stamp = stamp
+
+        unmatched = list(self.tracks)
+        for _, class_id, _, bbox in detections:
+            distance = self.measure(class_id, bbox)
+            if distance is None:
+                continue
+            center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            track = self._match(unmatched, class_id, center)
+            if track is None:
+                self.tracks.append(SignTrack(class_id, distance, center, stamp))
+                continue
+            unmatched.remove(track)
+            self._correct(track, distance, center, stamp)
+
+        self.tracks = [track for track in self.tracks if stamp - track.stamp <= self.max_age]
+        return self.tracks
+
+    def _match(self, tracks, class_id, center):
+        """Track of the class whose last box center is nearest, None if none is within the gate"""
+        best, best_move = None, self.gate * self.focal
+        for track in tracks:
+            if track.class_id != class_id:
+                continue
+            move = math.hypot(center[0] - track.center[0], center[1] - track.center[1])
+            if move <= best_move:
+                best, best_move = track, move
+        return best
+
+    def _correct(self, track, distance, center, stamp):
+        """Alpha-beta update of a track's distance and rate with a measurement"""
+        dt = stamp - track.stamp
+        predicted = track.distance + track.rate * dt
+        residual = distance - predicted
+        track.distance = predicted + self.alpha * residual
+        if dt > 0:
+            track.rate += self.beta * residual / dt
+        track.center = center
+        track.stamp = stamp
+        track.hits += 1
+
+    def distance_at(self, track, now):
+        """Distance of a track predicted to time now"""
+        return max(0.0, track.distance + track.rate * max(0.0, now - track.stamp))
+
+    def nearest(self, now, classes=(PARKING_CLASS, STOP_CLASS)):
+        """Nearest track of the classes at time now, None without"""
+        tracks = [track for track in self.tracks if track.class_id in classes]
+        if not tracks:
+            return None
+        return min(tracks, key=lambda track: self.distance_at(track, now))
+
+    def stats(self):
+        """Distance (m), rate (m/s) and time-to-contact (s) of every track"""
+        return [{'class': track.class_id, 'distance': round(track.distance, 3), 'rate': round(track.rate, 3),
+                 'time_to_contact': round(track.time_to_contact, 2) if math.isfinite(track.time_to_contact) else None,
+                 'hits': track.hits}
+                for track in self.tracks]
@@ -0,0 +1,421 @@
+"""
+Headless PiCar-X simulator for repeatable driving experiments
+
+A kinematic bicycle model drives on a flat floor with a taped line, and a
+pinhole camera renders what the car's camera would see. Each pixel's ground
+point in the car frame is computed once, so rendering a frame is one
+coordinate transform and one cv2.remap over a top-down texture of the track.
+
+SimCar and SimCamera have the methods of Picarx and the basic-library Camera
+that the driving scripts use, so a control loop runs unchanged on either.
+With realtime=False (the default) time only advances on step(dt), which makes
+runs reproducible and faster than real time; with realtime=True the camera
+thread advances it with the wall clock, e.g. for streaming.
+
+Usage:
+    sim = Simulator()
+    sim.car.forward(30)
+    sim.car.set_dir_servo_angle(-10)
+    sim.step(1 / 30)
+    frame = sim.camera.get_image()
+    print(sim.stats())
+"""
+
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class Track:
+    """Closed centerline of the taped line, sampled every `spacing` meters"""
+
+    def __init__(self, points, line_width=0.019):
+        """Initialize the track
+
+        Args:
+            points (np.ndarray): (N, 2) centerline in meters, in driving order
+            line_width (float): Width of the tape in meters
+        """
+        self.points = np.asarray(points, dtype=np.float64)
+        self.line_width = line_width
+
+        segments = np.diff(np.vstack([self.points, self.points[:1]]), axis=0)
+        lengths = np.hypot(segments[:, 0], segments[:, 1])
+        self.distances = np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+        self.length = float(lengths.sum())
+        self.headings = np.arctan2(segments[:, 1], segments[:, 0])
+
+    @classmethod
+    def rounded_rectangle(cls, width=3.0, height=2.0, radii=(0.6, 0.4, 0.6, 0.4), spacing=0.005, line_width=0.019):
+        """Rectangle with rounded corners, driven counter-clockwise
+
+        Args:
+            width (float): Outer width in meters
+            height (float): Outer height in meters
+            radii (tuple): Corner radii in meters (bottom right, top right, top left, bottom left)
+            spacing (float): Distance between centerline samples in meters
+            line_width (float): Width of the tape in meters
+        """
+        corners = [(width / 2, -height / 2), (width / 2, height / 2), (-width / 2, height / 2),
+                   (-width / 2, -height / 2)]
+        # Corner arc centers and the start angle of each arc, counter-clockwise
+        start_angles = [-math.pi / 2, 0.0, math.pi / 2, math.pi]
+        directions = [(-1, 1), (-1, -1), (1, -1), (1, 1)]
+
+        points = []
+        for (cx, cy), start, (dx, dy), radius in zip(corners, start_angles, directions, radii):
+            center = (cx + dx * radius, cy + dy * radius)
+            steps = max(2, int(math.ceil(radius * math.pi / 2 / spacing)))
+            for angle in np.linspace(start, start + math.pi / 2, steps, endpoint=False):
+                points.append((center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle)))
+            # Straight to the next corner
+            end = (center[0] + radius * math.cos(start + math.pi / 2), center[1] + radius * math.sin(start + math.pi / 2))
+            points.append(end)
+        points = np.array(points)
+
+        # Resample the straights, which are only given by their end points
+        closed = np.vstack([points, points[:1]])
+        lengths = np.hypot(*np.diff(closed, axis=0).T)
+        distances = np.concatenate([[0.0], np.cumsum(lengths)])
+        samples = np.arange(0.0, distances[-1], spacing)
+        resampled = np.stack([np.interp(samples, distances, closed[:, 0]),
+                              np.interp(samples, distances, closed[:, 1])], axis=1)
+        return cls(resampled, line_width)
+
+    def nearest(self, x, y):
+        """Index of the closest centerline sample and the signed lateral offset to it
+
+        The offset is positive when the point is left of the line (driving direction).
+        """
+        dx = x - self.points[:, 0]
+        dy = y - self.points[:, 1]
+        index = int(np.argmin(dx * dx + dy * dy))
+        heading = self.headings[index]
+        offset = -math.sin(heading) * dx[index] + math.cos(heading) * dy[index]
+        return index, offset
+
+    def curvature(self, index, window=10):
+        """Signed curvature (1/m, positive turning left) around a centerline sample"""
+        n = len(self.points)
+        change = self.headings[(index + window) % n] - self.headings[(index - window) % n]
+        change = (change + math.pi) % (2 * math.pi) - math.pi
+        return change / (2 * window * self.length / n)
+
+    def render(self, resolution=0.002, margin=1.0, floor=190, line=35, noise=3.0, seed=0):
+        """Top-down texture of the floor and the tape
+
+        Returns:
+            tuple: (texture as uint8 (H, W, 3), origin (x, y) of pixel (0, 0) in meters, resolution)
+        """
+        low = self.points.min(axis=0) - margin
+        high = self.points.max(axis=0) + margin
+        size = np.ceil((high - low) / resolution).astype(int)
+        texture = np.full((size[1], size[0]), floor, dtype=np.uint8)
+
+        # Rows grow downwards, so y is flipped
+        pixels = np.stack([(self.points[:, 0] - low[0]) / resolution,
+                           (high[1] - self.points[:, 1]) / resolution], axis=1)
+        thickness = max(1, int(round(self.line_width / resolution)))
+        cv2.polylines(texture, [np.round(pixels * 16).astype(np.int32)], True, line, thickness,
+                      cv2.LINE_AA, shift=4)
+
+        if noise:
+            # Low-contrast floor grain, well below the Canny thresholds of the lane detection
+            rng = np.random.default_rng(seed)
+            grain = cv2.GaussianBlur(rng.normal(0, noise, texture.shape).astype(np.float32), (3, 3), 0)
+            texture = np.clip(texture + grain, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR), (float(low[0]), float(high[1])), resolution
+
+
+class SimCar:
+    """Kinematic bicycle model with the Picarx methods used by the driving scripts"""
+
+    def __init__(self, wheelbase=0.095, max_speed=1.0, max_steering=35, speed_lag=0.1, grip=None):
+        """Initialize the car
+
+        Args:
+            wheelbase (float): Distance between the axles in meters
+            max_speed (float): Speed in m/s at forward(100)
+            max_steering (float): Servo limit in degrees
+            speed_lag (float): Time constant of the motors in seconds
+            grip (float): Highest lateral acceleration in m/s^2 the tires hold, faster curves
+                slide outwards (understeer); None for perfect grip
+        """
+        self.wheelbase = wheelbase
+        self.max_speed = max_speed
+        self.max_steering = max_steering
+        self.speed_lag = speed_lag
+        self.grip = grip
+
+        # Pose in the track frame and current state
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+        self.speed = 0.0
+        self.target_speed = 0.0
+        self.steering = 0.0
+        self.cam_tilt = 0.0
+        self.cam_pan = 0.0
+
+    def forward(self, speed):
+        self.target_speed = max(0.0, min(100.0, speed)) / 100 * self.max_speed
+
+    def backward(self, speed):
+        self.target_speed = -max(0.0, min(100.0, speed)) / 100 * self.max_speed
+
+    def stop(self):
+        self.target_speed = 0.0
+
+    def set_dir_servo_angle(self, angle):
+        """Steering angle in degrees, negative steers left like on the PiCar-X"""
+        self.steering = max(-self.max_steering, min(self.max_steering, angle))
+
+    def set_cam_tilt_angle(self, angle):
+        self.cam_tilt = angle
+
+    def set_cam_pan_angle(self, angle):
+        self.cam_pan = angle
+
+    def step(self, dt):
+        """Advance the pose by dt seconds"""
+        if self.speed_lag > 0:
+            self.speed += (self.target_speed - self.speed) * min(1.0, dt / self.speed_lag)
+        else:
+            self.speed = self.target_speed
+        yaw_rate = self.speed * math.tan(math.radians(-self.steering)) / self.wheelbase
+        if self.grip is not None and abs(self.speed) > 1e-9:
+            # Lateral acceleration speed * yaw_rate is limited by the tires
+            max_yaw_rate = self.grip / abs(self.speed)
+            yaw_rate = max(-max_yaw_rate, min(max_yaw_rate, yaw_rate))
+        # Exact integration along the arc driven during dt
+        if abs(yaw_rate) > 1e-9:
+            new_heading = self.heading + yaw_rate * dt
+            radius = self.speed / yaw_rate
+            self.x += radius * (math.sin(new_heading) - math.sin(self.heading))
+            self.y -= radius * (math.cos(new_heading) - math.cos(self.heading))
+            self.heading = new_heading
+        else:
+            self.x += self.speed * math.cos(self.heading) * dt
+            self.y += self.speed * math.sin(self.heading) * dt
+
+
+class SimCamera:
+    """Pinhole camera on the car with the basic-library Camera methods used by the driving scripts"""
+
+    def __init__(self, simulator, size=(640, 480), fov=62.2, height=0.12, pitch=20.0, max_range=4.0,
+                 sky=(225, 225, 225), fps=30):
+        """Initialize the camera
+
+        Args:
+            simulator (Simulator): Simulator the camera belongs to
+            size (tuple): Resolution (width, height)
+            fov (float): Horizontal field of view in degrees (Pi camera v2: 62.2)
+            height (float): Height of the lens above the floor in meters
+            pitch (float): Downward tilt in degrees
+            max_range (float): Ground points further away are drawn as background
+            sky (tuple): Color above the horizon and beyond max_range
+            fps (int): Frame rate of the camera thread in realtime mode
+        """
+        self.simulator = simulator
+        self.camera_size = size
+        self.camera_width = size[0]
+        self.camera_height = size[1]
+        self.fov = fov
+        self.mount_height = height
+        self.pitch = pitch
+        self.sky = sky
+        self.fps_target = fps
+
+        # Camera state
+        self.is_running = False
+        self.camera_thread = None
+
+        # Frame storage - accessible from outside the class
+        self.current_frame = None
+        self.fps = 0
+        self.draw_fps = False
+        self.current_detections = []
+        self.draw_detections_enabled = False
+        self.draw_detections_confidence = False
+
+        self._ground = self._ground_points(max_range)
+        self._rendered_at = None
+
+    def camera_matrix(self):
+        """Intrinsic matrix K of the simulated camera"""
+        fx = self.camera_width / 2 / math.tan(math.radians(self.fov) / 2)
+        return np.array([[fx, 0, self.camera_width / 2], [0, fx, self.camera_height / 2], [0, 0, 1]])
+
+    def _ground_points(self, max_range):
+        """Ground point (forward, left) in meters seen by every pixel, NaN above the horizon"""
+        k = self.camera_matrix()
+        u, v = np.meshgrid(np.arange(self.camera_width) + 0.5, np.arange(self.camera_height) + 0.5)
+        # Ray in camera coordinates (x right, y down, z forward), then pitched down around x
+        rx = (u - k[0, 2]) / k[0, 0]
+        ry = (v - k[1, 2]) / k[1, 1]
+        pitch = math.radians(self.pitch)
+        down = ry * math.cos(pitch) + math.sin(pitch)
+        forward = math.cos(pitch) - ry * math.sin(pitch)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(down > 1e-6, self.mount_height / down, np.nan)
+        ground_forward = t * forward
+        ground_left = -t * rx
+        far = ~(np.hypot(ground_forward, ground_left) <= max_range)
+        ground_forward[far] = np.nan
+        ground_left[far] = np.nan
+        return ground_forward.astype(np.float32), ground_left.astype(np.float32)
+
+    def start(self):
+        """Start the camera; in realtime mode a thread advances the simulation and renders frames"""
+        if self.is_running:
+            print("Camera is already running")
+            return
+        self.is_running = True
+        self.get_image()
+        if self.simulator.realtime:
+            self.camera_thread = threading.Thread(target=self._camera_loop, daemon=True)
+            self.camera_thread.start()
+        return True
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self.camera_thread:
+            self.camera_thread.join(timeout=3)
+            self.camera_thread = None
+
+    def _camera_loop(self):
+        period = 1 / self.fps_target
+        last = time.monotonic()
+        while self.is_running:
+            time.sleep(max(0.0, last + period - time.monotonic()))
+            now = time.monotonic()
+            self.simulator.step(now - last)
+            self.fps = round(1 / max(now - last, 1e-3), 1)
+            last = now
+            self.get_image()
+
+    def render(self):
+        """Render the view from the current car pose"""
+        car = self.simulator.car
+        cos, sin = math.cos(car.heading), math.sin(car.heading)
+        x, y = float(car.x), float(car.y)
+        ground_forward, ground_left = self._ground
+        world_x = x + cos * ground_forward - sin * ground_left
+        world_y = y + sin * ground_forward + cos * ground_left
+
+        (x0, y0), resolution = self.simulator.texture_origin, self.simulator.texture_resolution
+        map_x = ((world_x - x0) / resolution).astype(np.float32)
+        map_y = ((y0 - world_y) / resolution).astype(np.float32)
+        # NaN (sky) pixels fall outside the texture and take the border color
+        np.nan_to_num(map_x, copy=False, nan=-1.0)
+        np.nan_to_num(map_y, copy=False, nan=-1.0)
+        frame = cv2.remap(self.simulator.texture, map_x, map_y, cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=self.sky)
+        if self.draw_detections_enabled and self.current_detections:
+            for detection in self.current_detections:
+                x1, y1, x2, y2 = detection[:4]
+                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+        return frame
+
+    def get_image(self):
+        """Latest frame, rendered only if the car moved since the last one"""
+        if self._rendered_at != self.simulator.time:
+            self.current_frame = self.render()
+            self._rendered_at = self.simulator.time
+        return self.current_frame
+
+    def show_fps(self, show=True, color=None, size=None, origin=None):
+        self.draw_fps = show
+
+    def update_detections(self, detections):
+        self.current_detections = detections
+
+    def enable_detection_overlay(self, enable=True, confidence=False):
+        self.draw_detections_enabled = enable
+        self.draw_detections_confidence = confidence
+
+    def take_photo(self, filename, path=''):
+        frame = self.get_image()
+        return cv2.imwrite(f"{path}/{filename}.jpg" if path else f"{filename}.jpg", frame)
+
+
+class Simulator:
+    """Track, car and camera, with lap and cross-track error statistics"""
+
+    def __init__(self, track=None, car=None, camera_options=None, realtime=False, start_offset=0.0):
+        """Initialize the simulator
+
+        Args:
+            track (Track): Track to drive on, a rounded rectangle by default
+            car (SimCar): Car model, default parameters if None
+            camera_options (dict): Keyword arguments of SimCamera
+            realtime (bool): Advance time with the wall clock in the camera thread
+            start_offset (float): Initial lateral offset from the line in meters
+        """
+        self.track = track or Track.rounded_rectangle()
+        self.car = car or SimCar()
+        self.realtime = realtime
+        self.lock = threading.Lock()
+        self.texture, self.texture_origin, self.texture_resolution = self.track.render()
+        self.camera = SimCamera(self, **(camera_options or {}))
+        self.reset(start_offset)
+
+    def reset(self, start_offset=0.0):
+        """Put the car on the start of the line, facing the driving direction"""
+        x, y = (float(value) for value in self.track.points[0])
+        heading = float(self.track.headings[0])
+        self.car.x = x - math.sin(heading) * start_offset
+        self.car.y = y + math.cos(heading) * start_offset
+        self.car.heading = heading
+        self.car.speed = self.car.target_speed = 0.0
+        self.car.steering = 0.0
+
+        self.time = 0.0
+        self.distance = 0.0
+        self.laps = []
+        self._lap_start = 0.0
+        self._index, _ = self.track.nearest(self.car.x, self.car.y)
+        self._errors = []
+
+    def step(self, dt):
+        """Advance the simulation by dt seconds"""
+        with self.lock:
+            self.car.step(dt)
+            self.time += dt
+
+            index, offset = self.track.nearest(self.car.x, self.car.y)
+            n = len(self.track.points)
+            # Progress along the line, wrapping around at the start
+            advance = (index - self._index + n // 2) % n - n // 2
+            self.distance += advance * self.track.length / n
+            self._index = index
+            self._errors.append(offset)
+
+            if self.distance - len(self.laps) * self.track.length >= self.track.length:
+                self.laps.append(self.time - self._lap_start)
+                self._lap_start = self.time
+
+    def cross_track_error(self):
+        """Current signed distance from the line in meters (positive: car left of the line)"""
+        return self.track.nearest(self.car.x, self.car.y)[1]
+
+    def stats(self):
+        """Summary of the run so far
+
+        Returns:
+            dict: time, distance, laps (lap times), mean_speed, mean and max absolute cross-track error
+        """
+        errors = np.abs(np.array(self._errors)) if self._errors else np.zeros(1)
+        return {
+            'time': self.time,
+            'distance': self.distance,
+            'laps': list(self.laps),
+            'mean_speed': self.distance / self.time if self.time else 0.0,
+            'mean_cte': float(errors.mean()),
+            'max_cte': float(errors.max()),
+        }
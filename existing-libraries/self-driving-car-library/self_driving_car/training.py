@@ -0,0 +1,316 @@
+"""
+Training harness for the small frame classifiers
+
+The ImageFolder dataset is decoded and resized once into a memory-mapped uint8
+file (N, 3, 64, 64), with the same preprocessing the ClassifierRuntime applies
+to camera frames. Epochs then read batches straight from that file, so epoch
+time is spent in the model rather than in JPEG decoding. The cache is rebuilt
+when files of the dataset are added, removed or modified.
+
+Usage:
+    python -m self_driving_car.training sign self_driving_car/sign -o sign_classifier.pth
+    python -m self_driving_car.training forward dataset_forward -o forward_classifier.pth --bf16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
+
+from self_driving_car.models.forward import ForwardClassifier
+from self_driving_car.models.sign import SignClassifier
+
+
+INPUT_SIZE = 64
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MODELS = {'sign': SignClassifier, 'forward': ForwardClassifier}
+
+
+def list_image_folder(root):
+    """List an ImageFolder tree like torchvision does: classes are the sorted sub folders
+
+    Returns:
+        tuple: (classes, paths, labels)
+    """
+    classes = sorted(entry.name for entry in os.scandir(root) if entry.is_dir() and not entry.name.startswith('.'))
+    paths, labels = [], []
+    for label, name in enumerate(classes):
+        for folder, _, files in sorted(os.walk(os.path.join(root, name))):
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(folder, filename))
+                    labels.append(label)
+    return classes, paths, labels
+
+
+def _fingerprint(paths, size):
+    """Hash of the file list, sizes and modification times, identifying a cache"""
+    digest = hashlib.sha1(str(size).encode('utf-8'))
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_image(job):
+    """Worker: decode and resize one image to a (3, S, S) uint8 RGB array"""
+    path, size = job
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    small = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+
+
+def build_cache(root, cache_dir=None, size=INPUT_SIZE, workers=None):
+    """Decode and resize an ImageFolder dataset once into a memory-mapped file
+
+    Args:
+        root (str): ImageFolder root (one sub folder per class)
+        cache_dir (str): Where the cache is stored, defaults to <root>.cache next to the dataset
+            (not inside it, where ImageFolder would take it for a class)
+        size (int): Output width and height
+        workers (int): Number of decoding processes, defaults to the CPU count
+
+    Returns:
+        str: The cache directory, to be opened with CachedImageDataset
+    """
+    cache_dir = cache_dir or os.path.normpath(root) + '.cache'
+    classes, paths, labels = list_image_folder(root)
+    fingerprint = _fingerprint(paths, size)
+
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f).get('fingerprint') == fingerprint:
+                return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    images = np.lib.format.open_memmap(os.path.join(cache_dir, 'images.tmp.npy'), mode='w+',
+                                       dtype=np.uint8, shape=(len(paths), 3, size, size))
+    valid = np.ones(len(paths), dtype=bool)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, image in enumerate(executor.map(_load_image, [(p, size) for p in paths], chunksize=32)):
+            if image is None:
+                valid[i] = False
+            else:
+                images[i] = image
+    images.flush()
+    del images
+
+    # Unreadable files are dropped by compacting the array
+    if not valid.all():
+        kept = np.load(os.path.join(cache_dir, 'images.tmp.npy'), mmap_mode='r')[valid]
+        np.save(os.path.join(cache_dir, 'images.tmp.npy'), kept)
+        print(f"⚠️ {int((~valid).sum())} unreadable images skipped")
+    os.replace(os.path.join(cache_dir, 'images.tmp.npy'), os.path.join(cache_dir, 'images.npy'))
+
+    paths = [p for p, keep in zip(paths, valid) if keep]
+    np.save(os.path.join(cache_dir, 'labels.npy'), np.array(labels, dtype=np.int64)[valid])
+    with open(meta_path, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'classes': classes, 'size': size,
+                   'paths': [os.path.relpath(p, root) for p in paths]}, f)
+    return cache_dir
+
+
+class CachedImageDataset(Dataset):
+    """Dataset over a cache written by build_cache(), returning uint8 tensors
+
+    The memory map is opened lazily in each loader worker; pages are shared
+    through the OS page cache instead of being copied into every worker.
+    Convert batches with batch.float().div_(255) on the training side.
+    """
+
+    def __init__(self, cache_dir, indices=None):
+        """Initialize the dataset
+
+        Args:
+            cache_dir (str): Directory written by build_cache()
+            indices (np.ndarray): Subset of the cached images, all by default
+        """
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        self.classes = meta['classes']
+        self.paths = meta['paths']
+        self.all_labels = np.load(os.path.join(cache_dir, 'labels.npy'))
+        self.indices = np.arange(len(self.all_labels)) if indices is None else np.asarray(indices)
+        self.targets = self.all_labels[self.indices]
+        self._images = None
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None  # Reopened in the worker process
+        return state
+
+    def _array(self):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, 'images.npy'), mmap_mode='r')
+        return self._images
+
+    def __getitem__(self, index):
+        position = self.indices[index]
+        return torch.from_numpy(np.array(self._array()[position])), int(self.all_labels[position])
+
+    def __getitems__(self, indices):
+        # One fancy-indexing read per batch instead of one read per image
+        positions = self.indices[np.asarray(indices)]
+        images = torch.from_numpy(self._array()[positions])
+        return [(image, int(label)) for image, label in zip(images, self.all_labels[positions])]
+
+    def split(self, val_fraction=0.2):
+        """Deterministic train/valid subsets, assigned per file path"""
+        keys = np.array([zlib.crc32(self.paths[i].encode('utf-8')) % 1000 for i in self.indices])
+        valid = keys < val_fraction * 1000
+        return (CachedImageDataset(self.cache_dir, self.indices[~valid]),
+                CachedImageDataset(self.cache_dir, self.indices[valid]))
+
+
+def make_loader(dataset, batch_size=64, shuffle=True, workers=2):
+    """DataLoader with worker settings suited to the cached dataset
+
+    Workers stay alive between epochs (persistent_workers); pinned memory is
+    only enabled when batches go to a CUDA device.
+    """
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=workers,
+                      pin_memory=torch.cuda.is_available(), persistent_workers=workers > 0,
+                      prefetch_factor=4 if workers > 0 else None)
+
+
+def bf16_supported():
+    """Whether bfloat16 autocast works on this CPU"""
+    try:
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            torch.nn.functional.conv2d(torch.rand(1, 3, 8, 8), torch.rand(4, 3, 3, 3))
+        return True
+    except RuntimeError:
+        return False
+
+
+def evaluate(model, loader, device, use_bf16=False):
+    """Return (mean loss, accuracy) of a model on a loader"""
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    model.eval()
+    total_loss, correct, count = 0.0, 0, 0
+    with torch.inference_mode(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=use_bf16):
+        for images, labels in loader:
+            images = images.to(device, non_blocking=True).float().div_(255.0)
+            labels = labels.to(device, non_blocking=True)
+            outputs = model(images).float()
+            total_loss += criterion(outputs, labels).item()
+            correct += (outputs.argmax(1) == labels).sum().item()
+            count += len(labels)
+    return total_loss / max(count, 1), correct / max(count, 1)
+
+
+def train_classifier(model, root, output, n_epochs=10, batch_size=64, lr=0.001, val_fraction=0.2,
+                     workers=2, bf16=False, cache_dir=None):
+    """Train a classifier on an ImageFolder dataset through the cache
+
+    The state dict is written only when the validation accuracy improves (the
+    training loss when there is no validation split), atomically through a
+    temporary file so a crash never leaves a truncated checkpoint.
+
+    Args:
+        model (nn.Module): Classifier taking (N, 3, 64, 64) inputs in [0, 1]
+        root (str): ImageFolder root
+        output (str): Checkpoint path (.pth state dict)
+        n_epochs (int): Number of epochs
+        batch_size (int): Images per step
+        lr (float): Adam learning rate
+        val_fraction (float): Fraction of the images held out for validation
+        workers (int): DataLoader worker processes
+        bf16 (bool): Train under bfloat16 autocast on CPU when supported
+        cache_dir (str): Cache location, defaults to <root>.cache
+
+    Returns:
+        float: Best validation accuracy (or -best training loss)
+
+    Raises:
+        ValueError: If the split leaves no training images
+    """
+    dataset = CachedImageDataset(build_cache(root, cache_dir))
+    train_set, val_set = dataset.split(val_fraction) if val_fraction > 0 else (dataset, None)
+    if len(train_set) == 0:
+        raise ValueError(f"No training images in {root} with val_fraction {val_fraction} "
+                         f"({len(dataset)} images in total)")
+    if val_set is not None and len(val_set) == 0:
+        val_set = None
+    train_loader = make_loader(train_set, batch_size, True, workers)
+    val_loader = make_loader(val_set, batch_size, False, workers) if val_set else None
+
+    use_bf16 = bf16 and bf16_supported()
+    if bf16 and not use_bf16:
+        print("⚠️ bfloat16 is not supported on this CPU, training in float32")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = model.to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+
+    best = -float('inf')
+    for epoch in range(n_epochs):
+        start = time.perf_counter()
+        model.train()
+        running_loss = 0.0
+        for images, labels in train_loader:
+            images = images.to(device, non_blocking=True).float().div_(255.0)
+            labels = labels.to(device, non_blocking=True)
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast('cpu', dtype=torch.bfloat16, enabled=use_bf16):
+                outputs = model(images)
+            loss = criterion(outputs.float(), labels)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(labels)
+        train_loss = running_loss / len(train_set)
+
+        if val_loader is not None:
+            val_loss, accuracy = evaluate(model, val_loader, device, use_bf16)
+            score = accuracy
+            summary = f"loss {train_loss:.4f}, val loss {val_loss:.4f}, val accuracy {accuracy:.3f}"
+        else:
+            score = -train_loss
+            summary = f"loss {train_loss:.4f}"
+        print(f"epoch {epoch+1}/{n_epochs}, {summary} ({time.perf_counter() - start:.1f}s)")
+
+        if score > best:
+            best = score
+            torch.save(model.state_dict(), output + '.tmp')
+            os.replace(output + '.tmp', output)
+            print("model saved")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train SignClassifier or ForwardClassifier")
+    parser.add_argument("model", choices=sorted(MODELS))
+    parser.add_argument("root", help="ImageFolder dataset (one sub folder per class)")
+    parser.add_argument("-o", "--output", default=None, help="checkpoint, defaults to <model>_classifier.pth")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 mixed precision on CPU")
+    args = parser.parse_args()
+
+    train_classifier(MODELS[args.model](), args.root, args.output or f"{args.model}_classifier.pth",
+                     args.epochs, args.batch_size, args.lr, args.val_fraction, args.workers, args.bf16)
+
+
+if __name__ == "__main__":
+    main()
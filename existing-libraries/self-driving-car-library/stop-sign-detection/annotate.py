@@ -0,0 +1,334 @@
+"""
+Interactive multi-class annotation tool with YOLO export.
+
+Usage:
+    python annotate.py images/ --classes parking stop --session session.json --export yolo_dataset
+    python annotate.py images/ --classes parking stop --model my_yolo.pt   # pre-label with a detector
+
+- Boxes are drawn by dragging with the left mouse button; any number of boxes per image.
+- Controls:
+    - 0-9: select the class of the next box (shown in the window title)
+    - Enter / Space: accept the boxes of the current image and go to the next one
+    - 'b': go back to the previous image
+    - 'u': remove the last box, 'c': remove all boxes of the image
+    - 's': skip the image (it is left out of the export)
+    - ESC: save the session and exit
+- The session file is written after every image; running the tool again with the
+  same session file resumes where it stopped.
+- Boxes are stored in original image pixels, independent of the 640x480 display size.
+- Exported images are named after their path relative to the folder (stop/img1.jpg ->
+  stop_img1.jpg), since subfolders may reuse file names.
+- The next images are loaded, resized and (optionally) pre-labelled in a background
+  thread while the current one is being annotated.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import zlib
+
+import cv2
+
+from convert_annotations import write_data_yaml
+
+WINDOW = "Annotate"
+DISPLAY_SIZE = (640, 480)
+PREFETCH = 4
+COLORS = [(0, 255, 0), (0, 0, 255), (255, 0, 0), (0, 255, 255), (255, 0, 255),
+          (255, 255, 0), (128, 255, 0), (0, 128, 255), (255, 0, 128), (128, 128, 255)]
+
+
+def get_all_images(folder):
+    """Return sorted list of image file paths below folder (.jpg, .png, .jpeg, case-insensitive)."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(('.jpg', '.png', '.jpeg')))
+    return sorted(paths)
+
+
+class Prefetcher:
+    """Loads, resizes and pre-labels upcoming images in a background thread."""
+
+    def __init__(self, image_paths, detector=None, min_confidence=0.5):
+        """
+        Args:
+            image_paths (list[str]): Images in annotation order.
+            detector: Optional ultralytics YOLO model used to propose boxes.
+            min_confidence (float): Minimum confidence of proposed boxes.
+        """
+        self.image_paths = image_paths
+        self.detector = detector
+        self.min_confidence = min_confidence
+
+        self.cache = {}
+        self.wanted = set()
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def _load(self, index):
+        """Load one image: (display image, scale x, scale y, proposed boxes in original pixels)."""
+        image = cv2.imread(self.image_paths[index])
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        display = cv2.resize(image, DISPLAY_SIZE, interpolation=cv2.INTER_AREA)
+
+        proposals = []
+        if self.detector is not None:
+            for result in self.detector(image, verbose=False, conf=self.min_confidence):
+                for box in result.boxes:
+                    x1, y1, x2, y2 = (float(v) for v in box.xyxy[0].cpu().numpy())
+                    proposals.append([int(box.cls[0]), x1, y1, x2, y2])
+        return display, width / DISPLAY_SIZE[0], height / DISPLAY_SIZE[1], proposals
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while self.running and not self.wanted - set(self.cache):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                index = min(self.wanted - set(self.cache))
+            loaded = self._load(index)
+            with self.condition:
+                self.cache[index] = loaded
+                self.condition.notify_all()
+
+    def get(self, index):
+        """Return the loaded image at index, waiting if it's not ready, and schedule the next ones."""
+        with self.condition:
+            self.wanted = {i for i in range(index, index + PREFETCH + 1) if i < len(self.image_paths)}
+            # Keep the previous image too, so going back is instant
+            self.cache = {i: v for i, v in self.cache.items() if i in self.wanted or i == index - 1}
+            self.condition.notify_all()
+            while index not in self.cache:
+                self.condition.wait()
+            return self.cache[index]
+
+    def stop(self):
+        """Stop the background thread."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+
+class Annotator:
+    """Holds the annotation session and the interactive state of the current image."""
+
+    def __init__(self, image_paths, classes, session_path, detector=None):
+        self.image_paths = image_paths
+        self.classes = classes
+        self.session_path = session_path
+
+        # path -> list of [class, x1, y1, x2, y2] in original pixels, or None when skipped
+        self.annotations = {}
+        self.index = 0
+        self.load_session()
+
+        self.prefetcher = Prefetcher(image_paths, detector)
+        self.current_class = 0
+        self.boxes = []
+        self.start_point = None
+        self.display = None
+        self.scale = (1.0, 1.0)
+
+    def load_session(self):
+        if self.session_path and os.path.exists(self.session_path):
+            with open(self.session_path) as f:
+                session = json.load(f)
+            self.annotations = session.get("annotations", {})
+            self.index = min(session.get("index", 0), max(len(self.image_paths) - 1, 0))
+            print(f"[INFO] Resuming session at image {self.index + 1}/{len(self.image_paths)}")
+
+    def save_session(self):
+        if not self.session_path:
+            return
+        temporary = self.session_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"classes": self.classes, "index": self.index, "annotations": self.annotations}, f)
+        os.replace(temporary, self.session_path)
+
+    def on_mouse(self, event, x, y, flags, param):
+        """Mouse callback: drag with the left button to add a box of the current class."""
+        if event == cv2.EVENT_LBUTTONDOWN:
+            self.start_point = (x, y)
+        elif event == cv2.EVENT_MOUSEMOVE and self.start_point is not None:
+            self.redraw(preview=(self.start_point, (x, y)))
+        elif event == cv2.EVENT_LBUTTONUP and self.start_point is not None:
+            (x0, y0), self.start_point = self.start_point, None
+            if abs(x - x0) > 2 and abs(y - y0) > 2:
+                sx, sy = self.scale
+                self.boxes.append([self.current_class, min(x0, x) * sx, min(y0, y) * sy,
+                                   max(x0, x) * sx, max(y0, y) * sy])
+            self.redraw()
+
+    def redraw(self, preview=None):
+        image = self.display.copy()
+        sx, sy = self.scale
+        for object_class, x1, y1, x2, y2 in self.boxes:
+            color = COLORS[object_class % len(COLORS)]
+            top_left = (int(x1 / sx), int(y1 / sy))
+            cv2.rectangle(image, top_left, (int(x2 / sx), int(y2 / sy)), color, 2)
+            cv2.putText(image, self.class_name(object_class), (top_left[0], top_left[1] - 4),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        if preview:
+            cv2.rectangle(image, preview[0], preview[1], COLORS[self.current_class % len(COLORS)], 1)
+        cv2.imshow(WINDOW, image)
+
+    def class_name(self, object_class):
+        return self.classes[object_class] if object_class < len(self.classes) else str(object_class)
+
+    def update_title(self):
+        path = self.image_paths[self.index]
+        cv2.setWindowTitle(WINDOW, f"[{self.index + 1}/{len(self.image_paths)}] {os.path.basename(path)}"
+                                   f" - class {self.current_class}: {self.class_name(self.current_class)}")
+
+    def show(self, index):
+        self.index = index
+        loaded = self.prefetcher.get(index)
+        if loaded is None:
+            print(f"⚠️ Could not read {self.image_paths[index]}, skipping.")
+            self.annotations[self.image_paths[index]] = None
+            return False
+        self.display, scale_x, scale_y, proposals = loaded
+        self.scale = (scale_x, scale_y)
+
+        # Existing annotations win over detector proposals
+        existing = self.annotations.get(self.image_paths[index])
+        self.boxes = [list(box) for box in (existing if existing is not None else proposals)]
+        self.redraw()
+        self.update_title()
+        return True
+
+    def run(self):
+        """Annotation loop; returns when all images are done or ESC is pressed."""
+        if not self.image_paths:
+            print("No images to annotate.")
+            return
+
+        cv2.namedWindow(WINDOW)
+        cv2.setMouseCallback(WINDOW, self.on_mouse)
+        index = self.index
+
+        while index < len(self.image_paths):
+            if not self.show(index):
+                index += 1
+                continue
+
+            while True:
+                key = cv2.waitKey(0) & 0xFF
+                if key in (13, 32):  # Enter / Space: accept
+                    self.annotations[self.image_paths[index]] = self.boxes
+                    index += 1
+                    break
+                elif key == ord('s'):
+                    print("⏭ Skipping...")
+                    self.annotations[self.image_paths[index]] = None
+                    index += 1
+                    break
+                elif key == ord('b') and index > 0:
+                    index -= 1
+                    break
+                elif key == ord('u') and self.boxes:
+                    self.boxes.pop()
+                    self.redraw()
+                elif key == ord('c'):
+                    self.boxes = []
+                    self.redraw()
+                elif ord('0') <= key <= ord('9'):
+                    self.current_class = key - ord('0')
+                    self.update_title()
+                elif key == 27:  # ESC: save and exit
+                    print("🚪 Exiting annotation.")
+                    self.save_session()
+                    cv2.destroyAllWindows()
+                    return
+
+            self.index = min(index, len(self.image_paths) - 1)
+            self.save_session()
+
+        cv2.destroyAllWindows()
+
+
+def export_yolo(annotations, classes, output_dir, val_fraction=0.2, root=None):
+    """Write annotated images as a YOLO dataset (train/valid images + labels, data.yaml).
+
+    Args:
+        annotations (dict): path -> list of [class, x1, y1, x2, y2] in original pixels; None entries are skipped.
+        classes (list[str]): Class names by class id.
+        output_dir (str): Dataset directory.
+        val_fraction (float): Fraction of images assigned to the validation split (deterministic per file name).
+        root (str): Folder the images were collected from; exported files are named after their path
+            relative to it (stop/img1.jpg -> stop_img1.jpg), so subfolders reusing file names don't collide.
+            Defaults to the common folder of the annotated images.
+
+    Returns:
+        int: Number of exported images.
+    """
+    exported = 0
+    paths = [path for path, boxes in annotations.items() if boxes is not None]
+    if root is None:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else "."
+    for split in ("train", "valid"):
+        os.makedirs(os.path.join(output_dir, split, "images"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, split, "labels"), exist_ok=True)
+
+    for path, boxes in sorted(annotations.items()):
+        if boxes is None or not os.path.exists(path):
+            continue
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+
+        filename = os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, "_")
+        split = "valid" if zlib.crc32(filename.encode("utf-8")) % 1000 < val_fraction * 1000 else "train"
+        shutil.copy2(path, os.path.join(output_dir, split, "images", filename))
+
+        lines = []
+        for object_class, x1, y1, x2, y2 in boxes:
+            x1, x2 = max(0, min(x1, x2)), min(width, max(x1, x2))
+            y1, y2 = max(0, min(y1, y2)), min(height, max(y1, y2))
+            lines.append(f"{object_class} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                         f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+        with open(os.path.join(output_dir, split, "labels", os.path.splitext(filename)[0] + ".txt"), "w") as f:
+            f.write("\n".join(lines))
+        exported += 1
+
+    write_data_yaml(output_dir, classes)
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate images with boxes and export a YOLO dataset")
+    parser.add_argument("folder", help="folder with the images to annotate")
+    parser.add_argument("--classes", nargs="+", default=["parking", "stop"], help="class names by class id")
+    parser.add_argument("--session", default="annotation_session.json", help="session file used to resume")
+    parser.add_argument("--model", default=None, help="YOLO weights used to pre-label the images")
+    parser.add_argument("--export", default=None, help="write a YOLO dataset to this folder when done")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    args = parser.parse_args()
+
+    detector = None
+    if args.model:
+        from ultralytics import YOLO  # Only needed for pre-labelling
+        detector = YOLO(args.model)
+
+    images = get_all_images(args.folder)
+    print(f"🛑 {len(images)} images to annotate.")
+    annotator = Annotator(images, args.classes, args.session, detector)
+    annotator.run()
+    annotator.prefetcher.stop()
+
+    if args.export:
+        count = export_yolo(annotator.annotations, args.classes, args.export, args.val_fraction, args.folder)
+        print(f"\n✅ Exported {count} images to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Convert annotations.csv to a YOLO dataset and validate annotation sets.
+
+Usage:
+    python convert_annotations.py annotations.csv --output yolo_dataset --names stop
+    python convert_annotations.py --validate yolo_dataset
+
+annotations.csv (written by assign_labels.py / assign_labels_g.py):
+    filename, x_min, y_min, x_max, y_max, label
+- Boxes are in the 640x480 space the images were resized to for annotation, while
+  filenames point to the originals. Use --space original for boxes in original pixels.
+- Rows with label 0 and -1 coordinates mark images without a sign; they are exported
+  with an empty label file (YOLO background images).
+- Filenames may use Windows separators; they are resolved relative to the CSV file.
+  Exported images are named after that relative path (stop\\a.jpg -> stop_a.jpg), since
+  the stop and not_stop folders reuse file names.
+
+All rows are converted at once with NumPy; image sizes are read from the file
+headers (JPEG SOF / PNG IHDR) without decoding the images.
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ANNOTATION_SIZE = (640, 480)
+
+# JPEG start-of-frame markers carrying the image size (C4, C8 and CC are not frames)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_size(path):
+    """Return (width, height) of a JPEG or PNG file from its header, or (0, 0) if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                return struct.unpack(">II", head[16:24])
+            if head[:2] != b"\xff\xd8":
+                return 0, 0
+
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return 0, 0
+                if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                    continue  # Markers without a length field
+                length = struct.unpack(">H", f.read(2))[0]
+                if marker[1] in SOF_MARKERS:
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return 0, 0
+
+
+def image_sizes(paths, workers=16):
+    """Read the sizes of many images in parallel; the work is dominated by file-system latency.
+
+    Returns:
+        np.ndarray: (N, 2) int array of (width, height), (0, 0) for unreadable files.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return np.array(list(executor.map(image_size, paths)), dtype=np.int64).reshape(-1, 2)
+
+
+def load_csv(csv_path):
+    """Load annotations.csv into arrays.
+
+    Returns:
+        tuple: (paths (N,) object array of '/'-separated paths as written in the CSV,
+                boxes (N, 4) float array, labels (N,) int array)
+    """
+    with open(csv_path, newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    rows = [row for row in rows if row]
+
+    paths = np.array([row[0].replace("\\", "/") for row in rows], dtype=object)
+    values = np.array([row[1:6] for row in rows], dtype=np.float64).reshape(-1, 5)
+    return paths, values[:, :4], values[:, 4].astype(np.int64)
+
+
+def validate(boxes, labels, sizes, space_sizes):
+    """Find problems in a set of annotations.
+
+    Args:
+        boxes (np.ndarray): (N, 4) x_min, y_min, x_max, y_max
+        labels (np.ndarray): (N,) 1 for a box row, 0 for an image without a sign
+        sizes (np.ndarray): (N, 2) image sizes from the headers, (0, 0) if unreadable
+        space_sizes (np.ndarray): (N, 2) size of the space the boxes are expressed in
+
+    Returns:
+        dict: Issue name -> boolean mask over the rows
+    """
+    negative = labels == 0
+    sentinel = np.all(boxes == -1, axis=1)
+    positive = ~negative
+
+    issues = {
+        "unreadable_image": np.all(sizes == 0, axis=1),
+        "negative_with_box": negative & ~sentinel,
+        "positive_without_box": positive & sentinel,
+        "degenerate_box": positive & ~sentinel & ((boxes[:, 2] <= boxes[:, 0]) | (boxes[:, 3] <= boxes[:, 1])),
+        "out_of_range": positive & ~sentinel & (
+            np.any(boxes < 0, axis=1) |
+            (boxes[:, 2] > space_sizes[:, 0]) | (boxes[:, 3] > space_sizes[:, 1])),
+    }
+    return issues
+
+
+def split_of(names, val_fraction):
+    """Deterministic train/valid assignment per file name."""
+    keys = np.array([zlib.crc32(name.encode("utf-8")) % 1000 for name in names], dtype=np.int64)
+    return np.where(keys < val_fraction * 1000, "valid", "train")
+
+
+def write_data_yaml(output_dir, names):
+    """Write the data.yaml file YOLOModel trains from."""
+    with open(os.path.join(output_dir, "data.yaml"), "w") as f:
+        f.write(f"path: {os.path.abspath(output_dir)}\n")
+        f.write("train: train/images\n")
+        f.write("val: valid/images\n\n")
+        f.write(f"nc: {len(names)}\n")
+        f.write(f"names: {list(names)}\n")
+
+
+def convert(csv_path, output_dir, names=("stop",), space="resized", val_fraction=0.2, link=False):
+    """Convert annotations.csv to a YOLO dataset.
+
+    Args:
+        csv_path (str): annotations.csv
+        output_dir (str): YOLO dataset directory
+        names (tuple): Class names; every box row gets class 0
+        space (str): 'resized' if boxes are in 640x480 annotation space, 'original' for original pixels
+        val_fraction (float): Fraction of images assigned to the validation split
+        link (bool): Symlink the images instead of copying them
+
+    Returns:
+        dict: Issue name -> number of affected rows (those rows are not exported)
+    """
+    paths, boxes, labels = load_csv(csv_path)
+    base = os.path.dirname(os.path.abspath(csv_path))
+    unique_paths, inverse = np.unique(paths, return_inverse=True)
+    inverse = inverse.ravel()
+    sources = [os.path.join(base, *path.split("/")) for path in unique_paths]
+    sizes = image_sizes(sources)[inverse]
+
+    if space == "resized":
+        space_sizes = np.broadcast_to(np.array(ANNOTATION_SIZE), sizes.shape)
+    else:
+        space_sizes = sizes
+
+    issues = validate(boxes, labels, sizes, space_sizes)
+    bad = np.zeros(len(paths), dtype=bool)
+    for mask in issues.values():
+        bad |= mask
+
+    # Normalized YOLO boxes for every row in one go
+    scale = np.maximum(space_sizes, 1).astype(np.float64)
+    x_center = (boxes[:, 0] + boxes[:, 2]) / 2 / scale[:, 0]
+    y_center = (boxes[:, 1] + boxes[:, 3]) / 2 / scale[:, 1]
+    width = (boxes[:, 2] - boxes[:, 0]) / scale[:, 0]
+    height = (boxes[:, 3] - boxes[:, 1]) / scale[:, 1]
+
+    # An image with any bad row is left out entirely, so it can't lose a box silently
+    bad_images = np.zeros(len(unique_paths), dtype=bool)
+    np.logical_or.at(bad_images, inverse, bad)
+    splits = split_of(unique_paths, val_fraction)
+
+    for split in ("train", "valid"):
+        os.makedirs(os.path.join(output_dir, split, "images"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, split, "labels"), exist_ok=True)
+
+    order = np.argsort(inverse, kind="stable")
+    row_groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(unique_paths)))[:-1])
+    for image, rows in enumerate(row_groups):
+        if bad_images[image]:
+            continue
+        source = sources[image]
+        filename = os.path.normpath(unique_paths[image]).replace(os.sep, "_")
+        target = os.path.join(output_dir, splits[image], "images", filename)
+        if os.path.lexists(target):
+            os.remove(target)
+        if link:
+            os.symlink(source, target)
+        else:
+            shutil.copy2(source, target)
+
+        rows = rows[labels[rows] != 0]
+        lines = [f"0 {x_center[r]:.6f} {y_center[r]:.6f} {width[r]:.6f} {height[r]:.6f}" for r in rows]
+        with open(os.path.join(output_dir, splits[image], "labels", os.path.splitext(filename)[0] + ".txt"), "w") as f:
+            f.write("\n".join(lines))
+
+    write_data_yaml(output_dir, names)
+    return {name: int(mask.sum()) for name, mask in issues.items()}
+
+
+def load_yolo_labels(dataset_dir):
+    """Load every label file of a YOLO dataset into arrays.
+
+    Returns:
+        tuple: (label file of each row (N,) object array, rows (N, 5) float array)
+    """
+    files = []
+    rows = []
+    for split in sorted(os.listdir(dataset_dir)):
+        label_dir = os.path.join(dataset_dir, split, "labels")
+        if not os.path.isdir(label_dir):
+            continue
+        for filename in sorted(os.listdir(label_dir)):
+            with open(os.path.join(label_dir, filename)) as f:
+                lines = [line.split() for line in f.read().splitlines() if line.strip()]
+            # Segmentation rows carry polygons; only their class is validated
+            rows.extend([float(v) for v in line[:5]] + [np.nan] * (5 - len(line[:5])) for line in lines)
+            files.extend([os.path.join(split, "labels", filename)] * len(lines))
+    return np.array(files, dtype=object), np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def validate_yolo(dataset_dir, class_count=None):
+    """Validate the label files of a YOLO dataset.
+
+    Returns:
+        dict: Issue name -> label files with that issue
+    """
+    files, rows = load_yolo_labels(dataset_dir)
+    classes, coordinates = rows[:, 0], rows[:, 1:]
+    half = coordinates[:, 2:] / 2
+
+    issues = {
+        "malformed_row": np.any(np.isnan(rows), axis=1),
+        "invalid_class": (classes < 0) | (classes != np.round(classes)) |
+                         ((classes >= class_count) if class_count is not None else False),
+        "degenerate_box": np.any(coordinates[:, 2:] <= 0, axis=1),
+        "out_of_range": np.any(coordinates[:, :2] - half < -1e-6, axis=1) |
+                        np.any(coordinates[:, :2] + half > 1 + 1e-6, axis=1),
+    }
+    return {name: sorted(set(files[mask])) for name, mask in issues.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert annotations.csv to YOLO and validate datasets")
+    parser.add_argument("csv", nargs="?", default="annotations.csv", help="annotations.csv to convert")
+    parser.add_argument("--output", default="yolo_dataset", help="YOLO dataset directory")
+    parser.add_argument("--names", nargs="+", default=["stop"], help="class names")
+    parser.add_argument("--space", choices=["resized", "original"], default="resized",
+                        help="coordinate space of the boxes in the CSV")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--link", action="store_true", help="symlink images instead of copying them")
+    parser.add_argument("--validate", metavar="DATASET", default=None,
+                        help="only validate an existing YOLO dataset")
+    args = parser.parse_args()
+
+    if args.validate:
+        issues = validate_yolo(args.validate)
+        for name, files in issues.items():
+            print(f"{name}: {len(files)} label files")
+            for file in files[:10]:
+                print(f"    {file}")
+        return
+
+    issues = convert(args.csv, args.output, args.names, args.space, args.val_fraction, args.link)
+    for name, count in issues.items():
+        if count:
+            print(f"⚠️ {name}: {count} rows (images left out)")
+    print(f"\n✅ YOLO dataset written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
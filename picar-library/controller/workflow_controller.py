@@ -1,15 +1,224 @@
+import queue
+import threading
+import time
+
 from controller.camera_controller import CameraController
 from controller.navigation_controller import NavigationController
+from status.prediction import Prediction
 
 
 class WorkflowController:
-    """Controller managing communication between CameraController and NavigationController."""
-    def __init__(self):
+    """Controller managing communication between CameraController and NavigationController.
+
+    The workflow runs as a pipeline of three stages, each in its own thread:
+    capture (camera frame) -> prediction (VisionSystem) -> action (NavigationController),
+    connected by bounded queues. While the action of frame N executes, frame N+1 is
+    already being predicted, so the control rate is that of the slowest stage instead
+    of the sum of all stages.
+
+    When a stage is slower than the one before it, its input queue fills up. With
+    drop_stale (the default) the oldest waiting item is then dropped, as a late frame
+    or prediction is worth less than a fresh one; otherwise the earlier stage blocks
+    until there is room.
+
+    If a stage raises, the workflow stops, the car is stopped and stop_workflow() (and so
+    run()) raises a RuntimeError from the stage's exception.
+    """
+
+    def __init__(self, fps=30, queue_size=1, drop_stale=True):
+        """
+        Args:
+            fps: Rate at which frames are captured
+            queue_size: Items waiting between two stages
+            drop_stale: Drop the oldest waiting item when a queue is full instead of blocking
+        """
         self.camera_controller = CameraController()
         self.navigation_controller = NavigationController()
+        self.fps = fps
+        self.queue_size = queue_size
+        self.drop_stale = drop_stale
 
-    def start_workflow(self):
-        """Start the workflow by getting prediction from CameraController and passing it to NavigationController."""
+        self.is_running = False
+        self.threads = []
+        self.error = None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.predictions = queue.Queue(maxsize=queue_size)
+
+        # Statistics - accessible from outside the class
+        self.stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.start_time = None
+        self.counts = {'captured': 0, 'predicted': 0, 'acted': 0}
+        self.dropped = {'frames': 0, 'predictions': 0}
+        self.busy_time = {'capture': 0.0, 'prediction': 0.0, 'action': 0.0}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def run_once(self):
+        """One serialized cycle: get a prediction from CameraController and pass it to NavigationController."""
         prediction = self.camera_controller.make_prediction()
 
-        self.navigation_controller.perform_action(prediction)
\ No newline at end of file
+        self.navigation_controller.perform_action(prediction)
+
+    def start_workflow(self):
+        """Start the capture, prediction and action stages in background threads."""
+        if self.is_running:
+            return
+        self.frames = queue.Queue(maxsize=self.queue_size)
+        self.predictions = queue.Queue(maxsize=self.queue_size)
+        self._reset_stats()
+        self.error = None
+        self.start_time = time.monotonic()
+        self.is_running = True
+
+        self.threads = [
+            threading.Thread(target=self._run_stage, args=(self._capture_loop,), name='capture', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._prediction_loop,), name='prediction', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._action_loop,), name='action', daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop_workflow(self, timeout=2.0):
+        """Stop the stages, waiting for the items they are processing, and stop the car.
+
+        Raises:
+            RuntimeError: If a stage failed, from the stage's exception
+        """
+        self.is_running = False
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+        self.navigation_controller.navigation.stop()
+        if self.error is not None:
+            stage, error = self.error
+            raise RuntimeError(f"Workflow {stage} stage failed: {error!r}") from error
+
+    def _run_stage(self, loop):
+        """Run a stage loop; if it raises, record the error, stop the workflow and the car"""
+        try:
+            loop()
+        except Exception as error:
+            self.error = (threading.current_thread().name, error)
+            self.is_running = False
+            # Don't let the motors keep executing the last action without perception
+            self.navigation_controller.navigation.stop()
+
+    def run(self, duration=None):
+        """Run the pipeline until duration seconds have passed, Ctrl+C is pressed or a stage fails.
+
+        Raises:
+            RuntimeError: If a stage failed, see stop_workflow()
+        """
+        self.start_workflow()
+        try:
+            while self.is_running and (duration is None or time.monotonic() - self.start_time < duration):
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            print("\nExiting...")
+        finally:
+            self.stop_workflow()
+        return self.stats()
+
+    def _put(self, items, item, name):
+        """Pass an item to the next stage, dropping the oldest waiting one or waiting for room"""
+        while self.is_running:
+            try:
+                items.put_nowait(item)
+                return
+            except queue.Full:
+                if self.drop_stale:
+                    try:
+                        items.get_nowait()
+                        with self.stats_lock:
+                            self.dropped[name] += 1
+                    except queue.Empty:
+                        pass
+                else:
+                    time.sleep(0.001)
+
+    def _get(self, items):
+        """Next item of the previous stage, None when the workflow stops"""
+        while self.is_running:
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _capture_loop(self):
+        period = 1 / self.fps
+        next_capture = time.monotonic()
+        while self.is_running:
+            started = time.monotonic()
+            frame = self.camera_controller.get_camera_image()
+            finished = time.monotonic()
+            with self.stats_lock:
+                self.busy_time['capture'] += finished - started
+                if frame is not None:
+                    self.counts['captured'] += 1
+            if frame is not None:
+                self._put(self.frames, (started, frame), 'frames')
+
+            next_capture += period
+            delay = next_capture - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Capture is behind, don't try to catch up with a burst of frames
+                next_capture = time.monotonic()
+
+    def _prediction_loop(self):
+        vision = self.camera_controller.vision
+        while self.is_running:
+            item = self._get(self.frames)
+            if item is None:
+                break
+            captured, frame = item
+            started = time.monotonic()
+            prediction = vision.make_prediction(frame)
+            with self.stats_lock:
+                self.busy_time['prediction'] += time.monotonic() - started
+            if isinstance(prediction, Prediction):
+                with self.stats_lock:
+                    self.counts['predicted'] += 1
+                self._put(self.predictions, (captured, prediction), 'predictions')
+
+    def _action_loop(self):
+        while self.is_running:
+            item = self._get(self.predictions)
+            if item is None:
+                break
+            captured, prediction = item
+            started = time.monotonic()
+            self.navigation_controller.perform_action(prediction)
+            finished = time.monotonic()
+            with self.stats_lock:
+                self.busy_time['action'] += finished - started
+                self.counts['acted'] += 1
+                latency = finished - captured
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+
+    def stats(self):
+        """
+        Statistics of the pipeline since start_workflow().
+
+        Returns:
+            dict: Items captured/predicted/acted, items dropped at each queue, actions per second,
+                busy fraction of each stage (the slowest stage is the one near 1.0) and the mean and
+                max latency from frame capture to finished action, in seconds.
+        """
+        with self.stats_lock:
+            elapsed = time.monotonic() - self.start_time if self.start_time else 0.0
+            acted = self.counts['acted']
+            return {
+                **self.counts,
+                'dropped': dict(self.dropped),
+                'action_rate': acted / elapsed if elapsed else 0.0,
+                'utilization': {name: busy / elapsed if elapsed else 0.0 for name, busy in self.busy_time.items()},
+                'latency_mean': self.latency_total / acted if acted else 0.0,
+                'latency_max': self.latency_max,
+            }
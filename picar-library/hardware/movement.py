@@ -29,8 +29,8 @@ class Movement:
         """Turns the car in the specified direction by the given angle"""
         print(f"Turning {direction} by {angle} degrees")
         if direction == Action.LEFT:
-            self.picar.set_dir_servo_angle(-35)
+            self.picar.set_dir_servo_angle(-angle)
             self.picar.forward(distance)
         elif direction == Action.RIGHT:
-            self.picar.set_dir_servo_angle(35)
+            self.picar.set_dir_servo_angle(angle)
             self.picar.forward(distance)
\ No newline at end of file
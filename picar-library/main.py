@@ -1,10 +1,20 @@
-#from hardware.movement import Movement
+import argparse
+import os
+import sys
 import time
-from models.yolo import YOLOModel
 
-#from status.action import Action
+# Modules are imported inside the subcommands, so each one only pays for what it uses:
+# the movement test doesn't load ultralytics/torch, training doesn't load the car hardware.
+
+# basic-library modules (car_config, startup_profiler) are imported by name
+BASIC_LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'existing-libraries', 'basic-library')
+sys.path.append(BASIC_LIBRARY)
+
+
+def movement_test():
+    from hardware.movement import Movement
+    from status.action import Action
 
-"""def movement_test():
     move = Movement()
     move.forward()
     time.sleep(1)
@@ -19,36 +29,117 @@ from models.yolo import YOLOModel
     move.backward()
     time.sleep(1)
     move.stop()
-"""
 
-def training():
+
+def drive(duration=None, fps=30, queue_size=1, block=False):
+    # Capture, prediction and action run as a pipeline until Ctrl+C (or duration seconds)
+    from controller.workflow_controller import WorkflowController
+
+    workflow = WorkflowController(fps=fps, queue_size=queue_size, drop_stale=not block)
+    stats = workflow.run(duration)
+    print(f"\nCaptured {stats['captured']}, predicted {stats['predicted']}, acted on {stats['acted']} frames "
+          f"({stats['action_rate']:.1f} actions/s), dropped {stats['dropped']}")
+    print("Stage utilization: " + ", ".join(f"{name} {value:.0%}" for name, value in stats['utilization'].items()))
+    print(f"Capture to action latency: mean {stats['latency_mean'] * 1000:.1f} ms, "
+          f"max {stats['latency_max'] * 1000:.1f} ms")
+
+
+def training(apple_silicon=None, epochs=None, batch_size=None):
     # Testing the model training
+    from models.yolo import YOLOModel
 
-    device_input = int(input("1. Train on normal device\n2. Train on Apple Silicon\n"))
-    epochs = int(input("Enter number of epochs for training (e.g., 10): "))
-    batch_size = int(input("Enter batch size for training (e.g., 32): "))
+    if apple_silicon is None:
+        apple_silicon = int(input("1. Train on normal device\n2. Train on Apple Silicon\n")) == 2
+    if epochs is None:
+        epochs = int(input("Enter number of epochs for training (e.g., 10): "))
+    if batch_size is None:
+        batch_size = int(input("Enter batch size for training (e.g., 32): "))
 
-    if device_input == 2:
+    trainer = YOLOModel(epochs=epochs, batch_size=batch_size)
+    if apple_silicon:
         # Training on Apple Silicon (Mac)
-        trainer = YOLOModel(epochs=epochs, batch_size=batch_size)
         trainer.run_training_on_apple_silicon()
     else:
         # Training on normal device (GPU/CPU)
-        trainer = YOLOModel(epochs=epochs, batch_size=batch_size)
         trainer.run_training_yolo_dataset()
         trainer.run_training_augmented_yolo_dataset()
 
     print("\nTraining finished.")
 
 
-if __name__=="__main__":
-    # Testing code:
-    user_input = int(input("1. Check movement\n2. Train model\n"))
+def augmentation(copies=None, seed=None):
+    # Regenerating the augmented dataset; unchanged images are reused from earlier runs
+    from models.augmentation import DatasetAugmenter
+
+    if copies is None:
+        copies = int(input("Enter number of augmented copies per image (e.g., 3): "))
+    if seed is None:
+        seed = int(input("Enter random seed (e.g., 0): "))
+
+    augmenter = DatasetAugmenter(copies=copies, seed=seed)
+    augmenter.augment_dataset('picar-library/models/datasets/yolo_dataset',
+                              'picar-library/models/datasets/augmented_noised_yolo_dataset')
+
+
+def menu():
+    # Interactive menu, used when no subcommand is given
+    user_input = int(input("1. Check movement\n2. Train model\n3. Generate augmented dataset\n"))
     if user_input == 1:
-        print("remove the comment on function and import to make it work")
-        #movement_test()
+        movement_test()
     elif user_input == 2:
         training()
+    elif user_input == 3:
+        augmentation()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PiCar-X tools")
+    parser.add_argument("--profile", action="store_true", help="print a startup-time profile (imports, phases)")
+    subcommands = parser.add_subparsers(dest="command")
+
+    subcommands.add_parser("movement", help="run the movement test")
+
+    drive_parser = subcommands.add_parser("drive", help="run the camera -> vision -> navigation workflow")
+    drive_parser.add_argument("--duration", type=float, help="seconds to drive, until Ctrl+C if omitted")
+    drive_parser.add_argument("--fps", type=float, default=30, help="camera capture rate")
+    drive_parser.add_argument("--queue-size", type=int, default=1, help="items waiting between two stages")
+    drive_parser.add_argument("--block", action="store_true",
+                              help="make faster stages wait instead of dropping stale frames/predictions")
+
+    train = subcommands.add_parser("train", help="train the YOLO models")
+    train.add_argument("--apple-silicon", action="store_true", help="train on Apple Silicon (mps)")
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--batch-size", type=int, default=5)
+
+    augment = subcommands.add_parser("augment", help="generate the augmented dataset")
+    augment.add_argument("--copies", type=int, default=3, help="augmented copies per image")
+    augment.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    profiler = None
+    if args.profile:
+        from startup_profiler import StartupProfiler
+        profiler = StartupProfiler()
 
+    try:
+        if args.command == "movement":
+            movement_test()
+        elif args.command == "drive":
+            drive(args.duration, args.fps, args.queue_size, args.block)
+        elif args.command == "train":
+            training(args.apple_silicon, args.epochs, args.batch_size)
+        elif args.command == "augment":
+            augmentation(args.copies, args.seed)
+        else:
+            menu()
+    finally:
+        if profiler:
+            profiler.report()
 
 
+if __name__ == "__main__":
+    main()
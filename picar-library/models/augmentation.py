@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Bump when the transforms change, so cached outputs of older code are not reused
+AUGMENTATION_VERSION = 1
+
+DEFAULT_PARAMS = {
+    # Geometric
+    'max_shift': 0.1,          # fraction of width / height
+    'max_rotation': 10.0,      # degrees
+    'scale_range': (0.9, 1.1),
+    'max_perspective': 0.05,   # corner displacement as a fraction of width / height
+    'min_visibility': 0.3,     # boxes keeping less of their area are dropped
+    # Photometric
+    'max_noise': 12.0,         # gaussian noise standard deviation (0-255 scale)
+    'blur_kernels': (0, 3, 5), # 0 means no blur
+    'max_exposure': 0.3,       # brightness gain range 1 +/- max_exposure
+    'gamma_range': (0.8, 1.25),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+AUGMENTED_NAME = re.compile(r'_aug\d+_[0-9a-f]{16}$')
+BORDER_VALUE = (114, 114, 114)
+
+
+def _random_homography(rng, width, height, params):
+    """Draw a shift / rotation / scale / perspective transform as one 3x3 matrix"""
+    angle = rng.uniform(-params['max_rotation'], params['max_rotation'])
+    scale = rng.uniform(*params['scale_range'])
+    affine = np.eye(3)
+    affine[:2] = cv2.getRotationMatrix2D((width / 2, height / 2), angle, scale)
+    affine[0, 2] += rng.uniform(-params['max_shift'], params['max_shift']) * width
+    affine[1, 2] += rng.uniform(-params['max_shift'], params['max_shift']) * height
+
+    corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    offsets = rng.uniform(-params['max_perspective'], params['max_perspective'], size=(4, 2))
+    moved = (corners + offsets * [width, height]).astype(np.float32)
+    perspective = cv2.getPerspectiveTransform(corners, moved)
+    return perspective @ affine
+
+
+def transform_boxes(labels, homography, width, height, min_visibility):
+    """Apply a homography to YOLO boxes
+
+    Args:
+        labels (np.ndarray): (N, 5) rows of class, x_center, y_center, width, height (normalized)
+        homography (np.ndarray): 3x3 transform in pixel coordinates
+        width (int): Image width
+        height (int): Image height
+        min_visibility (float): Minimum fraction of the transformed box left inside the image
+
+    Returns:
+        np.ndarray: (M, 5) transformed labels, boxes mostly outside the image removed
+    """
+    if not len(labels):
+        return labels
+
+    cx, cy, w, h = (labels[:, 1:] * [width, height, width, height]).T
+    x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+    corners = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                        np.stack([x2, y2], 1), np.stack([x1, y2], 1)], axis=1)
+
+    # (N, 4, 3) homogeneous corners through the transform, then back to pixels
+    points = np.concatenate([corners, np.ones(corners.shape[:2] + (1,))], axis=2) @ homography.T
+    points = points[:, :, :2] / points[:, :, 2:]
+
+    new_x1, new_y1 = points[:, :, 0].min(1), points[:, :, 1].min(1)
+    new_x2, new_y2 = points[:, :, 0].max(1), points[:, :, 1].max(1)
+    full_area = (new_x2 - new_x1) * (new_y2 - new_y1)
+
+    new_x1, new_x2 = np.clip(new_x1, 0, width), np.clip(new_x2, 0, width)
+    new_y1, new_y2 = np.clip(new_y1, 0, height), np.clip(new_y2, 0, height)
+    area = (new_x2 - new_x1) * (new_y2 - new_y1)
+
+    keep = (new_x2 - new_x1 >= 2) & (new_y2 - new_y1 >= 2) & (area >= min_visibility * full_area)
+    result = np.stack([labels[:, 0],
+                       (new_x1 + new_x2) / 2 / width, (new_y1 + new_y2) / 2 / height,
+                       (new_x2 - new_x1) / width, (new_y2 - new_y1) / height], axis=1)
+    return result[keep]
+
+
+def photometric(images, rngs, params):
+    """Apply exposure, gamma, blur and noise to a batch of images
+
+    Args:
+        images (np.ndarray): (K, H, W, 3) uint8 batch
+        rngs (list): One numpy Generator per image, so results don't depend on batching
+        params (dict): Augmentation parameters
+
+    Returns:
+        np.ndarray: (K, H, W, 3) uint8 batch
+    """
+    count = len(images)
+    gain = np.array([rng.uniform(1 - params['max_exposure'], 1 + params['max_exposure']) for rng in rngs],
+                    dtype=np.float32).reshape(count, 1, 1, 1)
+    gamma = np.array([rng.uniform(*params['gamma_range']) for rng in rngs],
+                     dtype=np.float32).reshape(count, 1, 1, 1)
+    kernels = [int(rng.choice(params['blur_kernels'])) for rng in rngs]
+    sigma = np.array([rng.uniform(0, params['max_noise']) for rng in rngs],
+                     dtype=np.float32).reshape(count, 1, 1, 1)
+    noise = np.stack([rng.standard_normal(images.shape[1:], dtype=np.float32) for rng in rngs])
+
+    for i, kernel in enumerate(kernels):
+        if kernel:
+            images[i] = cv2.GaussianBlur(images[i], (kernel, kernel), 0)
+
+    batch = images.astype(np.float32) / 255.0
+    batch = np.power(batch, gamma) * gain * 255.0 + noise * sigma
+    return np.clip(batch, 0, 255).astype(np.uint8)
+
+
+def cache_key(image_bytes, label_bytes, params, seed, variant):
+    """Key identifying one augmented output: source content + transform parameters"""
+    digest = hashlib.sha1()
+    digest.update(image_bytes)
+    digest.update(label_bytes)
+    digest.update(json.dumps([AUGMENTATION_VERSION, params, seed, variant], sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _augment_image(job):
+    """Worker: produce the missing augmented variants of one image"""
+    image_path, label_path, output_images, output_labels, copies, seed, params = job
+
+    with open(image_path, 'rb') as f:
+        image_bytes = f.read()
+    label_bytes = b''
+    if os.path.exists(label_path):
+        with open(label_path, 'rb') as f:
+            label_bytes = f.read()
+
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    outputs = []
+    missing = []
+    for variant in range(copies):
+        name = f"{stem}_aug{variant}_{cache_key(image_bytes, label_bytes, params, seed, variant)}"
+        outputs.append(name)
+        if not os.path.exists(os.path.join(output_images, name + '.jpg')):
+            missing.append((variant, name))
+
+    if not missing:
+        return outputs, 0
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return [], 0
+    labels = np.loadtxt(label_bytes.decode('utf-8').splitlines(), ndmin=2) if label_bytes.strip() \
+        else np.zeros((0, 5))
+    height, width = image.shape[:2]
+
+    # One generator per (image, variant): identical results whatever is cached or batched
+    image_id = zlib.crc32(stem.encode('utf-8'))
+    rngs = [np.random.default_rng([seed, image_id, variant]) for variant, _ in missing]
+
+    warped = []
+    warped_labels = []
+    for rng in rngs:
+        homography = _random_homography(rng, width, height, params)
+        warped.append(cv2.warpPerspective(image, homography, (width, height),
+                                          borderMode=cv2.BORDER_CONSTANT, borderValue=BORDER_VALUE))
+        warped_labels.append(transform_boxes(labels, homography, width, height, params['min_visibility']))
+
+    batch = photometric(np.stack(warped), rngs, params)
+
+    for (variant, name), result, result_labels in zip(missing, batch, warped_labels):
+        cv2.imwrite(os.path.join(output_images, name + '.jpg'), result)
+        with open(os.path.join(output_labels, name + '.txt'), 'w') as f:
+            f.write("\n".join(f"{int(row[0])} {row[1]:.6f} {row[2]:.6f} {row[3]:.6f} {row[4]:.6f}"
+                              for row in result_labels))
+    return outputs, len(missing)
+
+
+class DatasetAugmenter:
+    """Generates an augmented YOLO dataset from a source YOLO dataset."""
+
+    def __init__(self, copies: int = 3, seed: int = 0, params: dict = None, workers: int = None):
+        """
+            Initialize the augmenter
+
+        Args:
+        :param copies: augmented variants generated per source image
+        :param seed: random seed, the output is identical for identical seed, sources and params
+        :param params: overrides of DEFAULT_PARAMS
+        :param workers: number of worker processes, defaults to the CPU count
+        """
+        self.copies = copies
+        self.seed = seed
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.workers = workers
+
+    def augment_dataset(self, source_dir, output_dir, augment_splits=('train',), include_originals=True,
+                        prune=True):
+        """
+            Write an augmented copy of a YOLO dataset (roboflow layout: <split>/images, <split>/labels)
+
+            Augmented images are named after a hash of their source image, labels and the
+            transform parameters, so a rerun only computes images that are new or changed.
+
+        Args:
+        :param source_dir: source dataset, e.g. models/datasets/yolo_dataset
+        :param output_dir: output dataset, e.g. models/datasets/augmented_noised_yolo_dataset
+        :param augment_splits: splits that get augmented copies; other splits are copied as is
+        :param include_originals: also copy the source images of augmented splits
+        :param prune: remove augmented images of earlier runs that this run doesn't produce;
+                      files not named like augmented outputs are never removed
+        :return: (number of generated images, number of images reused from the cache)
+        """
+        jobs = []
+        expected = {}
+        for split in ('train', 'valid', 'test'):
+            source_images = os.path.join(source_dir, split, 'images')
+            if not os.path.isdir(source_images):
+                continue
+            output_images = os.path.join(output_dir, split, 'images')
+            output_labels = os.path.join(output_dir, split, 'labels')
+            os.makedirs(output_images, exist_ok=True)
+            os.makedirs(output_labels, exist_ok=True)
+            expected[split] = set()
+
+            for filename in sorted(os.listdir(source_images)):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                stem = os.path.splitext(filename)[0]
+                image_path = os.path.join(source_images, filename)
+                label_path = os.path.join(source_dir, split, 'labels', stem + '.txt')
+
+                if split not in augment_splits or include_originals:
+                    self._copy(image_path, os.path.join(output_images, filename))
+                    if os.path.exists(label_path):
+                        self._copy(label_path, os.path.join(output_labels, stem + '.txt'))
+                    expected[split].add(stem)
+                if split in augment_splits:
+                    jobs.append((image_path, label_path, output_images, output_labels,
+                                 self.copies, self.seed, self.params))
+
+        generated = 0
+        total = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for job, (outputs, count) in zip(jobs, executor.map(_augment_image, jobs, chunksize=4)):
+                split = os.path.basename(os.path.dirname(os.path.dirname(job[0])))
+                expected[split].update(outputs)
+                generated += count
+                total += len(outputs)
+
+        if prune:
+            self._prune(output_dir, expected)
+
+        source_yaml = os.path.join(source_dir, 'data.yaml')
+        if os.path.exists(source_yaml):
+            shutil.copyfile(source_yaml, os.path.join(output_dir, 'data.yaml'))
+
+        print(f"Augmented dataset written to {output_dir}: {generated} generated, {total - generated} cached")
+        return generated, total - generated
+
+    @staticmethod
+    def _copy(source, target):
+        """Copy a file unless an identical copy is already there"""
+        if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source) \
+                and os.path.getmtime(target) >= os.path.getmtime(source):
+            return
+        shutil.copy2(source, target)
+
+    @staticmethod
+    def _prune(output_dir, expected):
+        """Remove augmented outputs that the current sources and parameters no longer produce"""
+        for split, stems in expected.items():
+            for kind, extension in (('images', None), ('labels', '.txt')):
+                folder = os.path.join(output_dir, split, kind)
+                for filename in os.listdir(folder):
+                    stem, file_extension = os.path.splitext(filename)
+                    if extension and file_extension != extension:
+                        continue
+                    if AUGMENTED_NAME.search(stem) and stem not in stems:
+                        os.remove(os.path.join(folder, filename))
@@ -1,5 +1,3 @@
-from ultralytics import YOLO
-
 class YOLOModel:
     """A class to handle YOLO model loading, training and prediction."""
 
@@ -9,7 +7,8 @@ class YOLOModel:
                  epochs: int = 10,
                  batch_size: int = 5):
         """
-            Initialize the YOLO models and store models paths
+            Store the models paths; each model is loaded on first use, so a
+            training run only loads the models it trains
 
         Args:
         :param model_path: yolov8n model path
@@ -17,14 +16,35 @@ class YOLOModel:
         :param epochs: number of epochs for training
         :param batch_size: batch size for training
         """
-        self.model8 = YOLO(model_path)
-        self.model8_augmented = YOLO(model_path)
-        self.model12 = YOLO(model_path12)
+        self.model_path = model_path
+        self.model_path12 = model_path12
+        self._models = {}
         self.data_path_normal = 'picar-library/models/datasets/yolo_dataset/data.yaml'
         self.data_path_augmented = 'picar-library/models/datasets/augmented_noised_yolo_dataset/data.yaml'
         self.epochs = epochs
         self.batch_size = batch_size
 
+    def _model(self, name, path):
+        """
+          Load a model the first time it is requested
+        """
+        if name not in self._models:
+            from ultralytics import YOLO  # Importing ultralytics takes seconds, only pay for it when needed
+            self._models[name] = YOLO(path)
+        return self._models[name]
+
+    @property
+    def model8(self):
+        return self._model('model8', self.model_path)
+
+    @property
+    def model8_augmented(self):
+        return self._model('model8_augmented', self.model_path)
+
+    @property
+    def model12(self):
+        return self._model('model12', self.model_path12)
+
     def run_training_yolo_dataset(self):
         """
           Train self.model8 using the normal yolo dataset
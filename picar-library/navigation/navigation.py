@@ -1,5 +1,9 @@
-from typing import Any
+import time
+from typing import Optional
 
+from arbiter import CHECKPOINT, EMERGENCY_STOP, Arbiter
+from car_config import NavigationConfig
+from speed import SpeedController
 from hardware.movement import Movement
 from status.action import Action
 from status.prediction import Prediction
@@ -8,8 +12,21 @@ from status.prediction import Prediction
 class Navigation:
     """High level class responsible for the movement of the car"""
 
-    def __init__(self):
+    def __init__(self, config: Optional[NavigationConfig] = None):
+        """
+        Args:
+            config: Speed and turn angle (car_config.NavigationConfig from basic-library); read at
+                every action, so a ConfigWatcher reload applies to the next one
+        """
         self.movement = Movement()
+        self.config = config or NavigationConfig()
+        # Behaviours (emergency stop, checkpoint navigation) publish actions with a priority,
+        # the arbiter chooses the one to perform
+        self.arbiter = Arbiter()
+        # Consecutive driving actions ramp up to config.speed instead of starting and stopping at it
+        self.speed_controller = SpeedController(max_speed=self.config.speed)
+        self.last_action_time = None
+        self.direction = None
 
     def decide_action(self, prediction: Prediction) -> Action:
         """
@@ -23,9 +40,24 @@ class Navigation:
         """
 
         # TODO implement how to decide action according to prediction here
-        action = Action.FORWARD
+        self.arbiter.publish('checkpoint', CHECKPOINT, action=Action.FORWARD, ttl=1.0)
+
+        command = self.arbiter.decide()
+        return command.action or Action.STOP
+
+    def emergency_stop(self, ttl: Optional[float] = None):
+        """
+            Stops the car at the next decided action, overriding every other behaviour
+
+        Args:
+            ttl: Seconds the stop lasts, until clear_emergency_stop() if None
+        """
+        self.arbiter.publish('emergency_stop', EMERGENCY_STOP, action=Action.STOP, ttl=ttl)
+        self.stop()
 
-        return action
+    def clear_emergency_stop(self):
+        """Lets the other behaviours drive again"""
+        self.arbiter.withdraw('emergency_stop')
 
     def perform_action(self, action: Action, prediction: Prediction):
         """
@@ -45,7 +77,8 @@ class Navigation:
         elif action == Action.RIGHT:
             angle = self.angle_retrieval(action, prediction)
             self.turn(Action.RIGHT, angle)
-        self.stop()
+        else:
+            self.stop()
 
     def angle_retrieval(self, action: Action, prediction: Prediction) -> int:
         """
@@ -58,21 +91,46 @@ class Navigation:
         Returns:
             angle: Angle in degrees to turn
         """
-        angle = 10
+        angle = self.config.turn_angle
         # TODO implement how to handle angle creation here
         return angle
 
+    def ramped_speed(self, direction: Action) -> float:
+        """
+            Speed of the next driving action, ramped towards config.speed since the previous one
+
+        Args:
+            direction: FORWARD or BACKWARD, changing the direction ramps up again from min_speed
+
+        Returns:
+            speed: Motor speed in percent
+        """
+        now = time.monotonic()
+        self.speed_controller.max_speed = self.config.speed
+        if direction != self.direction or self.last_action_time is None:
+            # First action after a stop or a change of direction: start at the lowest driving speed
+            self.speed_controller.speed = min(self.speed_controller.min_speed, self.config.speed)
+            dt = 0.0
+        else:
+            dt = now - self.last_action_time
+        self.last_action_time = now
+        self.direction = direction
+        return self.speed_controller.update(dt)
+
     def stop(self):
         """Stops the car"""
         self.movement.stop()
+        self.speed_controller.speed = 0.0
+        self.last_action_time = None
+        self.direction = None
 
     def forward(self):
         """Moves the car forward"""
-        self.movement.forward()
+        self.movement.forward(self.ramped_speed(Action.FORWARD))
 
     def backward(self):
         """Moves the car backward"""
-        self.movement.backward()
+        self.movement.backward(self.ramped_speed(Action.BACKWARD))
 
     def turn(self, direction, angle):
         """
@@ -82,4 +140,4 @@ class Navigation:
             direction (Action): Direction to turn ('LEFT' or 'RIGHT')
             angle (int): Angle in degrees to turn
         """
-        self.movement.turn(direction, angle)
\ No newline at end of file
+        self.movement.turn(direction, angle, self.ramped_speed(Action.FORWARD))
\ No newline at end of file